@@ -40,6 +40,10 @@ class AgentService(n_rpc.Service):
             None
         )
 
+    def stop(self):
+        super(AgentService, self).stop()
+        self.manager.stop()
+
 
 def main():
     cfg.CONF.register_opts(ipvs_conf.AGENT_OPTS)
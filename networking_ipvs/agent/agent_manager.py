@@ -12,6 +12,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
 from neutron import context as ncontext
 from neutron.services import provider_configuration as provconfig
 from oslo_log import log as logging
@@ -19,6 +21,7 @@ from oslo_service import periodic_task
 from oslo_utils import importutils
 
 from networking_ipvs._i18n import _, _LE
+from networking_ipvs.agent import dispatcher
 from networking_ipvs.common import rpc
 from networking_ipvs.common import constants as const
 
@@ -34,6 +37,8 @@ class AgentManager(rpc.PluginNotifyEndpoint,
         self.context = ncontext.get_admin_context_without_session()
         self.plugin_rpc = rpc.PluginRPCClient(self.context, self.conf.host)
         self._load_driver()
+        self._dispatcher = dispatcher.VIPDispatcher(
+            self.conf.vip_dispatch_workers)
 
         self.agent_state = {
             'binary': 'networking-ipvs-agent',
@@ -43,6 +48,7 @@ class AgentManager(rpc.PluginNotifyEndpoint,
             'agent_type': const.NETWORKING_IPVS_AGENT_TYPE,
             'start_flag': True}
 
+        self._last_vip_reconcile = 0
         self.state_rpc = rpc.setup_state_report_rpc(
             self.conf.AGENT.report_interval, self._report_state)
         self.sync_state()
@@ -59,6 +65,14 @@ class AgentManager(rpc.PluginNotifyEndpoint,
 
     def _report_state(self):
         try:
+            self.agent_state['configurations']['driver_stats'] = (
+                self.driver.get_stats())
+            self.agent_state['configurations']['dispatcher_stats'] = (
+                self._dispatcher.get_stats())
+            # plugin keeps deleted revisions newer than the oldest revision
+            # live agents hold
+            self.agent_state['configurations']['revision'] = (
+                self.driver.get_revision())
             self.state_rpc.report_state(self.context, self.agent_state)
             self.agent_state.pop('start_flag', None)
         except Exception:
@@ -67,26 +81,77 @@ class AgentManager(rpc.PluginNotifyEndpoint,
     def sync_state(self):
         self.driver.sync_state()
 
+    @periodic_task.periodic_task
+    def catch_up(self, context):
+        # notifications lost or failed are caught up by revision logs
+        try:
+            self.driver.catch_up()
+        except Exception:
+            LOG.exception(_LE("Failed to catch up with upstream revisions"))
+
+    def stop(self):
+        self.driver.stop()
+
+    @periodic_task.periodic_task
+    def save_snapshot(self, context):
+        try:
+            self.driver.save_snapshot()
+        except Exception:
+            LOG.exception(_LE("Failed to save virtual server cache snapshot"))
+
+    @periodic_task.periodic_task
+    def reconcile_vips(self, context):
+        interval = self.conf.ipvs.vip_reconcile_interval
+        now = time.time()
+        if not interval or now - self._last_vip_reconcile < interval:
+            return
+        self._last_vip_reconcile = now
+        try:
+            self.driver.reconcile_vips(self.conf.ipvs.vip_reconcile_budget)
+        except Exception:
+            LOG.exception(_LE("Failed to reconcile vips"))
+
+    def _get_vip_keys(self, virtualservers):
+        return [dispatcher.get_vip_key(vs) for vs in virtualservers[
+            const.VIRTUALSERVERS].values()]
+
+    def _dispatch(self, keys, func, context, data):
+        self._dispatcher.dispatch(keys, func, context, data)
+
     def update_virtualservers(self, context, virtualservers):
-        self.driver.update_virtualservers(context, virtualservers)
+        self._dispatch(
+            self._get_vip_keys(virtualservers),
+            self.driver.update_virtualservers, context, virtualservers)
 
     def delete_virtualservers(self, context, virtualservers):
-        self.driver.delete_virtualservers(context, virtualservers)
+        self._dispatch(
+            self._get_vip_keys(virtualservers),
+            self.driver.delete_virtualservers, context, virtualservers)
 
     def update_virtualserver(self, context, virtualserver):
-        self.driver.update_virtualserver(context, virtualserver)
+        self._dispatch(
+            [dispatcher.get_vip_key(virtualserver)],
+            self.driver.update_virtualserver, context, virtualserver)
 
     def delete_virtualserver(self, context, virtualserver):
-        self.driver.delete_virtualserver(context, virtualserver)
+        self._dispatch(
+            [dispatcher.get_vip_key(virtualserver)],
+            self.driver.delete_virtualserver, context, virtualserver)
 
     def create_realserver(self, context, realserver):
-        self.driver.create_realserver(context, realserver)
+        self._dispatch(
+            [dispatcher.get_vip_key(realserver)],
+            self.driver.create_realserver, context, realserver)
 
     def update_realserver(self, context, realserver):
-        self.driver.update_realserver(context, realserver)
+        self._dispatch(
+            [dispatcher.get_vip_key(realserver)],
+            self.driver.update_realserver, context, realserver)
 
     def delete_realserver(self, context, realserver):
-        self.driver.delete_realserver(context, realserver)
+        self._dispatch(
+            [dispatcher.get_vip_key(realserver)],
+            self.driver.delete_realserver, context, realserver)
 
     def delete_realservers(self, context, realservers):
         self.driver.delete_realservers(context, realservers)
@@ -0,0 +1,127 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import time
+
+import eventlet
+from oslo_log import log as logging
+
+from networking_ipvs._i18n import _LE
+from networking_ipvs.common import constants as const
+
+LOG = logging.getLogger(__name__)
+
+
+def get_vip_key(data):
+    return data[const.LISTEN_IP]
+
+
+class _Job(object):
+    __slots__ = ('keys', 'func', 'args', 'kwargs', 'enqueued_at',
+                 'waiting_queues')
+
+    def __init__(self, keys, func, args, kwargs):
+        self.keys = keys
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.time()
+        # count of queues this job is not at head of
+        self.waiting_queues = 0
+
+
+class VIPDispatcher(object):
+    """Run jobs in per vip order, by a bounded worker pool.
+
+    Each job has keys of vips it works on, and it's appended to queue of
+    each key. A job runs when it's at head of all its queues, so jobs on a
+    vip run in the order they are dispatched, while jobs on different vips
+    run concurrently by at most workers green threads. Vip is the key since
+    virtual servers on a vip share its state, e.g. whether it's plugged.
+    With workers 0, jobs run in caller directly.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._queues = {}
+        self._ready = collections.deque()
+        self._running = 0
+        self._queued = 0
+        self._stats = {'jobs_dispatched': 0, 'jobs_failed': 0,
+                       'wait_seconds_total': 0.0, 'wait_seconds_max': 0.0}
+
+    def dispatch(self, keys, func, *args, **kwargs):
+        keys = set(keys)
+        if not self.workers or not keys:
+            func(*args, **kwargs)
+            return
+        job = _Job(keys, func, args, kwargs)
+        for key in keys:
+            queue = self._queues.setdefault(key, collections.deque())
+            if queue:
+                job.waiting_queues += 1
+            queue.append(job)
+        self._queued += 1
+        self._stats['jobs_dispatched'] += 1
+        if not job.waiting_queues:
+            self._ready.append(job)
+            self._spawn_workers()
+
+    def _spawn_workers(self):
+        while self._ready and self._running < self.workers:
+            self._running += 1
+            eventlet.spawn_n(self._work)
+
+    def _work(self):
+        try:
+            while self._ready:
+                job = self._ready.popleft()
+                wait = time.time() - job.enqueued_at
+                self._stats['wait_seconds_total'] += wait
+                self._stats['wait_seconds_max'] = max(
+                    self._stats['wait_seconds_max'], wait)
+                try:
+                    job.func(*job.args, **job.kwargs)
+                except Exception:
+                    self._stats['jobs_failed'] += 1
+                    LOG.exception(_LE("Failed to run %s"), job.func)
+                finally:
+                    self._finish(job)
+        finally:
+            self._running -= 1
+
+    def _finish(self, job):
+        self._queued -= 1
+        for key in job.keys:
+            queue = self._queues[key]
+            queue.popleft()
+            if not queue:
+                del self._queues[key]
+                continue
+            head = queue[0]
+            head.waiting_queues -= 1
+            if not head.waiting_queues:
+                self._ready.append(head)
+        self._spawn_workers()
+
+    def get_stats(self):
+        stats = dict(self._stats)
+        stats.update({
+            'jobs_queued': self._queued,
+            'workers_running': self._running,
+            'vip_queues': len(self._queues),
+            'vip_queue_depth_max': max(
+                [len(queue) for queue in self._queues.values()] or [0])})
+        return stats
@@ -21,16 +21,33 @@ from networking_ipvs.drivers.keepalived import templates
 
 KEEPALIVED_DRIVER = (
     'networking_ipvs.drivers.keepalived.keepalived_driver.IPVSDriver')
+NETLINK_DRIVER = (
+    'networking_ipvs.drivers.netlink.netlink_driver.IPVSDriver')
+IPVSADM_DRIVER = (
+    'networking_ipvs.drivers.ipvsadm.ipvsadm_driver.IPVSDriver')
 AGENT_OPTS = [
     cfg.IntOpt(
         'periodic_interval',
         default=15,
         help=_('Seconds between periodic task runs')
     ),
+    cfg.IntOpt(
+        'vip_dispatch_workers',
+        default=8,
+        help=_('Max green threads handling notifications. Notifications '
+               'on a vip are handled in order, those on different vips '
+               'are handled concurrently. Catch-ups with upstream and vip '
+               'reconciles wait for running notifications and run alone. '
+               '0 means handling them in RPC threads directly.')
+    ),
     cfg.StrOpt(
         const.DEVICE_DRIVER,
         default=KEEPALIVED_DRIVER,
-        help=_('Drivers used to manage loadbalancing devices'),
+        help=_('Drivers used to manage loadbalancing devices, e.g. %s '
+               'which reloads keepalived, %s which programs IPVS by '
+               'netlink directly, or %s which applies ipvsadm restore '
+               'streams') % (KEEPALIVED_DRIVER, NETLINK_DRIVER,
+                             IPVSADM_DRIVER),
     ),
 ]
 
@@ -41,6 +58,32 @@ DRIVER_OPTS = [
         default='*:eth0',
         help=_('NICs to add ipvs vip on'),
     ),
+    cfg.StrOpt(
+        'ipvs_vip_nic_backend',
+        default='ip_lib',
+        choices=['ip_lib', 'netlink'],
+        help=_('How vips are added on NICs, ip_lib runs ip command for '
+               'each vip, netlink adds or deletes vips in batch by one '
+               'rtnetlink socket'),
+    ),
+    cfg.IntOpt(
+        'vip_reconcile_interval',
+        default=0,
+        help=_('Seconds between checks which compare vips on NICs with '
+               'deployed virtual servers and fix differences. 0 means '
+               'disabled. It runs at most once per periodic_interval. '
+               'It unplugs /32 addresses without live virtual servers if '
+               'agent plugged them, has virtual servers on them, or they '
+               'are in cidrs of ipvs_vip_nic_mapping, so those cidrs '
+               'should not cover host or other services\' addresses. '
+               'Notifications wait while a check runs.'),
+    ),
+    cfg.FloatOpt(
+        'vip_reconcile_budget',
+        default=5.0,
+        help=_('Max seconds a vip check can spend on fixing vips, vips '
+               'left are fixed by next check. 0 means no limit.'),
+    ),
     cfg.StrOpt(
         'ipvs_sync_daemon_nic',
         default='',
@@ -70,6 +113,40 @@ REVISION_OPTS = [
 ]
 
 
+PLUGIN_OPTS = [
+    cfg.IntOpt(
+        'revision_compact_interval',
+        default=3600,
+        help=_('Seconds between compactions of deleted revisions and '
+               'revision logs. 0 means disabled.'),
+    ),
+    cfg.IntOpt(
+        'revision_snapshot_interval',
+        default=600,
+        help=_('Seconds between revision snapshots, which are full states '
+               'new or long offline agents load before catching up with '
+               'revision logs. 0 means disabled.'),
+    ),
+    cfg.BoolOpt(
+        'revision_md5',
+        default=True,
+        help=_('Render virtual server conf to get its MD5 when it changes. '
+               'Agents which compare structural digest don\'t need it, it '
+               'can be disabled when no agent compares MD5, otherwise such '
+               'agents catch up with upstream on every notification.'),
+    ),
+    cfg.IntOpt(
+        'revision_tombstone_retention',
+        default=86400,
+        help=_('Seconds deleted revisions are kept at least, so agents '
+               'down for a while can still catch up without a full '
+               'resync. Deleted revisions are also kept as long as any '
+               'live agent holds a revision older than them. Revision logs '
+               'are kept the same way.'),
+    ),
+]
+
+
 KEEPALIVED_DRIVER_OPTS = [
     cfg.StrOpt(
         'keepalived_conf_path',
@@ -101,4 +178,40 @@ KEEPALIVED_DRIVER_OPTS = [
         default=30,
         help=_('smtp_connect_timeout in keepalived.conf'),
     ),
+    cfg.FloatOpt(
+        'reload_coalesce_window',
+        default=1.0,
+        help=_('Seconds to wait for further changes before reloading '
+               'keepalived, changes in the window share one reload. '
+               '0 means reload after every change.'),
+    ),
+    cfg.FloatOpt(
+        'reload_max_delay',
+        default=5.0,
+        help=_('Max seconds a pending keepalived reload can be deferred '
+               'by changes which keep arriving.'),
+    ),
+    cfg.IntOpt(
+        'conf_parse_workers',
+        default=0,
+        help=_('Number of processes parsing virtual server conf files '
+               'when agent starts. 0 means CPU count, 1 means parsing '
+               'in agent process.'),
+    ),
+    cfg.StrOpt(
+        'vs_cache_snapshot_path',
+        default='/var/lib/neutron/networking_ipvs_vs_cache',
+        help=_('Path of virtual server cache snapshot, which lets agent '
+               'parse only changed virtual server conf files when it '
+               'starts. Changes are appended to a journal next to it '
+               'every periodic_interval and when agent stops. Empty '
+               'means disabled.'),
+    ),
+    cfg.StrOpt(
+        'template_cache_path',
+        default='/var/lib/neutron/networking_ipvs_templates',
+        help=_('Path to cache compiled keepalived conf templates, so agent '
+               'doesn\'t compile them again when it restarts. Empty means '
+               'disabled.'),
+    ),
 ]
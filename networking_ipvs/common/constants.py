@@ -50,7 +50,11 @@ IPVS_PORT_DEVICE_OWNER = (
 ID = 'id'
 EXTRA = 'extra'
 MD5 = 'md5'
+# structural digest of virtual server, see common/digest.py
+DIGEST = 'digest'
 TIMESTAMP = 'timestamp'
+# sequence number of revision writes
+REVISION = 'revision'
 WHAT_CHANGED = 'what_changed'
 SCHEDULER = 'scheduler'
 LISTEN_IP = 'listen_ip'
@@ -0,0 +1,83 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Structural digest of a virtual server and its real servers.
+
+Digest is XOR of md5 of canonical virtual server fields and md5 of
+canonical fields of each real server. So it doesn't depend on real server
+order or conf file rendering, and it can be updated when one real server
+changes by XORing out its old md5 and XORing in the new one. Digests are
+formatted as "version:hex", digests of other versions are not comparable.
+"""
+
+import hashlib
+
+from networking_ipvs.common import constants as const
+
+# bump it when fields or their canonical form change
+DIGEST_VERSION = 1
+VIRTUALSERVER_FIELDS = (const.LISTEN_IP, const.LISTEN_PORT, const.SCHEDULER,
+                        const.FORWARD_METHOD, const.ADMIN_STATE_UP)
+REALSERVER_FIELDS = (const.SERVER_IP, const.SERVER_PORT, const.WEIGHT,
+                     const.DELAY, const.TIMEOUT, const.MAX_RETRIES,
+                     const.ADMIN_STATE_UP)
+
+
+def _canonical(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return str(value)
+
+
+def _hash(data, fields):
+    return int(hashlib.md5('\0'.join(
+        _canonical(data[k]) for k in fields)).hexdigest(), 16)
+
+
+def get_vs_hash(vs_info):
+    return _hash(vs_info, VIRTUALSERVER_FIELDS)
+
+
+def get_rs_hash(rs):
+    return _hash(rs, REALSERVER_FIELDS)
+
+
+def get_rs_hashes(realservers):
+    """Get XOR of md5 of real servers, real servers part of digest."""
+    ret = 0
+    for rs in realservers:
+        ret ^= get_rs_hash(rs)
+    return ret
+
+
+def format_digest(vs_hash, rs_hashes):
+    return '%d:%032x' % (DIGEST_VERSION, vs_hash ^ rs_hashes)
+
+
+def update_digest(digest, old_hash, new_hash):
+    """Replace md5 of a changed part of digest, e.g. a real server.
+
+    Hash is 0 for a part created or deleted. Digest must be comparable.
+    """
+    return format_digest(int(digest.split(':', 1)[1], 16),
+                         old_hash ^ new_hash)
+
+
+def get_digest(vs_info, realservers):
+    return format_digest(get_vs_hash(vs_info), get_rs_hashes(realservers))
+
+
+def is_comparable(digest):
+    """Whether digest is of the version this code computes."""
+    return bool(digest) and digest.split(':', 1)[0] == str(DIGEST_VERSION)
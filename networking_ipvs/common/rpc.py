@@ -25,6 +25,14 @@ from networking_ipvs.common import constants as const
 from networking_ipvs.common import utils
 
 
+# max virtual servers returned by one get_virtualserver_details call
+MAX_DETAILS_PAGE_SIZE = 1000
+# max revisions returned by one get_revisions_page call
+MAX_REVISIONS_PAGE_SIZE = 5000
+# max revision logs returned by one get_revision_logs call
+MAX_REVISION_LOGS_PAGE_SIZE = 5000
+
+
 def start_rpc_listener(topic, endpoints):
     conn = n_rpc.create_connection()
     conn.create_consumer(topic, endpoints, fanout=False)
@@ -50,11 +58,12 @@ class PluginNotifyEndpoint(object):
             for admin_state_down, param virtualservers is {
                 "virtualservers": {
                     id: {"listen_ip": listen_ip, "listen_port': listen_port,
-                         "md5": md5},
+                         "md5": md5, "digest": digest},
                     ...
                     },
                 "admin_state_up": admin_state_up,
-                "timestamp": timestamp
+                "timestamp": timestamp,
+                "revision": revision
             }
             for admin_state_up, param virtualservers is {
                 "virtualservers": {
@@ -66,12 +75,14 @@ class PluginNotifyEndpoint(object):
                              "server_ip": server_ip,
                              "server_port": server_port
                          },
-                         "md5": md5
+                         "md5": md5,
+                         "digest": digest
                         },
                     ...,
                     }
                 "admin_state_up": admin_state_up,
-                "timestamp": timestamp
+                "timestamp": timestamp,
+                "revision": revision
             }
         """
         pass
@@ -86,6 +97,7 @@ class PluginNotifyEndpoint(object):
                     ...,
                     },
                 "timestamp": timestamp,
+                "revision": revision,
                 "admin_state_up": admin_state_up,
             }
         """
@@ -97,7 +109,9 @@ class PluginNotifyEndpoint(object):
                 "listen_ip": listen_ip,
                 "listen_port': listen_port,
                 "timestamp": timestamp,
+                "revision": revision,
                 "md5": md5,
+                "digest": digest,
                 ANY_CHANGED_KEYS: NEW_VALUE
             }
             for admin_state_up, param virtualserver is {
@@ -106,8 +120,10 @@ class PluginNotifyEndpoint(object):
                 "scheduler": scheduler,
                 "forward_method": forward_method,
                 "md5": md5
+                "digest": digest,
                 "admin_state_up": admin_state_up,
-                "timestamp": timestamp
+                "timestamp": timestamp,
+                "revision": revision
             }
         """
         pass
@@ -118,6 +134,7 @@ class PluginNotifyEndpoint(object):
                 "listen_ip": listen_ip,
                 "listen_port': listen_port,
                 "timestamp": timestamp,
+                "revision": revision,
             }
         """
         pass
@@ -134,11 +151,13 @@ class PluginNotifyEndpoint(object):
                 "max_retries": max_retries,
                 "admin_state_up": admin_state_up,
                 "timestamp": timestamp,
+                "revision": revision,
                 "listen_ip": listen_ip,
                 "listen_port': listen_port,
                 "scheduler": scheduler,
                 "forward_method": forward_method,
                 "md5": parent_md5,
+                "digest": parent_digest,
             }
         """
         pass
@@ -150,9 +169,11 @@ class PluginNotifyEndpoint(object):
                 "server_ip": server_ip,
                 "server_port": server_port,
                 "timestamp": timestamp,
+                "revision": revision,
                 "listen_ip": listen_ip,
                 "listen_port': listen_port,
                 "md5": parent_md5,
+                "digest": parent_digest,
                 ANY_CHANGED_KEYS: NEW_VALUE
             }
         """
@@ -165,9 +186,11 @@ class PluginNotifyEndpoint(object):
                 "server_ip": server_ip,
                 "server_port": server_port,
                 "timestamp": timestamp,
+                "revision": revision,
                 "listen_ip": listen_ip,
                 "listen_port': listen_port,
                 "md5": parent_md5,
+                "digest": parent_digest,
             }
         """
         pass
@@ -301,6 +324,8 @@ class PluginMQNotifyMech(object):
             elif action == const.DELETE:
                 data[const.TIMESTAMP] = self._get_timestamp(
                     context, res_id, action)
+                data[const.REVISION] = self._get_revision_seq(
+                    context, res_id)
             self._do_notify(context, method, data)
 
 
@@ -381,6 +406,28 @@ class PluginRPCClient(object):
         return cctxt.call(self.context, 'get_revisions',
                           start=start, end=end)
 
+    def get_revisions_page(self, start, end=None, limit=None, marker=None,
+                           details=False):
+        cctxt = self.client.prepare()
+        return cctxt.call(self.context, 'get_revisions_page',
+                          start=start, end=end, limit=limit, marker=marker,
+                          details=details)
+
+    def get_revision_logs(self, start, end=None, limit=None):
+        cctxt = self.client.prepare()
+        return cctxt.call(self.context, 'get_revision_logs',
+                          start=start, end=end, limit=limit)
+
+    def get_revision_snapshot(self, seq=None, chunk=0):
+        cctxt = self.client.prepare()
+        return cctxt.call(self.context, 'get_revision_snapshot',
+                          seq=seq, chunk=chunk)
+
+    def get_virtualserver_details(self, vs_ids, limit=None, marker=None):
+        cctxt = self.client.prepare()
+        return cctxt.call(self.context, 'get_virtualserver_details',
+                          vs_ids=vs_ids, limit=limit, marker=marker)
+
 
 class PluginRPC(object):
     """Plugin side callbacks for PluginRPCClient"""
@@ -405,3 +452,23 @@ class PluginRPC(object):
 
     def get_revisions(self, context, start, end):
         return self.plugin.get_revisions(context, start, end)
+
+    def get_revisions_page(self, context, start, end, limit, marker,
+                           details=False):
+        return self.plugin.get_revisions_page(
+            context, start, end, min(limit or MAX_REVISIONS_PAGE_SIZE,
+                                     MAX_REVISIONS_PAGE_SIZE), marker,
+            details)
+
+    def get_revision_logs(self, context, start, end, limit):
+        return self.plugin.get_revision_logs(
+            context, start, end, min(limit or MAX_REVISION_LOGS_PAGE_SIZE,
+                                     MAX_REVISION_LOGS_PAGE_SIZE))
+
+    def get_revision_snapshot(self, context, seq, chunk):
+        return self.plugin.get_revision_snapshot(context, seq, chunk)
+
+    def get_virtualserver_details(self, context, vs_ids, limit, marker):
+        return self.plugin.get_virtualserver_details(
+            context, vs_ids, min(limit or MAX_DETAILS_PAGE_SIZE,
+                                 MAX_DETAILS_PAGE_SIZE), marker)
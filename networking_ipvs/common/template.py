@@ -15,22 +15,48 @@
 import jinja2
 import os
 
-from networking_ipvs.common import constants as const
+from oslo_utils import fileutils
+
 from networking_ipvs.drivers.keepalived import templates
 
+_TEMPLATE_ENV = None
+_TEMPLATES = {}
 
-class VirtualServerTemplate(object):
 
-    def __init__(self):
-        template_loader = jinja2.FileSystemLoader(
-            searchpath=templates.templates_path)
-        self._template_env = jinja2.Environment(
-            loader=template_loader, trim_blocks=True, lstrip_blocks=True)
+def _get_template_env():
+    global _TEMPLATE_ENV
+    if _TEMPLATE_ENV is None:
+        _TEMPLATE_ENV = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(
+                searchpath=templates.templates_path),
+            trim_blocks=True, lstrip_blocks=True, auto_reload=False)
+    return _TEMPLATE_ENV
+
+
+def set_bytecode_cache_path(cache_path):
+    """Cache compiled templates under cache_path, so new processes don't
+    need to compile them again. Empty cache_path means no cache.
+    """
+    bytecode_cache = None
+    if cache_path:
+        # only agent should write here, not anyone sharing the directory
+        fileutils.ensure_tree(cache_path, mode=0o700)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(cache_path)
+    _get_template_env().bytecode_cache = bytecode_cache
+
+
+def get_template(name):
+    """Get compiled template, it's loaded once and shared in process."""
+    if name not in _TEMPLATES:
+        _TEMPLATES[name] = _get_template_env().get_template(name)
+    return _TEMPLATES[name]
+
+
+class VirtualServerTemplate(object):
 
     @property
     def _virtualserver_template(self):
-        return self._template_env.get_template(
-            templates.virtualserver_template_name)
+        return get_template(templates.virtualserver_template_name)
 
     def get_virtualserver_conf(self, vs_info, realservers):
         realservers.sort(key=lambda x: x['id'])
@@ -44,13 +70,13 @@ class KeepalivedTemplate(VirtualServerTemplate):
         super(KeepalivedTemplate, self).__init__()
         self.conf = conf
         self.vs_conf_path = self.conf.keepalived.virtualserver_conf_path
+        set_bytecode_cache_path(self.conf.keepalived.template_cache_path)
 
     @property
     def _template(self):
-        return self._template_env.get_template(
-            templates.keepalived_template_name)
+        return get_template(templates.keepalived_template_name)
 
-    def get_main_conf(self):
+    def get_main_conf(self, virtualservers):
         def get_globals():
             notify_emails = self.conf.keepalived.notify_emails
             if not notify_emails:
@@ -63,8 +89,6 @@ class KeepalivedTemplate(VirtualServerTemplate):
 
         return self._template.render({
             "globals": get_globals(),
-            "virtualservers": [
-                f for f in os.listdir(self.vs_conf_path)
-                if f[-5:] != const.DOWN],
+            "virtualservers": virtualservers,
             "os_sep": os.sep,
             "include_path": self.vs_conf_path})
@@ -0,0 +1,59 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add revision seq
+
+Revision ID: 1f6c3a9b7d20
+Revises: 5d2e8f7a1c34
+Create Date: 2018-04-16 11:42:50.713928
+
+"""
+
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '1f6c3a9b7d20'
+down_revision = '5d2e8f7a1c34'
+
+BATCH_SIZE = 1000
+
+
+def upgrade():
+    op.add_column('ipvs_revisions', sa.Column('seq', sa.BigInteger()))
+    op.add_column('ipvs_revision_watermarks',
+                  sa.Column('seq', sa.BigInteger(), nullable=False,
+                            server_default='0'))
+    # number existing revisions in the order they were last changed
+    revisions = sa.table('ipvs_revisions', sa.column('id'),
+                         sa.column('seq'), sa.column('last_changed_at'))
+    bind = op.get_bind()
+    ids = [row[0] for row in bind.execute(
+        sa.select([revisions.c.id]).order_by(
+            revisions.c.last_changed_at, revisions.c.id))]
+    update = revisions.update().where(
+        revisions.c.id == sa.bindparam('_id')).values(
+            seq=sa.bindparam('_seq'))
+    for i in range(0, len(ids), BATCH_SIZE):
+        bind.execute(update, [{'_id': _id, '_seq': i + j + 1}
+                              for j, _id in enumerate(ids[i:i + BATCH_SIZE])])
+    watermarks = sa.table('ipvs_revision_watermarks', sa.column('name'),
+                          sa.column('watermark'), sa.column('seq'))
+    op.bulk_insert(watermarks, [{'name': 'revisions',
+                                 'watermark': datetime.datetime.utcnow(),
+                                 'seq': len(ids)}])
+    op.create_index('ix_ipvs_revisions_seq_id',
+                    'ipvs_revisions', ['seq', 'id'])
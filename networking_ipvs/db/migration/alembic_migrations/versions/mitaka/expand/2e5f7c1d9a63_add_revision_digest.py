@@ -0,0 +1,35 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add revision digest
+
+Revision ID: 2e5f7c1d9a63
+Revises: 6c0d3f8a2b95
+Create Date: 2018-05-03 09:47:26.093581
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '2e5f7c1d9a63'
+down_revision = '6c0d3f8a2b95'
+
+
+def upgrade():
+    # digest is filled when virtual servers change, agents compare md5
+    # before that
+    op.add_column('ipvs_revisions',
+                  sa.Column('digest', sa.String(length=64)))
@@ -0,0 +1,36 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add revision watermarks
+
+Revision ID: 3b1a0c9d4e52
+Revises: 7ed83f5168d
+Create Date: 2018-04-02 10:21:37.184215
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '3b1a0c9d4e52'
+down_revision = '7ed83f5168d'
+
+
+def upgrade():
+    op.create_table(
+        'ipvs_revision_watermarks',
+        sa.Column('name', sa.String(36), primary_key=True),
+        sa.Column('watermark', sa.DateTime(), nullable=False),
+    )
@@ -0,0 +1,57 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add revision logs
+
+Revision ID: 4a7b9e2c6f18
+Revises: 1f6c3a9b7d20
+Create Date: 2018-04-23 14:05:12.318406
+
+"""
+
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from networking_ipvs.common import constants as const
+
+revision = '4a7b9e2c6f18'
+down_revision = '1f6c3a9b7d20'
+
+resource_types = sa.Enum(*const.SUPPORTED_RESOURCE_TYPES)
+operations = sa.Enum(*const.SUPPORTED_ACTIONS)
+
+
+def upgrade():
+    op.create_table(
+        'ipvs_revision_logs',
+        sa.Column('seq', sa.BigInteger(), primary_key=True,
+                  autoincrement=False),
+        sa.Column('resource_type', resource_types, nullable=False),
+        sa.Column('resource_id', sa.String(36), nullable=False),
+        sa.Column('operation', operations, nullable=False),
+        sa.Column('payload', sa.Text()),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
+    # revisions written so far are not logged, agents behind them should
+    # do a full resync
+    watermarks = sa.table('ipvs_revision_watermarks', sa.column('name'),
+                          sa.column('watermark'), sa.column('seq'))
+    seq = op.get_bind().execute(sa.select([watermarks.c.seq]).where(
+        watermarks.c.name == 'revisions')).scalar()
+    op.bulk_insert(watermarks, [{'name': 'logs',
+                                 'watermark': datetime.datetime.utcnow(),
+                                 'seq': seq or 0}])
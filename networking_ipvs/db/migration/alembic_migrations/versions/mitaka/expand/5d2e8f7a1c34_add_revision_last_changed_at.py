@@ -0,0 +1,39 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add revision last_changed_at and indexes
+
+Revision ID: 5d2e8f7a1c34
+Revises: 3b1a0c9d4e52
+Create Date: 2018-04-09 16:05:12.527306
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '5d2e8f7a1c34'
+down_revision = '3b1a0c9d4e52'
+
+
+def upgrade():
+    op.add_column('ipvs_revisions',
+                  sa.Column('last_changed_at', sa.DateTime()))
+    op.execute('UPDATE ipvs_revisions SET last_changed_at = '
+               'COALESCE(deleted_at, updated_at, created_at)')
+    op.create_index('ix_ipvs_revisions_last_changed_at_id',
+                    'ipvs_revisions', ['last_changed_at', 'id'])
+    op.create_index('ix_ipvs_revisions_parent_id',
+                    'ipvs_revisions', ['parent_id'])
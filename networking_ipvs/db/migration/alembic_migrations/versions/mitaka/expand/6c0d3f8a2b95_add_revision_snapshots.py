@@ -0,0 +1,41 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+#
+
+"""add revision snapshots
+
+Revision ID: 6c0d3f8a2b95
+Revises: 4a7b9e2c6f18
+Create Date: 2018-04-27 16:31:08.540127
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = '6c0d3f8a2b95'
+down_revision = '4a7b9e2c6f18'
+
+
+def upgrade():
+    op.create_table(
+        'ipvs_revision_snapshots',
+        sa.Column('seq', sa.BigInteger(), primary_key=True,
+                  autoincrement=False),
+        sa.Column('chunk', sa.Integer(), primary_key=True,
+                  autoincrement=False),
+        sa.Column('chunks', sa.Integer(), nullable=False),
+        sa.Column('data', sa.LargeBinary(2 ** 24 - 1), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+    )
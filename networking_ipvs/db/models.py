@@ -91,7 +91,53 @@ class Revision(model_base.BASEV2, models_v2.HasId):
     created_at = sa.Column(sa.DateTime())
     updated_at = sa.Column(sa.DateTime())
     deleted_at = sa.Column(sa.DateTime())
+    # the latest of created_at, updated_at and deleted_at
+    last_changed_at = sa.Column(sa.DateTime())
+    # sequence number of the latest write
+    seq = sa.Column(sa.BigInteger())
     extra = sa.Column(sa.String(length=128))
+    # structural digest of virtual server
+    digest = sa.Column(sa.String(length=64))
+    __table_args__ = (
+        sa.Index('ix_ipvs_revisions_last_changed_at_id',
+                 'last_changed_at', 'id'),
+        sa.Index('ix_ipvs_revisions_seq_id', 'seq', 'id'),
+        sa.Index('ix_ipvs_revisions_parent_id', 'parent_id'),
+    )
+
+
+class RevisionWatermark(model_base.BASEV2):
+
+    __tablename__ = "ipvs_revision_watermarks"
+    name = sa.Column(sa.String(36), primary_key=True)
+    watermark = sa.Column(sa.DateTime(), nullable=False)
+    seq = sa.Column(sa.BigInteger(), nullable=False, server_default='0')
+
+
+class RevisionLog(model_base.BASEV2):
+
+    __tablename__ = "ipvs_revision_logs"
+    # seq of the revision write logged
+    seq = sa.Column(sa.BigInteger(), primary_key=True, autoincrement=False)
+    resource_type = sa.Column(sa.Enum(*const.SUPPORTED_RESOURCE_TYPES),
+                              nullable=False)
+    resource_id = sa.Column(sa.String(36), nullable=False)
+    operation = sa.Column(sa.Enum(*const.SUPPORTED_ACTIONS), nullable=False)
+    # JSON of what agents need to apply the change
+    payload = sa.Column(sa.Text())
+    created_at = sa.Column(sa.DateTime(), nullable=False)
+
+
+class RevisionSnapshot(model_base.BASEV2):
+
+    __tablename__ = "ipvs_revision_snapshots"
+    # seq of the latest revision write the snapshot has
+    seq = sa.Column(sa.BigInteger(), primary_key=True, autoincrement=False)
+    chunk = sa.Column(sa.Integer(), primary_key=True, autoincrement=False)
+    chunks = sa.Column(sa.Integer(), nullable=False)
+    # length makes it MEDIUMBLOB for MySQL
+    data = sa.Column(sa.LargeBinary(2 ** 24 - 1), nullable=False)
+    created_at = sa.Column(sa.DateTime(), nullable=False)
 
 
 class Quota(model_base.BASEV2):
@@ -24,6 +24,7 @@ from oslo_utils import timeutils
 from oslo_utils import uuidutils
 
 from networking_ipvs.common import constants as const
+from networking_ipvs.common import digest
 from networking_ipvs.common import utils
 from networking_ipvs.common import exceptions as ipvs_exc
 from networking_ipvs.db import models
@@ -108,28 +109,38 @@ class NetworkingIPVSPluginDb(ipvs_ext.NetworkingIPVSPluginBase,
         model = self._get_model(resource_type)
         self._usage_check(context, resource_type, model)
         utils.scheduler_format(data)
-        try:
-            with context.session.begin(subtransactions=True):
-                db_inst = model(
-                    id=uuidutils.generate_uuid(),
-                    **data)
-                context.session.add(db_inst)
-        except db_exc.DBDuplicateEntry:
-            if resource_type == const.IPVS_VIRTUALSERVER:
-                raise ipvs_exc.VirtualServerEntityExists(
-                    listen_ip=data[const.LISTEN_IP],
-                    listen_port=data[const.LISTEN_PORT],
-                    neutron_network_id=data['neutron_network_id'])
-            elif resource_type == const.IPVS_REALSERVER:
-                raise ipvs_exc.RealServerEntityExists(
-                    server_ip=data[const.SERVER_IP],
-                    server_port=data[const.SERVER_PORT],
-                    ipvs_virtualserver_id=data['ipvs_virtualserver_id'])
-        inst_dict = self._make_resource_dict(db_inst)
-        parent_id = inst_dict.get('ipvs_loadbalancer_id') or inst_dict.get(
-            'ipvs_virtualserver_id')
-        self._update_revisions(context, inst_dict[const.ID], resource_type,
-                               const.CREATE, parent_id=parent_id)
+        # resource, its revision and revision log are written in one
+        # transaction, so agents tailing revision logs miss nothing
+        with context.session.begin(subtransactions=True):
+            try:
+                with context.session.begin(subtransactions=True):
+                    db_inst = model(
+                        id=uuidutils.generate_uuid(),
+                        **data)
+                    context.session.add(db_inst)
+            except db_exc.DBDuplicateEntry:
+                if resource_type == const.IPVS_VIRTUALSERVER:
+                    raise ipvs_exc.VirtualServerEntityExists(
+                        listen_ip=data[const.LISTEN_IP],
+                        listen_port=data[const.LISTEN_PORT],
+                        neutron_network_id=data['neutron_network_id'])
+                elif resource_type == const.IPVS_REALSERVER:
+                    raise ipvs_exc.RealServerEntityExists(
+                        server_ip=data[const.SERVER_IP],
+                        server_port=data[const.SERVER_PORT],
+                        ipvs_virtualserver_id=data['ipvs_virtualserver_id'])
+                raise
+            inst_dict = self._make_resource_dict(db_inst)
+            parent_id = inst_dict.get(
+                'ipvs_loadbalancer_id') or inst_dict.get(
+                    'ipvs_virtualserver_id')
+            payload = dbutil.compose_revision_log_payload(
+                resource_type, const.CREATE, inst_dict)
+            self._update_revisions(context, inst_dict[const.ID],
+                                   resource_type, const.CREATE,
+                                   parent_id=parent_id, payload=payload)
+            self._update_digests(context, resource_type, db_inst, None,
+                                 inst_dict)
         return inst_dict
 
     def _db_update(self, context, id, resource):
@@ -137,32 +148,64 @@ class NetworkingIPVSPluginDb(ipvs_ext.NetworkingIPVSPluginBase,
         utils.scheduler_format(data)
         model = self._get_model(resource_type)
         with context.session.begin(subtransactions=True):
+            with context.session.begin(subtransactions=True):
+                db_inst = self._get_resource(context, model, id)
+                before_change = self._make_resource_dict(db_inst)
+                db_inst.update(data)
             db_inst = self._get_resource(context, model, id)
-            before_change = self._make_resource_dict(db_inst)
-            db_inst.update(data)
-        db_inst = self._get_resource(context, model, id)
-        after_change = self._make_resource_dict(db_inst)
-        what_changed = [
-            k for k in after_change
-            if k in const.NOTIFY_KEY_MAP[resource_type] and (
-                after_change[k] != before_change[k])]
-        vs_ids, rs_ids = None, None
-        if const.ADMIN_STATE_UP in what_changed and (
-                resource_type != const.IPVS_REALSERVER):
-            vs_keys, rs_keys = dbutil.get_subresource_keys(
-                resource_type, db_inst, False)
-            vs_ids, rs_ids = vs_keys.keys(), rs_keys.keys()
-            if vs_ids or rs_ids:
-                self._update_subresource_admin_state(
-                    context, vs_ids, rs_ids, db_inst.admin_state_up)
-            after_change = self._make_resource_dict(self._get_resource(
-                context, model, id))
-        if what_changed:
-            after_change.update({const.WHAT_CHANGED: what_changed})
-            self._update_revisions(context, id, resource_type, const.UPDATE,
-                                   sub_vs_keys=vs_ids, sub_rs_keys=rs_ids)
+            after_change = self._make_resource_dict(db_inst)
+            what_changed = [
+                k for k in after_change
+                if k in const.NOTIFY_KEY_MAP[resource_type] and (
+                    after_change[k] != before_change[k])]
+            vs_ids, rs_ids = None, None
+            if const.ADMIN_STATE_UP in what_changed and (
+                    resource_type != const.IPVS_REALSERVER):
+                vs_keys, rs_keys = dbutil.get_subresource_keys(
+                    resource_type, db_inst, False)
+                vs_ids, rs_ids = vs_keys.keys(), rs_keys.keys()
+                if vs_ids or rs_ids:
+                    self._update_subresource_admin_state(
+                        context, vs_ids, rs_ids, db_inst.admin_state_up)
+                after_change = self._make_resource_dict(self._get_resource(
+                    context, model, id))
+            if what_changed:
+                after_change.update({const.WHAT_CHANGED: what_changed})
+                payload = dbutil.compose_revision_log_payload(
+                    resource_type, const.UPDATE, after_change)
+                self._update_revisions(
+                    context, id, resource_type, const.UPDATE,
+                    sub_vs_keys=vs_ids, sub_rs_keys=rs_ids, payload=payload)
+                self._update_digests(context, resource_type, db_inst,
+                                     before_change, after_change)
         return after_change
 
+    def _update_digests(self, context, resource_type, db_inst, before,
+                        after):
+        """Update digests of virtual servers changed with a resource.
+
+        before is None for a resource created, after is None for a real
+        server deleted. Revisions of deleted virtual servers are deleted,
+        their digests are not updated.
+        """
+        if resource_type == const.IPVS_REALSERVER:
+            self._replace_in_virtualserver_digest(
+                context, db_inst.ipvs_virtualserver,
+                digest.get_rs_hash(before) if before else 0,
+                digest.get_rs_hash(after) if after else 0)
+        elif resource_type == const.IPVS_VIRTUALSERVER:
+            if before and (before[const.ADMIN_STATE_UP] ==
+                           after[const.ADMIN_STATE_UP]):
+                # real servers are not changed with it
+                self._replace_in_virtualserver_digest(
+                    context, db_inst, digest.get_vs_hash(before),
+                    digest.get_vs_hash(after))
+            else:
+                self._set_virtualserver_digest(context, db_inst)
+        else:
+            for vs_inst in db_inst.virtual_servers:
+                self._set_virtualserver_digest(context, vs_inst)
+
     def _update_subresource_admin_state(self, context, vs_ids, rs_ids, up):
         vs_bulk_updating = [
             {const.ID: _id, const.ADMIN_STATE_UP: up} for _id in vs_ids]
@@ -186,11 +229,19 @@ class NetworkingIPVSPluginDb(ipvs_ext.NetworkingIPVSPluginBase,
                 raise ipvs_exc.ResourceInUse(resource=resource_type, id=id)
         extra = self._get_revision_extra_for_deletion(resource_type, db_inst)
         inst_dict = self._make_resource_dict(db_inst)
+        payload = dbutil.compose_revision_log_payload(
+            resource_type, const.DELETE, inst_dict)
         with context.session.begin(subtransactions=True):
             context.session.delete(db_inst)
-        self._update_revisions(context, id, resource_type, const.DELETE,
-                               sub_vs_keys=vs_keys, sub_rs_keys=rs_keys,
-                               extra=extra)
+            self._update_revisions(context, id, resource_type, const.DELETE,
+                                   sub_vs_keys=vs_keys, sub_rs_keys=rs_keys,
+                                   extra=extra, payload=payload)
+            if resource_type == const.IPVS_REALSERVER:
+                # real servers of its virtual server are loaded with it
+                context.session.expire(db_inst.ipvs_virtualserver,
+                                       [const.REALSERVERS])
+                self._update_digests(context, resource_type, db_inst,
+                                     inst_dict, None)
         return inst_dict
 
     def _db_get(self, context, resource, id, fields=None):
@@ -13,16 +13,23 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
 import hashlib
+import zlib
+
 import sqlalchemy as sa
 from sqlalchemy.orm import exc
 from sqlalchemy.sql import expression as expr
 
 from neutron.db import common_db_mixin
+from oslo_config import cfg
+from oslo_db import exception as db_exc
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 from oslo_utils import timeutils
 
 from networking_ipvs.common import constants as const
+from networking_ipvs.common import digest
 from networking_ipvs.common import exceptions as ipvs_exc
 from networking_ipvs.common import template
 from networking_ipvs.common import utils
@@ -34,6 +41,19 @@ LOG = logging.getLogger(__name__)
 
 
 Revision = models.Revision
+RevisionLog = models.RevisionLog
+RevisionSnapshot = models.RevisionSnapshot
+RevisionWatermark = models.RevisionWatermark
+# seq of this watermark is the last seq given to revision writes
+REVISION_SEQ = 'revisions'
+# deleted revisions with seq not greater than seq of this watermark may
+# have been removed
+TOMBSTONE_WATERMARK = 'tombstones'
+# revision logs with seq not greater than seq of this watermark may have
+# been removed
+LOG_WATERMARK = 'logs'
+# bytes of compressed snapshot in one chunk
+SNAPSHOT_CHUNK_SIZE = 512 * 1024
 TEMPLATE = None
 ACTION_TO_TS = {const.CREATE: 'created_at',
                 const.UPDATE: 'updated_at',
@@ -42,7 +62,7 @@ ACTION_TO_TS = {const.CREATE: 'created_at',
 
 class RevisionDbMixin(common_db_mixin.CommonDbMixin):
 
-    def get_revisions(self, context, start, end):
+    def _get_revisions_filters(self, start, end):
         # Loadbalancer updating and deletion can reflect to virtualserver
         # operations, so no need to send loadbalancer revisions
         filters = Revision.resource_type.in_([
@@ -65,31 +85,322 @@ class RevisionDbMixin(common_db_mixin.CommonDbMixin):
         # c -- \u -- d -- s      N
         # c -- u -- \d -- s      N
         # c -- \u -- \d -- s     N
+        # which is revisions last changed after start, except the ones
+        # both created and deleted after start. So it's a range scan on
+        # index of last_changed_at.
         if start:
             filters = sa.and_(
                 filters,
-                sa.or_(sa.and_(Revision.created_at >= start,
-                               Revision.deleted_at == expr.null()),
-                       sa.and_(Revision.created_at <= start,
-                               sa.or_(Revision.updated_at >= start,
-                                      Revision.deleted_at >= start))))
+                Revision.last_changed_at >= start,
+                sa.or_(Revision.deleted_at == expr.null(),
+                       Revision.created_at <= start))
         else:
             # special case for created_at > start
             filters = sa.and_(
                 filters, sa.and_(Revision.deleted_at == expr.null()))
         if end:
+            # created_at is the earliest of the timestamps, so this is
+            # created_at, updated_at or deleted_at <= end
+            filters = sa.and_(filters, Revision.created_at <= end)
+        return filters
+
+    def _make_revision_tuple(self, rev):
+        return (str(rev.created_at), str(rev.updated_at or ''),
+                str(rev.deleted_at or ''), rev.id, rev.resource_type,
+                rev.parent_id, rev.extra)
+
+    def get_revisions(self, context, start, end):
+        filters = self._get_revisions_filters(start, end)
+        with context.session.begin(subtransactions=True):
+            revisions = self._model_query(context, Revision).filter(filters)
+        return [self._make_revision_tuple(rev) for rev in revisions]
+
+    def _get_revisions_page_filters(self, start, end):
+        filters = Revision.resource_type.in_([
+            const.IPVS_VIRTUALSERVER, const.IPVS_REALSERVER])
+        if start is not None:
+            filters = sa.and_(filters, Revision.seq > start)
+        else:
+            filters = sa.and_(filters, Revision.deleted_at == expr.null())
+        if end is not None:
+            filters = sa.and_(filters, Revision.seq <= end)
+        return filters
+
+    def get_revisions_page(self, context, start, end, limit, marker=None,
+                           details=False):
+        """Get a page of revisions written after seq start till seq end.
+
+        Without start, all revisions not deleted are got. Revisions are
+        tuples like get_revisions returns with seq appended, ordered by seq
+        and id. marker is the [seq, id] of the last revision of previous
+        page, and next_marker is set when there may be more to get. resync
+        is set with the tombstone watermark seq when deleted revisions after
+        start may have been compacted, caller should do a full resync then.
+        With details, virtual servers of the page are also returned like
+        get_virtualserver_details does.
+        """
+        if start is not None and not marker:
+            watermark = self._get_tombstone_watermark(context)
+            if start < watermark:
+                return {'revisions': [], 'next_marker': None,
+                        'resync': True, 'watermark': watermark}
+        filters = self._get_revisions_page_filters(start, end)
+        if marker:
+            marker_seq, marker_id = marker
+            # the first condition lets the index be seeked to marker
             filters = sa.and_(
                 filters,
-                sa.or_(Revision.created_at <= end,
-                       Revision.updated_at <= end,
-                       Revision.deleted_at <= end))
+                Revision.seq >= marker_seq,
+                sa.or_(Revision.seq > marker_seq, Revision.id > marker_id))
+        with context.session.begin(subtransactions=True):
+            revisions = self._model_query(context, Revision).filter(
+                filters).order_by(Revision.seq, Revision.id).limit(
+                    limit + 1).all()
+        next_marker = None
+        if len(revisions) > limit:
+            revisions = revisions[:limit]
+            next_marker = [revisions[-1].seq, revisions[-1].id]
+        ret = {'revisions': [self._make_revision_tuple(rev) + (rev.seq,)
+                             for rev in revisions],
+               'next_marker': next_marker}
+        if details:
+            ret[const.VIRTUALSERVERS] = self._get_virtualservers(context, set(
+                rev.id if rev.resource_type == const.IPVS_VIRTUALSERVER
+                else rev.parent_id for rev in revisions))
+        return ret
 
+    def _get_watermark(self, context, name, lock=False):
+        query = self._model_query(context, RevisionWatermark).filter_by(
+            name=name)
+        if lock:
+            query = query.with_for_update()
+        return query.first()
+
+    def _get_tombstone_watermark(self, context):
+        watermark = self._get_watermark(context, TOMBSTONE_WATERMARK)
+        return watermark.seq if watermark else 0
+
+    def _get_log_watermark(self, context):
+        watermark = self._get_watermark(context, LOG_WATERMARK)
+        return watermark.seq if watermark else 0
+
+    def get_revision_logs(self, context, start, end, limit):
+        """Get revision logs written after seq start till seq end.
+
+        Logs are (seq, resource_type, operation, payload) tuples ordered by
+        seq, payload is a JSON string. next_marker is the seq to start from
+        when there may be more to get. resync is set with the log watermark
+        seq when logs after start have been removed, caller should do a full
+        resync then.
+        """
+        watermark = self._get_log_watermark(context)
+        if start < watermark:
+            return {'logs': [], 'next_marker': None,
+                    'resync': True, 'watermark': watermark}
         with context.session.begin(subtransactions=True):
-            revisions = self._model_query(context, Revision).filter(filters)
-        return [(str(rev.created_at), str(rev.updated_at or ''),
-                 str(rev.deleted_at or ''), rev.id, rev.resource_type,
-                 rev.parent_id, rev.extra)
-                for rev in revisions]
+            query = self._model_query(context, RevisionLog).filter(
+                RevisionLog.seq > start)
+            if end is not None:
+                query = query.filter(RevisionLog.seq <= end)
+            logs = query.order_by(RevisionLog.seq).limit(limit + 1).all()
+        next_marker = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            next_marker = logs[-1].seq
+        return {'logs': [(log.seq, log.resource_type, log.operation,
+                          log.payload) for log in logs],
+                'next_marker': next_marker}
+
+    def _append_revision_log(self, context, seq, id, resource_type, action,
+                             payload, now):
+        with context.session.begin(subtransactions=True):
+            context.session.add(RevisionLog(
+                seq=seq, resource_type=resource_type, resource_id=id,
+                operation=action, payload=payload, created_at=now))
+
+    def _next_revision_seq(self, context, now):
+        """Get seq for a revision write.
+
+        The seq row is locked till the transaction ends, so revision
+        writes are committed in the order of their seq.
+        """
+        with context.session.begin(subtransactions=True):
+            watermark = self._get_watermark(context, REVISION_SEQ, lock=True)
+            if not watermark:
+                watermark = RevisionWatermark(name=REVISION_SEQ, seq=0)
+                context.session.add(watermark)
+            watermark.update({'seq': watermark.seq + 1, 'watermark': now})
+        return watermark.seq
+
+    def compact_revisions(self, context, watermark, seq=None):
+        """Remove deleted revisions last changed before watermark.
+
+        Only revisions with seq not greater than seq are removed if seq is
+        given. Return number of removed revisions.
+        """
+        with context.session.begin(subtransactions=True):
+            query = self._model_query(context, Revision).filter(
+                Revision.last_changed_at < watermark,
+                Revision.deleted_at != expr.null())
+            if seq is not None:
+                query = query.filter(Revision.seq <= seq)
+            removed_seq = query.with_entities(
+                sa.func.max(Revision.seq)).scalar()
+            if not removed_seq:
+                return 0
+            removed = query.delete(synchronize_session=False)
+            inst = self._get_watermark(context, TOMBSTONE_WATERMARK,
+                                       lock=True)
+            if not inst:
+                context.session.add(RevisionWatermark(
+                    name=TOMBSTONE_WATERMARK, watermark=watermark,
+                    seq=removed_seq))
+            elif inst.seq < removed_seq:
+                inst.update({'seq': removed_seq, 'watermark': watermark})
+        return removed
+
+    def compact_revision_logs(self, context, watermark, seq=None):
+        """Remove revision logs written before watermark.
+
+        Only logs with seq not greater than seq are removed if seq is
+        given. Return number of removed logs.
+        """
+        with context.session.begin(subtransactions=True):
+            query = self._model_query(context, RevisionLog).filter(
+                RevisionLog.created_at < watermark)
+            if seq is not None:
+                query = query.filter(RevisionLog.seq <= seq)
+            removed_seq = query.with_entities(
+                sa.func.max(RevisionLog.seq)).scalar()
+            if not removed_seq:
+                return 0
+            removed = query.delete(synchronize_session=False)
+            inst = self._get_watermark(context, LOG_WATERMARK, lock=True)
+            if not inst:
+                context.session.add(RevisionWatermark(
+                    name=LOG_WATERMARK, watermark=watermark,
+                    seq=removed_seq))
+            elif inst.seq < removed_seq:
+                inst.update({'seq': removed_seq, 'watermark': watermark})
+        return removed
+
+    def get_virtualserver_details(self, context, vs_ids, limit=None,
+                                  marker=None):
+        """Get virtual servers with real servers and md5.
+
+        Virtual servers are returned in id order, at most limit of them
+        with id greater than marker. next_marker is set when there are more
+        to get.
+        """
+        vs_ids = sorted(set(vs_ids))
+        if marker:
+            vs_ids = [vs_id for vs_id in vs_ids if vs_id > marker]
+        page = vs_ids[:limit] if limit else vs_ids
+        next_marker = page[-1] if len(page) < len(vs_ids) else None
+        return {const.VIRTUALSERVERS: self._get_virtualservers(context, page),
+                'next_marker': next_marker}
+
+    def _get_virtualservers(self, context, vs_ids=None):
+        """Get virtual servers with real servers and md5 in one query.
+
+        All virtual servers are got if vs_ids is None.
+        """
+        if vs_ids is not None and not vs_ids:
+            return []
+        vs_model = models.VirtualServer
+        with context.session.begin(subtransactions=True):
+            # real servers are joined eagerly by relationship
+            query = self._model_query(context, vs_model).outerjoin(
+                Revision, Revision.id == vs_model.id).add_entity(
+                    Revision).order_by(vs_model.id)
+            if vs_ids is not None:
+                query = query.filter(vs_model.id.in_(vs_ids))
+            return [self._make_virtualserver_details(vs, rev)
+                    for vs, rev in query]
+
+    def _make_virtualserver_details(self, vs, rev):
+        return {
+            const.ID: vs.id,
+            const.LISTEN_IP: vs.listen_ip,
+            const.LISTEN_PORT: vs.listen_port,
+            const.SCHEDULER: vs.scheduler,
+            const.FORWARD_METHOD: vs.forward_method,
+            const.ADMIN_STATE_UP: vs.admin_state_up,
+            const.MD5: rev.extra if rev else None,
+            const.DIGEST: rev.digest if rev else None,
+            const.REVISION: rev.seq if rev else None,
+            const.REALSERVERS: [
+                {const.ID: rs.id,
+                 const.SERVER_IP: rs.server_ip,
+                 const.SERVER_PORT: rs.server_port,
+                 const.WEIGHT: rs.weight,
+                 const.DELAY: rs.delay,
+                 const.TIMEOUT: rs.timeout,
+                 const.MAX_RETRIES: rs.max_retries,
+                 const.ADMIN_STATE_UP: rs.admin_state_up}
+                for rs in vs.real_servers]}
+
+    def _get_snapshot_seq(self, context):
+        """Get seq of the latest revision snapshot, None for no snapshot."""
+        with context.session.begin(subtransactions=True):
+            return self._model_query(context, RevisionSnapshot).with_entities(
+                sa.func.max(RevisionSnapshot.seq)).scalar()
+
+    def build_revision_snapshot(self, context):
+        """Materialize all virtual servers as a new revision snapshot.
+
+        Snapshot is zlib compressed JSON of virtual servers like
+        get_virtualserver_details returns, stored in chunks. Virtual servers
+        are read after seq is got, so they are at least as new as seq, and
+        replaying revision logs after seq on them gives the current state.
+        The latest snapshot before is kept for agents still loading it, older
+        ones are removed. Return seq of the new snapshot, None if no
+        revision is written since the latest snapshot.
+        """
+        watermark = self._get_watermark(context, REVISION_SEQ)
+        seq = watermark.seq if watermark else 0
+        latest_seq = self._get_snapshot_seq(context)
+        if latest_seq is not None and latest_seq >= seq:
+            return None
+        data = zlib.compress(jsonutils.dumps(
+            self._get_virtualservers(context), separators=(',', ':')))
+        chunks = [data[i:i + SNAPSHOT_CHUNK_SIZE]
+                  for i in range(0, len(data), SNAPSHOT_CHUNK_SIZE)]
+        now = timeutils.utcnow()
+        try:
+            with context.session.begin(subtransactions=True):
+                if latest_seq is not None:
+                    self._model_query(context, RevisionSnapshot).filter(
+                        RevisionSnapshot.seq < latest_seq).delete(
+                            synchronize_session=False)
+                for i, chunk in enumerate(chunks):
+                    context.session.add(RevisionSnapshot(
+                        seq=seq, chunk=i, chunks=len(chunks), data=chunk,
+                        created_at=now))
+        except db_exc.DBDuplicateEntry:
+            # another server has built the same snapshot
+            return None
+        return seq
+
+    def get_revision_snapshot(self, context, seq=None, chunk=0):
+        """Get a chunk of revision snapshot seq, or of the latest one.
+
+        data is base64 of the chunk, chunks of a snapshot joined in order
+        are what build_revision_snapshot compressed. Return None if there is
+        no such snapshot, it may have been removed.
+        """
+        if seq is None:
+            seq = self._get_snapshot_seq(context)
+            if seq is None:
+                return None
+        with context.session.begin(subtransactions=True):
+            inst = self._model_query(context, RevisionSnapshot).filter_by(
+                seq=seq, chunk=chunk).first()
+            if not inst:
+                return None
+            return {'seq': inst.seq, 'chunk': inst.chunk,
+                    'chunks': inst.chunks,
+                    'data': base64.b64encode(inst.data)}
 
     def _get_revision(self, context, id):
         try:
@@ -110,6 +421,9 @@ class RevisionDbMixin(common_db_mixin.CommonDbMixin):
         else:
             return str(rev.created_at)
 
+    def _get_revision_seq(self, context, id):
+        return self._get_revision(context, id).seq
+
     def _get_notify_revisions(self, context, resource, res_id, res_dict):
         if resource == const.IPVS_LOADBALANCER:
             with context.session.begin(subtransactions=True):
@@ -117,20 +431,26 @@ class RevisionDbMixin(common_db_mixin.CommonDbMixin):
                     Revision.parent_id == res_id)
             for rev in revisions:
                 res_dict[const.VIRTUALSERVERS][rev.id].update({
-                    const.MD5: rev.extra})
+                    const.MD5: rev.extra, const.DIGEST: rev.digest})
             res_dict[const.TIMESTAMP] = self._get_timestamp(
                 context, res_id, const.UPDATE)
+            res_dict[const.REVISION] = self._get_revision_seq(
+                context, res_id)
         elif resource == const.IPVS_VIRTUALSERVER:
             rev = self._get_revision(context, res_id)
             res_dict.update({
                 const.TIMESTAMP: str(rev.updated_at),
-                const.MD5: rev.extra})
+                const.REVISION: rev.seq,
+                const.MD5: rev.extra,
+                const.DIGEST: rev.digest})
         else:
             parent_id = res_dict.pop('ipvs_virtualserver_id')
             rev = self._get_revision(context, parent_id)
             res_dict.update({
                 const.TIMESTAMP: self._get_timestamp(context, res_id),
-                const.MD5: rev.extra})
+                const.REVISION: self._get_revision_seq(context, res_id),
+                const.MD5: rev.extra,
+                const.DIGEST: rev.digest})
 
     def _get_revision_extra_for_deletion(self, resource_type, db_inst):
         if resource_type == const.IPVS_VIRTUALSERVER:
@@ -138,16 +458,41 @@ class RevisionDbMixin(common_db_mixin.CommonDbMixin):
         elif resource_type == const.IPVS_REALSERVER:
             return dbutil.compose_rs_revision_extra(db_inst)
 
+    def _set_virtualserver_digest(self, context, vs_db_inst):
+        vs_info = {k: vs_db_inst[k] for k in digest.VIRTUALSERVER_FIELDS}
+        with context.session.begin(subtransactions=True):
+            revision = self._get_revision(context, vs_db_inst.id)
+            revision.digest = digest.get_digest(
+                vs_info, vs_db_inst.real_servers)
+
+    def _replace_in_virtualserver_digest(self, context, vs_db_inst,
+                                         old_hash, new_hash):
+        """Replace md5 of a changed part in digest of virtual server.
+
+        Hash is 0 for a real server created or deleted. Digest of other
+        version, e.g. written before upgrade, is computed from all real
+        servers instead.
+        """
+        with context.session.begin(subtransactions=True):
+            revision = self._get_revision(context, vs_db_inst.id)
+            if digest.is_comparable(revision.digest):
+                revision.digest = digest.update_digest(
+                    revision.digest, old_hash, new_hash)
+                return
+        self._set_virtualserver_digest(context, vs_db_inst)
+
     def _update_virtualserver_md5(self, context, vs_db_inst):
-        conf_data = TEMPLATE.get_virtualserver_conf(
-            {k: vs_db_inst[k] for k in (const.LISTEN_IP, const.LISTEN_PORT,
-                                        const.ADMIN_STATE_UP, const.SCHEDULER,
-                                        const.FORWARD_METHOD)},
-            vs_db_inst.real_servers)
-        md5 = hashlib.md5(conf_data).hexdigest()
+        # digest is updated along with resources, only MD5 of rendered
+        # conf is left to notification
+        changes = {const.EXTRA: None}
+        if cfg.CONF.networking_ipvs.revision_md5:
+            vs_info = {k: vs_db_inst[k] for k in digest.VIRTUALSERVER_FIELDS}
+            conf_data = TEMPLATE.get_virtualserver_conf(
+                vs_info, vs_db_inst.real_servers)
+            changes[const.EXTRA] = hashlib.md5(conf_data).hexdigest()
         with context.session.begin(subtransactions=True):
             revision = self._get_revision(context, vs_db_inst.id)
-            revision.update({const.EXTRA: md5})
+            revision.update(changes)
 
     def _update_revisions_md5(self, context, resource_type, db_inst):
         global TEMPLATE
@@ -163,23 +508,30 @@ class RevisionDbMixin(common_db_mixin.CommonDbMixin):
 
     def _update_revisions(self, context, id, resource_type, action,
                           parent_id=None, sub_vs_keys=None,
-                          sub_rs_keys=None, extra=None):
+                          sub_rs_keys=None, extra=None, payload=None):
         now = timeutils.utcnow()
         ts_attr = ACTION_TO_TS[action]
+        changes = {ts_attr: now, 'last_changed_at': now,
+                   'seq': self._next_revision_seq(context, now)}
+        self._append_revision_log(context, changes['seq'], id, resource_type,
+                                  action, payload, now)
 
         def _get_bulk_updates(keys):
-            if isinstance(keys, dict):
-                return [{const.ID: _id, ts_attr: now, const.EXTRA: _extra}
-                        for _id, _extra in keys.iteritems()]
-            else:
-                return [{const.ID: _id, ts_attr: now} for _id in keys]
+            updates = []
+            for _id in keys:
+                update = {const.ID: _id}
+                update.update(changes)
+                if isinstance(keys, dict):
+                    update[const.EXTRA] = keys[_id]
+                updates.append(update)
+            return updates
 
         if action == const.CREATE:
             with context.session.begin(subtransactions=True):
                 revision = Revision(id=id, resource_type=resource_type)
                 if parent_id:
                     revision.parent_id = parent_id
-                revision[ts_attr] = now
+                revision.update(changes)
                 context.session.add(revision)
         else:
             bulk_update = []
@@ -189,7 +541,7 @@ class RevisionDbMixin(common_db_mixin.CommonDbMixin):
                 bulk_update.extend(_get_bulk_updates(sub_rs_keys))
             with context.session.begin(subtransactions=True):
                 rev = self._get_revision(context, id)
-                rev.update({ts_attr: now})
+                rev.update(changes)
                 if extra:
                     rev.update({const.EXTRA: extra})
                 if bulk_update:
@@ -13,9 +13,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from oslo_serialization import jsonutils
+
 from networking_ipvs.common import constants as const
 from networking_ipvs.common import utils
 
+VIRTUALSERVER_KEYS = [const.LISTEN_IP, const.LISTEN_PORT]
+REALSERVER_KEYS = [const.SERVER_IP, const.SERVER_PORT]
+
 
 def compose_vs_revision_extra(data):
     return '%(lip)s%(ip_sep)s%(lport)s%(vs_sep)s%(sip)s%(ip_sep)s%(sport)s' % {
@@ -48,3 +53,49 @@ def get_subresource_keys(resource_type, db_inst, with_extra=True):
                 rs_inst) if with_extra else None
             for rs_inst in db_inst.real_servers}
     return vs_keys, rs_keys
+
+
+def compose_revision_log_payload(resource_type, action, data):
+    """Compose what agents need to apply a change to their state.
+
+    data is the resource dict after the change, or before deletion.
+    Loadbalancer changes are logged as changes of its virtual servers,
+    and real server changes carry attributes of their virtual server.
+    Loadbalancer updates carry states of its virtual servers and their real
+    servers, so agents don't have to derive them.
+    """
+    if resource_type == const.IPVS_LOADBALANCER:
+        if action == const.UPDATE:
+            vs_keys = VIRTUALSERVER_KEYS + const.VIRTUALSERVER_NOTIFY_KEYS
+            rs_keys = REALSERVER_KEYS + const.REALSERVER_NOTIFY_KEYS
+            payload = {const.VIRTUALSERVERS: []}
+            for vs in data[const.VIRTUALSERVERS]:
+                vs_payload = {k: vs[k] for k in vs_keys}
+                vs_payload[const.REALSERVERS] = [
+                    {k: rs[k] for k in rs_keys}
+                    for rs in vs[const.REALSERVERS]]
+                payload[const.VIRTUALSERVERS].append(vs_payload)
+            # for agents which don't read real servers in payload
+            payload[const.ADMIN_STATE_UP] = data[const.ADMIN_STATE_UP]
+        else:
+            payload = {const.VIRTUALSERVERS: [
+                {k: vs[k] for k in VIRTUALSERVER_KEYS}
+                for vs in data[const.VIRTUALSERVERS]]}
+    elif resource_type == const.IPVS_VIRTUALSERVER:
+        payload = {k: data[k] for k in VIRTUALSERVER_KEYS}
+        if action == const.UPDATE:
+            payload.update({k: data[k] for k in data[const.WHAT_CHANGED]})
+        elif action == const.CREATE:
+            payload.update({
+                k: data[k] for k in const.VIRTUALSERVER_NOTIFY_KEYS})
+    else:
+        vs = data[const.VIRTUALSERVER]
+        if action == const.DELETE:
+            payload = {k: vs[k] for k in VIRTUALSERVER_KEYS}
+            rs_keys = REALSERVER_KEYS
+        else:
+            payload = {k: vs[k] for k in (
+                VIRTUALSERVER_KEYS + const.VIRTUALSERVER_NOTIFY_KEYS)}
+            rs_keys = REALSERVER_KEYS + const.REALSERVER_NOTIFY_KEYS
+        payload[const.REALSERVERS] = [{k: data[k] for k in rs_keys}]
+    return jsonutils.dumps(payload, separators=(',', ':'))
@@ -0,0 +1,107 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from networking_ipvs.common import constants as const
+
+# An IPVS table is a dict of services keyed by (listen_ip, listen_port), for
+# each service it's
+#     {"scheduler": scheduler,
+#      "dests": {(server_ip, server_port): (forward_method, weight), ...}}
+# only TCP services are managed.
+DESTS = 'dests'
+
+ADD_SERVICE = 'add_service'
+EDIT_SERVICE = 'edit_service'
+DEL_SERVICE = 'del_service'
+ADD_DEST = 'add_dest'
+EDIT_DEST = 'edit_dest'
+DEL_DEST = 'del_dest'
+SERVICE_OPS = (ADD_SERVICE, EDIT_SERVICE, DEL_SERVICE)
+ADD_OPS = (ADD_SERVICE, ADD_DEST)
+DEL_OPS = (DEL_SERVICE, DEL_DEST)
+
+
+def get_service_key(vs_info):
+    return vs_info[const.LISTEN_IP], int(vs_info[const.LISTEN_PORT])
+
+
+def get_dest_key(rs_info):
+    return rs_info[const.SERVER_IP], int(rs_info[const.SERVER_PORT])
+
+
+def get_service(vs):
+    """Get service expected in kernel for a ConfigManager vs cache entry.
+
+    Like keepalived, a virtual server is deployed when it's admin state up
+    and has real servers, only admin state up real servers are deployed.
+    None will be returned if vs should not be deployed.
+    """
+    if not vs or not vs.get(const.ADMIN_STATE_UP) or not vs.get(
+            const.REALSERVERS):
+        return None
+    dests = {}
+    for rs in vs[const.REALSERVERS].values():
+        if rs.get(const.ADMIN_STATE_UP):
+            dests[get_dest_key(rs)] = (vs[const.FORWARD_METHOD],
+                                       int(rs[const.WEIGHT]))
+    return {const.SCHEDULER: vs[const.SCHEDULER], DESTS: dests}
+
+
+def diff_services(current, desired):
+    """Get operations to turn current services into desired services.
+
+    Operations are tuples like:
+        (ADD_SERVICE|EDIT_SERVICE, service_key, scheduler)
+        (DEL_SERVICE, service_key)
+        (ADD_DEST|EDIT_DEST, service_key, dest_key, forward_method, weight)
+        (DEL_DEST, service_key, dest_key)
+    Service deletions come first, then service additions and edits, and
+    destination operations at last.
+    """
+    del_ops, svc_ops, dest_ops = [], [], []
+    for key in sorted(set(current) | set(desired)):
+        cur, new = current.get(key), desired.get(key)
+        if not new:
+            if cur:
+                del_ops.append((DEL_SERVICE, key))
+            continue
+        cur_dests = {}
+        if not cur:
+            svc_ops.append((ADD_SERVICE, key, new[const.SCHEDULER]))
+        else:
+            cur_dests = cur[DESTS]
+            if cur[const.SCHEDULER] != new[const.SCHEDULER]:
+                svc_ops.append((EDIT_SERVICE, key, new[const.SCHEDULER]))
+        new_dests = new[DESTS]
+        for dest in sorted(set(cur_dests) - set(new_dests)):
+            dest_ops.append((DEL_DEST, key, dest))
+        for dest in sorted(new_dests):
+            if dest not in cur_dests:
+                dest_ops.append((ADD_DEST, key, dest) + new_dests[dest])
+            elif cur_dests[dest] != new_dests[dest]:
+                dest_ops.append((EDIT_DEST, key, dest) + new_dests[dest])
+    return del_ops + svc_ops + dest_ops
+
+
+def is_applied(services, op):
+    """Whether an operation of diff_services is in effect in services."""
+    name, key = op[0], op[1]
+    service = services.get(key)
+    if name == DEL_SERVICE:
+        return not service
+    if name in (ADD_SERVICE, EDIT_SERVICE):
+        return bool(service) and service[const.SCHEDULER] == op[2]
+    if name == DEL_DEST:
+        return not service or op[2] not in service[DESTS]
+    return bool(service) and service[DESTS].get(op[2]) == tuple(op[3:])
@@ -0,0 +1,72 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+from eventlet import event
+
+
+class SharedLock(object):
+    """Lock of green threads, held by many sharers or by one owner.
+
+    Owners waiting go before new sharers, so a stream of sharers doesn't
+    starve them. It's not reentrant, and a sharer can't become owner
+    without releasing it first.
+    """
+
+    def __init__(self):
+        self._sharers = 0
+        self._owned = False
+        self._owners_waiting = 0
+        self._waiters = []
+
+    def _wait(self):
+        waiter = event.Event()
+        self._waiters.append(waiter)
+        waiter.wait()
+
+    def _wake_all(self):
+        waiters, self._waiters = self._waiters, []
+        for waiter in waiters:
+            waiter.send()
+
+    @contextlib.contextmanager
+    def shared(self):
+        while self._owned or self._owners_waiting:
+            self._wait()
+        self._sharers += 1
+        try:
+            yield
+        finally:
+            self._sharers -= 1
+            if not self._sharers:
+                self._wake_all()
+
+    @contextlib.contextmanager
+    def exclusive(self):
+        self._owners_waiting += 1
+        try:
+            while self._owned or self._sharers:
+                self._wait()
+            self._owned = True
+        finally:
+            self._owners_waiting -= 1
+            if not self._owned:
+                # killed while waiting, sharers behind it go on
+                self._wake_all()
+        try:
+            yield
+        finally:
+            self._owned = False
+            self._wake_all()
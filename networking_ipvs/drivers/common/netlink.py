@@ -0,0 +1,222 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import os
+import socket
+import struct
+
+NETLINK_ROUTE = 0
+NETLINK_GENERIC = 16
+
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_ACK = 0x4
+NLM_F_ROOT = 0x100
+NLM_F_MATCH = 0x200
+NLM_F_DUMP = NLM_F_ROOT | NLM_F_MATCH
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+
+NLA_F_NESTED = 0x8000
+NLA_F_NET_BYTEORDER = 0x4000
+NLA_TYPE_MASK = ~(NLA_F_NESTED | NLA_F_NET_BYTEORDER) & 0xffff
+
+NLMSG_HDR = struct.Struct('=IHHII')
+NLA_HDR = struct.Struct('=HH')
+ERROR_CODE = struct.Struct('=i')
+
+RECV_BUFSIZE = 65536
+# keep every batch well under the default socket buffers, so acks of one
+# batch can always be queued by kernel before we start reading them
+MAX_BATCH_SIZE = 32768
+
+
+class NetlinkError(Exception):
+
+    def __init__(self, error):
+        self.errno = error
+        super(NetlinkError, self).__init__(os.strerror(error))
+
+
+def align(length):
+    return (length + 3) & ~3
+
+
+def pack_attr(attr_type, data):
+    length = NLA_HDR.size + len(data)
+    return (NLA_HDR.pack(length, attr_type) + data +
+            b'\0' * (align(length) - length))
+
+
+def pack_nested(attr_type, attrs):
+    return pack_attr(attr_type | NLA_F_NESTED, b''.join(attrs))
+
+
+def pack_u16(attr_type, value):
+    return pack_attr(attr_type, struct.pack('=H', value))
+
+
+def pack_be16(attr_type, value):
+    return pack_attr(attr_type, struct.pack('!H', value))
+
+
+def pack_u32(attr_type, value):
+    return pack_attr(attr_type, struct.pack('=I', value))
+
+
+def pack_string(attr_type, value):
+    return pack_attr(attr_type, value.encode('utf-8') + b'\0')
+
+
+def parse_attrs(data):
+    attrs = {}
+    offset = 0
+    while offset + NLA_HDR.size <= len(data):
+        length, attr_type = NLA_HDR.unpack_from(data, offset)
+        if length < NLA_HDR.size:
+            break
+        attrs[attr_type & NLA_TYPE_MASK] = data[
+            offset + NLA_HDR.size:offset + length]
+        offset += align(length)
+    return attrs
+
+
+def unpack_u16(data):
+    return struct.unpack('=H', data[:2])[0]
+
+
+def unpack_be16(data):
+    return struct.unpack('!H', data[:2])[0]
+
+
+def unpack_u32(data):
+    return struct.unpack('=I', data[:4])[0]
+
+
+def unpack_string(data):
+    return data.split(b'\0', 1)[0].decode('utf-8')
+
+
+def pack_message(msg_type, flags, seq, payload, pid=0):
+    return NLMSG_HDR.pack(NLMSG_HDR.size + len(payload), msg_type, flags,
+                          seq, pid) + payload
+
+
+def parse_messages(data):
+    """Return list of (msg_type, flags, seq, payload) in data."""
+    messages = []
+    offset = 0
+    while offset + NLMSG_HDR.size <= len(data):
+        length, msg_type, flags, seq, _pid = NLMSG_HDR.unpack_from(
+            data, offset)
+        if length < NLMSG_HDR.size:
+            break
+        messages.append(
+            (msg_type, flags, seq,
+             data[offset + NLMSG_HDR.size:offset + length]))
+        offset += align(length)
+    return messages
+
+
+def get_error(payload):
+    return -ERROR_CODE.unpack_from(payload)[0]
+
+
+class NetlinkSocket(object):
+    """Netlink socket with request/reply and batch helpers.
+
+    sock can be any object with send and recv, it's used to run without a
+    kernel in tests.
+    """
+
+    def __init__(self, protocol, sock=None):
+        if sock is None:
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, protocol)
+            sock.bind((0, 0))
+        self._sock = sock
+        self._seq = 0
+
+    def close(self):
+        self._sock.close()
+
+    def _next_seq(self):
+        self._seq = (self._seq + 1) & 0xffffffff
+        return self._seq
+
+    def _recv_messages(self):
+        return parse_messages(self._sock.recv(RECV_BUFSIZE))
+
+    def request(self, msg_type, payload, flags=0):
+        """Send one request and return payloads of its replies.
+
+        For dump requests, flags should contain NLM_F_DUMP, and all parts
+        of the dump will be returned. NetlinkError will be raised when
+        kernel acks the request with an error.
+        """
+        seq = self._next_seq()
+        self._sock.send(pack_message(
+            msg_type, flags | NLM_F_REQUEST | NLM_F_ACK, seq, payload))
+        replies = []
+        while True:
+            for m_type, _flags, m_seq, m_payload in self._recv_messages():
+                if m_seq != seq:
+                    continue
+                if m_type == NLMSG_DONE:
+                    return replies
+                if m_type == NLMSG_ERROR:
+                    error = get_error(m_payload)
+                    if error:
+                        raise NetlinkError(error)
+                    return replies
+                replies.append(m_payload)
+
+    def batch(self, requests):
+        """Send requests in as few writes as possible.
+
+        requests is a list of (msg_type, payload, flags), and a list of
+        errno is returned in the same order, 0 for success.
+        """
+        results = [0] * len(requests)
+        chunk, size = [], 0
+        for idx, (msg_type, payload, flags) in enumerate(requests):
+            seq = self._next_seq()
+            msg = pack_message(
+                msg_type, flags | NLM_F_REQUEST | NLM_F_ACK, seq, payload)
+            if chunk and size + len(msg) > MAX_BATCH_SIZE:
+                self._send_chunk(chunk, results)
+                chunk, size = [], 0
+            chunk.append((idx, seq, msg))
+            size += len(msg)
+        if chunk:
+            self._send_chunk(chunk, results)
+        return results
+
+    def _send_chunk(self, chunk, results):
+        self._sock.send(b''.join(msg for _idx, _seq, msg in chunk))
+        waiting = {seq: idx for idx, seq, _msg in chunk}
+        while waiting:
+            messages = self._recv_messages()
+            if not messages:
+                # peer has nothing more for us, should not happen with a
+                # real kernel socket
+                for idx in waiting.values():
+                    results[idx] = errno.EIO
+                return
+            for m_type, _flags, m_seq, m_payload in messages:
+                if m_type == NLMSG_ERROR and m_seq in waiting:
+                    results[waiting.pop(m_seq)] = get_error(m_payload)
@@ -12,69 +12,219 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import os
+import socket
+import struct
+import time
+
 import netaddr
 
 from neutron.agent.linux import ip_lib
 from neutron.agent.linux import utils
 from oslo_log import log as logging
 
-from networking_ipvs._i18n import _LE
+from networking_ipvs._i18n import _LE, _LW
 from networking_ipvs.common import constants as const
+from networking_ipvs.drivers.common import rtnl
 
 LOG = logging.getLogger(__name__)
 
+IP_LIB_BACKEND = 'ip_lib'
+NETLINK_BACKEND = 'netlink'
+# vips plugged or unplugged in a batch by check_nic_vips
+CHECK_BATCH_SIZE = 256
+
+
+class PrefixTrie(object):
+    """Binary trie for IPv4 longest prefix match.
+
+    Each node is [zero_child, one_child, value], lookup walks bits of an
+    address from high to low, at most up to the longest prefix inserted,
+    and returns value of the most specific prefix covering it.
+    """
+
+    def __init__(self, default=None):
+        self._root = [None, None, default]
+        self._max_prefixlen = 0
+
+    def insert(self, cidr, value):
+        network = netaddr.IPNetwork(cidr)
+        addr, prefixlen = int(network.network), network.prefixlen
+        node = self._root
+        for i in range(prefixlen):
+            bit = (addr >> (31 - i)) & 1
+            if node[bit] is None:
+                node[bit] = [None, None, None]
+            node = node[bit]
+        node[2] = value
+        self._max_prefixlen = max(self._max_prefixlen, prefixlen)
+
+    def lookup(self, ip_address):
+        addr = struct.unpack('!I', socket.inet_aton(ip_address))[0]
+        node, value = self._root, self._root[2]
+        for i in range(self._max_prefixlen):
+            node = node[(addr >> (31 - i)) & 1]
+            if node is None:
+                break
+            if node[2] is not None:
+                value = node[2]
+        return value
+
 
 class NICDriver(object):
 
     def __init__(self, conf):
         self.conf = conf
         self._parse_nic_mapping()
+        self._rtnl = None
+        if self.conf.ipvs.ipvs_vip_nic_backend == NETLINK_BACKEND:
+            self._rtnl = rtnl.RtnlAddr()
+        # nic name: ifindex, for netlink backend
+        self._ifindexes = {}
+        # vips plugged by this agent since it started
+        self._plugged_vips = set()
 
     def _parse_nic_mapping(self):
-        self._cidr_nic_mapping = {}
+        # nic name: IPDevice, a nic used for several cidrs has one IPDevice
+        self._nics = {}
+        cidr_nics = []
         for cidr_to_nic in self.conf.ipvs.ipvs_vip_nic_mapping.split(','):
             cidr, nic = cidr_to_nic.split(':')
-            self._cidr_nic_mapping[cidr] = nic
-        for cidr in self._cidr_nic_mapping:
-            self._cidr_nic_mapping[cidr] = ip_lib.IPDevice(
-                self._cidr_nic_mapping[cidr])
-        self._cidr_nic_mapping['default'] = self._cidr_nic_mapping.get(
-            '*', self._cidr_nic_mapping.values()[0])
-
-    def check_nic_vips(self, deployed_vips):
-        current_nic_vips = [
-            addr['cidr'][:-3]
-            for nic in self._cidr_nic_mapping.values()
-            for addr in nic.addr.list()
-            if addr['cidr'][-3:] == '/32']
-        for vip in set(deployed_vips) - set(current_nic_vips):
-            self.try_plug_vip(vip)
-        for vip in set(current_nic_vips) - set(deployed_vips):
-            self.try_unplug_vip(vip)
+            if nic not in self._nics:
+                self._nics[nic] = ip_lib.IPDevice(nic)
+            cidr_nics.append((cidr, self._nics[nic]))
+        # '*' or the first configured nic is used for vips not in any cidr
+        default = dict(cidr_nics).get('*', cidr_nics[0][1])
+        self._nic_trie = PrefixTrie(default)
+        # addresses in configured cidrs are vips, whoever plugged them
+        self._vip_cidrs = PrefixTrie()
+        for cidr, nic in cidr_nics:
+            if cidr != '*':
+                self._nic_trie.insert(cidr, nic)
+                self._vip_cidrs.insert(cidr, True)
+
+    def _get_ifindex(self, nic_name):
+        if nic_name not in self._ifindexes:
+            self._ifindexes[nic_name] = rtnl.get_ifindex(nic_name)
+        return self._ifindexes[nic_name]
+
+    def get_nic_vips(self):
+        """Get vips, /32 addresses, on all mapped nics."""
+        if self._rtnl:
+            addrs = self._rtnl.get_host_addrs()
+            return set(vip for nic in self._nics
+                       for vip in addrs.get(self._get_ifindex(nic), ()))
+        return set(addr['cidr'][:-3]
+                   for nic in self._nics.values()
+                   for addr in nic.addr.list()
+                   if addr['cidr'][-3:] == '/32')
+
+    def _is_managed_vip(self, vip, managed_vips):
+        return (vip in self._plugged_vips or vip in managed_vips or
+                self._vip_cidrs.lookup(vip))
+
+    def check_nic_vips(self, deployed_vips, budget=None, managed_vips=()):
+        """Plug missing vips and unplug stale vips on mapped nics.
+
+        deployed_vips can be a callable returning vips, it's called after
+        nic vips are dumped, so vips changed during dumping are not taken
+        as drift. Only addresses this agent manages are stale vips: those
+        it plugged, those in managed_vips, and those in cidrs of nic
+        mapping. Other /32 addresses, e.g. of host or other services, are
+        left alone. Vips are fixed in batches until budget seconds are
+        used, the rest is left for next check. Return count of vips fixed.
+        """
+        start = time.time()
+        current_nic_vips = self.get_nic_vips()
+        if callable(deployed_vips):
+            deployed_vips = deployed_vips()
+        deployed_vips = set(deployed_vips)
+        managed_vips = set(managed_vips)
+        stale_vips = set(vip for vip in current_nic_vips - deployed_vips
+                         if self._is_managed_vip(vip, managed_vips))
+        fixed = 0
+        for func, vips in ((self.plug_vips, deployed_vips - current_nic_vips),
+                           (self.unplug_vips, stale_vips)):
+            vips = sorted(vips)
+            for i in range(0, len(vips), CHECK_BATCH_SIZE):
+                if budget and time.time() - start > budget:
+                    LOG.warning(_LW("Checking nic vips is out of its %s "
+                                    "seconds budget, left vips will be "
+                                    "checked next time"), budget)
+                    return fixed
+                batch = vips[i:i + CHECK_BATCH_SIZE]
+                fixed += len(batch) - func(batch)
+        return fixed
+
+    def _rtnl_batch(self, vip_addresses, plug):
+        addrs, vips = [], []
+        for vip in vip_addresses:
+            nic_name = self._get_nic_for_vip(vip).name
+            try:
+                addrs.append((self._get_ifindex(nic_name), vip))
+                vips.append(vip)
+            except (IOError, ValueError):
+                LOG.error(_LE("Failed to get ifindex of nic %(nic)s for vip "
+                              "%(vip)s"), {'nic': nic_name, 'vip': vip})
+        if plug:
+            errors = self._rtnl.add_addrs(addrs)
+        else:
+            errors = self._rtnl.del_addrs(addrs)
+        failed = len(vip_addresses) - len(vips)
+        for vip, err in zip(vips, errors):
+            if err:
+                failed += 1
+                if plug:
+                    msg = _LE("Failed to plug vip for address %(vip)s, get "
+                              "error %(err)s")
+                else:
+                    msg = _LE("Failed to unplug vip for address %(vip)s, get "
+                              "error %(err)s")
+                LOG.error(msg, {'vip': vip, 'err': os.strerror(err)})
+        return failed
+
+    def plug_vips(self, vip_addresses):
+        """Plug vips, return count of vips failed to be plugged."""
+        vip_addresses = list(vip_addresses)
+        self._plugged_vips.update(vip_addresses)
+        if self._rtnl:
+            return self._rtnl_batch(vip_addresses, True)
+        return sum(1 for vip in vip_addresses if not self.try_plug_vip(vip))
+
+    def unplug_vips(self, vip_addresses):
+        """Unplug vips, return count of vips failed to be unplugged."""
+        vip_addresses = list(vip_addresses)
+        self._plugged_vips.difference_update(vip_addresses)
+        if self._rtnl:
+            return self._rtnl_batch(vip_addresses, False)
+        return sum(1 for vip in vip_addresses
+                   if not self.try_unplug_vip(vip))
 
     def try_plug_vip(self, vip_address):
+        self._plugged_vips.add(vip_address)
+        if self._rtnl:
+            return not self._rtnl_batch([vip_address], True)
         try:
             self._get_nic_for_vip(vip_address).addr.add(vip_address + '/32')
         except RuntimeError as e:
             if 'RTNETLINK answers: File exists' not in e.message:
                 msg = _LE("Failed to plug vip for address %s") % vip_address
                 LOG.error(msg)
+                return False
+        return True
 
     def try_unplug_vip(self, vip_address):
+        self._plugged_vips.discard(vip_address)
+        if self._rtnl:
+            return not self._rtnl_batch([vip_address], False)
         try:
             self._get_nic_for_vip(vip_address).addr.delete(vip_address + '/32')
         except RuntimeError as e:
             if 'Cannot assign requested address' not in e.message:
                 msg = _LE("Failed to unplug vip for address %s") % vip_address
                 LOG.error(msg)
+                return False
+        return True
 
     def _get_nic_for_vip(self, vip_address):
-        for cidr in self._cidr_nic_mapping:
-            if cidr in ('*', 'default'):
-                continue
-            if netaddr.IPAddress(vip_address) in netaddr.IPNetwork(cidr):
-                _vip_nic = self._cidr_nic_mapping[cidr]
-                break
-        else:
-            _vip_nic = self._cidr_nic_mapping['default']
-        return _vip_nic
+        return self._nic_trie.lookup(vip_address)
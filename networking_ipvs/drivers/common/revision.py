@@ -12,150 +12,282 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
 import os
-import time
+import zlib
 
 from neutron import context as ncontext
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 
+from networking_ipvs._i18n import _LI
 from networking_ipvs.common import constants as const
 from networking_ipvs.common import exceptions as ipvs_exc
 from networking_ipvs.common import utils
+from networking_ipvs.drivers.common import ipvs_table
 
 
 LOG = logging.getLogger(__name__)
 
+# revisions asked in one get_revisions_page call
+REVISIONS_PAGE_SIZE = 1000
+# revision logs asked in one get_revision_logs call
+REVISION_LOGS_PAGE_SIZE = 1000
+
 
 class RevisionHelper(object):
+    """Catch up local state with upstream revisions.
+
+    It's not thread safe, callers serialize it with other changes of local
+    state.
+    """
 
-    def __init__(self, conf, plugin_rpc, delete_callback, update_callback):
+    def __init__(self, conf, plugin_rpc, delete_callback, update_callback,
+                 resync_callback):
         self.conf = conf
         self.context = ncontext.get_admin_context_without_session()
         self.plugin_rpc = plugin_rpc
         self.delete_callback = delete_callback
         self.update_callback = update_callback
+        self.resync_callback = resync_callback
+        # cached local revision, it's read from file when unknown
+        self._local_revision = None
+        # (listen_ip, listen_port): seq of the latest revision applied to
+        # virtual server by a notification or log, for those newer than
+        # local revision. Replaying older revisions on them is skipped, so
+        # a catch-up doesn't roll back what other notifications applied.
+        # Local revision only moves along revision logs processed, since
+        # notifications may be lost.
+        self._vs_revisions = {}
 
-    def _get_local_revision(self):
+    def get_local_revision(self):
+        """Get seq of the latest revision applied locally."""
+        if self._local_revision is not None:
+            return self._local_revision
         revision = None
         if os.path.exists(self.conf.revision.revision_path):
             with open(self.conf.revision.revision_path) as f:
                 revision = f.read().strip()
-        return revision
+        if not revision or not revision.isdigit():
+            # revision was a timestamp before seq was introduced
+            return None
+        self._local_revision = int(revision)
+        return self._local_revision
 
     def _set_local_revision(self, new_revision):
         with open(self.conf.revision.revision_path, 'w+') as f:
-            f.write(new_revision)
+            f.write(str(new_revision))
+        self._local_revision = new_revision
+        self._vs_revisions = {
+            key: seq for key, seq in self._vs_revisions.items()
+            if seq > new_revision}
 
-    def _get_upstream_revisions(self, start=None, end=None):
-        if not start:
-            start = self._get_local_revision()
-        return self.plugin_rpc.get_revisions(start, end)
+    def is_applied(self, vs_keys, seq):
+        """Whether revisions not older than seq are applied to vs_keys."""
+        if seq is None:
+            return False
+        local_revision = self.get_local_revision()
+        if local_revision is not None and seq <= local_revision:
+            # revision logs up to local revision are processed
+            return True
+        return all(self._vs_revisions.get(key, 0) >= seq for key in vs_keys)
 
-    def update(self, vs_info, realservers):
-        if realservers:
-            new_revision = max([rs[const.TIMESTAMP] for rs in realservers])
-        else:
-            new_revision = vs_info[const.TIMESTAMP]
-        missed_revisions = self._get_upstream_revisions(end=new_revision)
-        if missed_revisions:
-            new_revision = self._process_revisions(missed_revisions)
+    def set_applied(self, vs_keys, seq):
+        """Record revision seq is applied to virtual servers of vs_keys."""
+        if seq is None:
+            return
+        for key in vs_keys:
+            if seq > self._vs_revisions.get(key, 0):
+                self._vs_revisions[key] = seq
+
+    def _get_newer_vs_keys(self, seq):
+        return set(key for key, applied in self._vs_revisions.items()
+                   if seq is not None and applied > seq)
+
+    def _get_upstream_pages(self, start, end=None):
+        """Get pages of revisions after start from upstream.
+
+        Pages come with virtual servers of their revisions. All revisions
+        not deleted are got without start. A page with resync set is got
+        when upstream has compacted deleted revisions after start, a full
+        resync is needed then.
+        """
+        marker = None
+        while True:
+            page = self.plugin_rpc.get_revisions_page(
+                start, end, REVISIONS_PAGE_SIZE, marker, details=True)
+            if page['revisions'] or page.get('resync'):
+                yield page
+            marker = page['next_marker']
+            if not marker:
+                return
+
+    def _get_upstream_logs(self, start, end=None):
+        """Get pages of revision logs after start from upstream.
+
+        A page with resync set is got when upstream has removed logs after
+        start, a full resync is needed then.
+        """
+        while True:
+            page = self.plugin_rpc.get_revision_logs(
+                start, end, REVISION_LOGS_PAGE_SIZE)
+            if page['logs'] or page.get('resync'):
+                yield page
+            start = page['next_marker']
+            if not start:
+                return
+
+    def _process_upstream_revisions(self, start=None, end=None):
+        """Process missed revisions, return the latest processed one.
+
+        Missed revisions are got by tailing revision logs from local
+        revision. Local revision is advanced after each page, so a
+        restarted agent doesn't have to process pages it has processed.
+        """
+        if start is None:
+            start = self.get_local_revision()
+        if start is None:
+            LOG.info(_LI("No local revision, do a full resync"))
+            return self._resync(end, 0)
+        new_revision = None
+        for page in self._get_upstream_logs(start, end):
+            if page.get('resync'):
+                LOG.info(_LI("Local revision %s is older than removed "
+                             "upstream revision logs, do a full resync"),
+                         start)
+                return self._resync(end, page['watermark'])
+            new_revision = self._process_logs(page['logs'])
+            self._set_local_revision(new_revision)
+        return new_revision
+
+    def _get_upstream_snapshot(self):
+        """Get the latest revision snapshot from upstream chunk by chunk.
+
+        Return (seq, virtual servers), or None if upstream has no snapshot
+        or it's removed before all chunks are got.
+        """
+        page = self.plugin_rpc.get_revision_snapshot()
+        if not page:
+            return None
+        seq, chunks = page['seq'], [page['data']]
+        for chunk in range(1, page['chunks']):
+            page = self.plugin_rpc.get_revision_snapshot(seq, chunk)
+            if not page:
+                return None
+            chunks.append(page['data'])
+        data = zlib.decompress(''.join(base64.b64decode(c) for c in chunks))
+        return seq, jsonutils.loads(data)
+
+    def _resync(self, end, watermark):
+        """Rebuild local state from upstream.
+
+        Upstream snapshot is loaded and revision logs after it are tailed,
+        if snapshot is not older than watermark. Otherwise all upstream
+        revisions are processed.
+        """
+        snapshot = self._get_upstream_snapshot()
+        if snapshot and snapshot[0] >= watermark:
+            seq, virtualservers = snapshot
+            # virtual servers notified after snapshot are kept as they are
+            vs_keys = self._get_newer_vs_keys(seq)
+            self._replace_virtualservers(virtualservers, vs_keys)
+            self.resync_callback(vs_keys)
+            self._set_local_revision(seq)
+            LOG.info(_LI("Loaded upstream revision snapshot %s"), seq)
+            return self._process_upstream_revisions(seq, end) or seq
+        return self._resync_with_revisions(end, watermark)
+
+    def _resync_with_revisions(self, end, watermark):
+        """Rebuild local state from all upstream revisions.
+
+        Local revision is only advanced when resync is done, since virtual
+        servers gone from upstream are known after all pages processed.
+        It's advanced to watermark at least, upstream still has revision
+        logs after that.
+        """
+        # virtual servers notified after end are kept as they are
+        vs_keys = self._get_newer_vs_keys(end)
+        new_revision = watermark
+        for page in self._get_upstream_pages(None, end):
+            new_revision = max(new_revision, self._resync_page(
+                page, vs_keys))
+        self.resync_callback(vs_keys)
         self._set_local_revision(new_revision)
+        return new_revision
 
     def update_with_upstream(self, start=None, end=None):
-        missed_revisions = self._get_upstream_revisions(start, end)
-        if missed_revisions:
-            new_revision = self._process_revisions(missed_revisions)
-            if not end and new_revision:
-                self._set_local_revision(new_revision)
-            elif end:
-                self._set_local_revision(end)
-
-    def _filter_revisions(self, revisions):
-        # all revisions we can get should with the following timelines:
-        # (s: start, c: created_at, u: updated_at, d: deleted_at, \:non-)
-        #             s -- c -- u -- \d
-        #             s -- c -- \u -- \d
-        #        c -- s -- u -- d
-        #        c -- s -- \u -- d
-        #        c -- s -- u -- \d
-        #   c -- u -- s -- d
-        #  c -- \u -- s -- d
-        new_ts = 0
-        to_delete = {}
-        to_create_or_update = {const.IPVS_VIRTUALSERVER: set(),
-                               const.IPVS_REALSERVER: {}}
-        for (created_at, updated_at, deleted_at, res_id, res_type, parent_id,
-             extra) in revisions:
-            new_ts = max(new_ts, created_at, updated_at, deleted_at)
-            if deleted_at:
-                vs_key, rs = extra.split(const.EXTRA_VS_SEP)
-                listen_ip, listen_port = vs_key.split(const.EXTRA_IP_SEP)
-                if res_type == const.IPVS_VIRTUALSERVER:
-                    if res_id not in to_delete:
-                        to_delete[res_id] = {
-                            const.LISTEN_IP: listen_ip,
-                            const.LISTEN_PORT: listen_port}
-                    else:
-                        to_delete[res_id][const.REALSERVERS].clear()
-                    to_delete[res_id][const.REALSERVERS] = {const.ALL: 1}
-                else:
-                    server_ip, server_port = rs.split(const.EXTRA_IP_SEP)
-                    if parent_id not in to_delete:
-                        to_delete[parent_id] = {
-                            const.LISTEN_IP: listen_ip,
-                            const.LISTEN_PORT: listen_port,
-                            const.REALSERVERS: {
-                                res_id: {
-                                    const.SERVER_IP: server_ip,
-                                    const.SERVER_PORT: server_port}}}
-                    elif const.ALL not in to_delete[parent_id].get(
-                            const.REALSERVERS):
-                        to_delete[parent_id][const.REALSERVERS][res_id] = {
-                            const.SERVER_IP: server_ip,
-                            const.SERVER_PORT: server_port}
-                continue
-
-            if res_type == const.IPVS_VIRTUALSERVER and updated_at:
-                to_create_or_update[res_type].add(res_id)
-                continue
-
-            if res_type == const.IPVS_REALSERVER and (
-                const.ALL not in to_delete.get(parent_id, {}).get(
-                    const.REALSERVERS, {})):
-                if parent_id not in to_create_or_update[res_type]:
-                    to_create_or_update[res_type][parent_id] = set()
-                to_create_or_update[res_type][parent_id].add(res_id)
-        to_create_or_update[const.IPVS_VIRTUALSERVER] -= set(
-            to_create_or_update[const.IPVS_REALSERVER].keys())
-        return new_ts, to_delete, to_create_or_update
-
-    def _process_revisions(self, revisions):
-        new_ts, to_delete, to_create_or_update = self._filter_revisions(
-            revisions)
-        if to_delete:
-            for vs in to_delete.values():
-                realservers = vs.pop(const.REALSERVERS)
-                if const.ALL in realservers:
-                    realservers = []
-                else:
-                    realservers = realservers.values()
-                self.delete_callback(vs, realservers)
-            # NOTE: In missed revisions, some virtual server with their real
-            # servers may get re-created after deleted. In such a case,
-            # deleting and creating the same vs & rs so close will case ipvs
-            # "Memory allocation problem". Sleep 1 sec is a trick to avoid that
-            time.sleep(1)
-        for vid, rid in to_create_or_update[const.IPVS_REALSERVER].iteritems():
-            realservers = self.plugin_rpc.get_ipvs_realservers(
-                filters={'ipvs_virtualserver_id': [vid], 'id': rid})
-            if not realservers:
-                continue
-            for rs in realservers:
-                vs_info = rs.pop(const.VIRTUALSERVER)
-            self.update_callback(vs_info, realservers)
-        vids = to_create_or_update[const.IPVS_VIRTUALSERVER]
-        if vids:
-            for vs in self.plugin_rpc.get_ipvs_virtualservers(
-                    filters={'id': vids}):
-                self.update_callback(vs)
-        return new_ts
+        """Process upstream revisions after local revision up to end.
+
+        Return the latest processed seq, None if there is nothing new.
+        """
+        new_revision = self._process_upstream_revisions(start, end)
+        if new_revision and end:
+            # snapshot loaded by a resync may be newer than end
+            self._set_local_revision(max(new_revision, end))
+        return new_revision
+
+    def _process_logs(self, logs):
+        """Apply revision logs in order, return the latest seq."""
+        for seq, resource_type, operation, payload in logs:
+            self._apply_log(seq, resource_type, operation,
+                            jsonutils.loads(payload))
+        return seq
+
+    def _apply_log(self, seq, resource_type, operation, payload):
+        if resource_type == const.IPVS_LOADBALANCER:
+            for vs in payload[const.VIRTUALSERVERS]:
+                if self._skip_log(vs, seq):
+                    continue
+                realservers = vs.pop(const.REALSERVERS, None)
+                if operation == const.DELETE or realservers == []:
+                    self.delete_callback(vs, [])
+                elif realservers:
+                    # states of virtual server and its real servers after
+                    # loadbalancer admin state is populated to them
+                    self.update_callback(vs, realservers, replace=True)
+                elif const.ADMIN_STATE_UP in payload:
+                    # logged by plugin without real servers in payload
+                    vs[const.ADMIN_STATE_UP] = payload[const.ADMIN_STATE_UP]
+                    self.update_callback(vs)
+            return
+        if self._skip_log(payload, seq):
+            return
+        if resource_type == const.IPVS_VIRTUALSERVER:
+            # virtual server without real servers has nothing to apply, so
+            # creation is skipped
+            if operation == const.DELETE:
+                self.delete_callback(payload, [])
+            elif operation == const.UPDATE:
+                self.update_callback(payload)
+        else:
+            realservers = payload.pop(const.REALSERVERS)
+            if operation == const.DELETE:
+                self.delete_callback(payload, realservers)
+            else:
+                self.update_callback(payload, realservers)
+
+    def _skip_log(self, vs_info, seq):
+        vs_keys = [ipvs_table.get_service_key(vs_info)]
+        if self.is_applied(vs_keys, seq):
+            return True
+        self.set_applied(vs_keys, seq)
+        return False
+
+    def _resync_page(self, page, vs_keys):
+        """Replace local virtual servers by upstream ones in a page.
+
+        Keys of upstream virtual servers with real servers are added into
+        vs_keys. Return the latest seq of page.
+        """
+        self._replace_virtualservers(page[const.VIRTUALSERVERS], vs_keys)
+        return max(rev[-1] for rev in page['revisions'])
+
+    def _replace_virtualservers(self, virtualservers, vs_keys):
+        """Replace local virtual servers, except those already in vs_keys."""
+        newer_vs_keys = set(vs_keys)
+        for vs in virtualservers:
+            realservers = vs.pop(const.REALSERVERS)
+            vs_key = ipvs_table.get_service_key(vs)
+            if realservers and vs_key not in newer_vs_keys:
+                vs_keys.add(vs_key)
+                self.update_callback(vs, realservers, replace=True)
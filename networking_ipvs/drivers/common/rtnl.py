@@ -0,0 +1,99 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import socket
+import struct
+
+from networking_ipvs.drivers.common import netlink
+
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+RT_SCOPE_UNIVERSE = 0
+
+# family, prefixlen, flags, scope, index
+IFADDRMSG = struct.Struct('=BBBBI')
+HOST_PREFIXLEN = 32
+
+# errors mean an address is already in the wanted state, they are what
+# "RTNETLINK answers: File exists" and "Cannot assign requested address"
+# from `ip addr add/del` come from
+HARMLESS_ADD_ERRORS = (errno.EEXIST,)
+HARMLESS_DEL_ERRORS = (errno.EADDRNOTAVAIL,)
+
+
+def get_ifindex(nic_name):
+    with open('/sys/class/net/%s/ifindex' % nic_name) as f:
+        return int(f.read())
+
+
+def pack_host_addr(index, ip_address):
+    addr = socket.inet_aton(ip_address)
+    return IFADDRMSG.pack(socket.AF_INET, HOST_PREFIXLEN, 0,
+                          RT_SCOPE_UNIVERSE, index) + (
+        netlink.pack_attr(IFA_LOCAL, addr) +
+        netlink.pack_attr(IFA_ADDRESS, addr))
+
+
+class RtnlAddr(object):
+    """Add, delete and dump IPv4 /32 addresses by one rtnetlink socket."""
+
+    def __init__(self, sock=None):
+        self._nl = netlink.NetlinkSocket(netlink.NETLINK_ROUTE, sock)
+
+    def _batch(self, msg_type, flags, addrs, harmless_errors):
+        errors = self._nl.batch([
+            (msg_type, pack_host_addr(index, ip_address), flags)
+            for index, ip_address in addrs])
+        return [0 if err in harmless_errors else err for err in errors]
+
+    def add_addrs(self, addrs):
+        """Add addrs, a list of (ifindex, ip_address), in batch.
+
+        Return a list of errno for addrs, an existing address counts as
+        added.
+        """
+        return self._batch(RTM_NEWADDR,
+                           netlink.NLM_F_CREATE | netlink.NLM_F_EXCL,
+                           addrs, HARMLESS_ADD_ERRORS)
+
+    def del_addrs(self, addrs):
+        """Delete addrs, a list of (ifindex, ip_address), in batch.
+
+        Return a list of errno for addrs, a missing address counts as
+        deleted.
+        """
+        return self._batch(RTM_DELADDR, 0, addrs, HARMLESS_DEL_ERRORS)
+
+    def get_host_addrs(self):
+        """Dump IPv4 /32 addresses, return {ifindex: set(ip_address)}."""
+        addrs = {}
+        for reply in self._nl.request(
+                RTM_GETADDR,
+                IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0),
+                netlink.NLM_F_DUMP):
+            family, prefixlen, _flags, _scope, index = (
+                IFADDRMSG.unpack_from(reply))
+            if family != socket.AF_INET or prefixlen != HOST_PREFIXLEN:
+                continue
+            attrs = netlink.parse_attrs(reply[IFADDRMSG.size:])
+            addr = attrs.get(IFA_LOCAL, attrs.get(IFA_ADDRESS))
+            if addr:
+                addrs.setdefault(index, set()).add(socket.inet_ntoa(addr))
+        return addrs
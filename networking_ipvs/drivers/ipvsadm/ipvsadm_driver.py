@@ -0,0 +1,32 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IPVS driver applying changes with ipvsadm restore streams.
+
+It works as the netlink driver does, virtual servers changed by an RPC are
+diffed against the known kernel table, but the operations are applied by
+one `ipvsadm -R` exec through the rootwrap of IPVSDriver._execute, so agent
+doesn't need CAP_NET_ADMIN itself. The kernel table is read by parsing
+`ipvsadm -S -n`, so converging after an agent restart takes one dump and
+one restore exec.
+"""
+
+from networking_ipvs.drivers.ipvsadm import ipvsadm_restore
+from networking_ipvs.drivers.netlink import netlink_driver
+
+
+class IPVSDriver(netlink_driver.IPVSDriver):
+
+    def _get_ipvs_client(self):
+        return ipvsadm_restore.IpvsadmRestore(self._execute)
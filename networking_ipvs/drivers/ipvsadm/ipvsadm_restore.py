@@ -0,0 +1,130 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+
+import netaddr
+
+from networking_ipvs.common import constants as const
+from networking_ipvs.drivers.common import ipvs_table
+
+# -b is fullnat in ipvsadm with Alibaba fullnat patched
+FORWARD_OPTIONS = {const.DR: '-g',
+                   const.NAT: '-m',
+                   const.TUN: '-i',
+                   const.FULLNAT: '-b'}
+FORWARD_METHODS = {v: k for k, v in FORWARD_OPTIONS.items()}
+DEFAULT_SCHEDULER = 'wlc'
+DEFAULT_WEIGHT = 1
+
+
+def _get_option(fields, option):
+    if option in fields:
+        idx = fields.index(option)
+        if idx + 1 < len(fields):
+            return fields[idx + 1]
+
+
+def _split_addr(addr):
+    ip, _sep, port = addr.rpartition(':')
+    if not netaddr.valid_ipv4(ip) or not port.isdigit():
+        return None
+    return ip, int(port)
+
+
+def parse_services(output):
+    """Parse `ipvsadm -S -n` output into an ipvs_table table.
+
+    Only TCP IPv4 services are kept, fwmark and UDP services are ignored.
+    """
+    services = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if not fields or fields[0] not in ('-A', '-a'):
+            continue
+        key = _split_addr(_get_option(fields, '-t') or '')
+        if not key:
+            continue
+        if fields[0] == '-A':
+            services[key] = {
+                const.SCHEDULER: _get_option(
+                    fields, '-s') or DEFAULT_SCHEDULER,
+                ipvs_table.DESTS: {}}
+            continue
+        dest = _split_addr(_get_option(fields, '-r') or '')
+        if not dest or key not in services:
+            continue
+        forward_method = next((FORWARD_METHODS[f] for f in fields
+                               if f in FORWARD_METHODS), const.DR)
+        services[key][ipvs_table.DESTS][dest] = (
+            forward_method, int(_get_option(fields, '-w') or DEFAULT_WEIGHT))
+    return services
+
+
+def get_restore_line(op):
+    """Get ipvsadm restore line for an ipvs_table operation."""
+    name, key = op[0], op[1]
+    service = '-t %s:%s' % key
+    if name == ipvs_table.ADD_SERVICE:
+        return '-A %s -s %s' % (service, op[2])
+    elif name == ipvs_table.EDIT_SERVICE:
+        return '-E %s -s %s' % (service, op[2])
+    elif name == ipvs_table.DEL_SERVICE:
+        return '-D %s' % service
+    dest = '-r %s:%s' % op[2]
+    if name == ipvs_table.DEL_DEST:
+        return '-d %s %s' % (service, dest)
+    cmd = '-a' if name == ipvs_table.ADD_DEST else '-e'
+    return '%s %s %s %s -w %s' % (cmd, service, dest, FORWARD_OPTIONS[op[3]],
+                                  op[4])
+
+
+class IpvsadmRestore(object):
+    """IPVS client applying operations by one `ipvsadm -R` stream.
+
+    executor should work like IPVSDriver._execute.
+    """
+
+    def __init__(self, executor):
+        self._execute = executor
+
+    def get_services(self):
+        return parse_services(
+            self._execute(['ipvsadm', '-S', '-n'], reraise=True))
+
+    def _restore(self, ops):
+        stream = ''.join(get_restore_line(op) + '\n' for op in ops)
+        try:
+            self._execute(['ipvsadm', '-R'], reraise=True,
+                          process_input=stream)
+        except RuntimeError:
+            return False
+        return True
+
+    def apply(self, ops):
+        """Apply operations in one ipvsadm exec.
+
+        Return a list of errno for ops. ipvsadm cannot tell which line
+        failed, so when the exec fails, kernel table is dumped, ops already
+        in effect are taken as applied, and the others are applied by one
+        exec each to find out which ones fail.
+        """
+        if self._restore(ops):
+            return [0] * len(ops)
+        try:
+            services = self.get_services()
+        except RuntimeError:
+            return [errno.EIO] * len(ops)
+        return [0 if ipvs_table.is_applied(services, op) or self._restore(
+            [op]) else errno.EIO for op in ops]
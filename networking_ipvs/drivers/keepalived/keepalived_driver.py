@@ -15,28 +15,53 @@
 import copy
 import hashlib
 import os
+import time
 
 from neutron.agent.linux import utils
 from oslo_log import log as logging
 from oslo_utils import fileutils
 
-from networking_ipvs._i18n import _LE
+from networking_ipvs._i18n import _LE, _LI, _LW
 from networking_ipvs.common import constants as const
+from networking_ipvs.common import digest
 from networking_ipvs.common import rpc
 from networking_ipvs.common import template
+from networking_ipvs.drivers.common import ipvs_table
+from networking_ipvs.drivers.common import locks
 from networking_ipvs.drivers.common import nic_driver
 from networking_ipvs.drivers.common import revision
 from networking_ipvs.drivers.common import utils as ipvs_utils
+from networking_ipvs.drivers.keepalived import records
+from networking_ipvs.drivers.keepalived import reloader
 from networking_ipvs.drivers.keepalived import utils as kutils
 
 LOG = logging.getLogger(__name__)
 
+# snapshot is rewritten when its journal has more entries than this and
+# the count of cached virtual servers
+MIN_JOURNAL_ENTRIES = 1024
+
 
 class ConfigDriver(template.KeepalivedTemplate):
 
     def __init__(self, conf):
         super(ConfigDriver, self).__init__(conf)
         self.keepalived_conf_path = self.conf.keepalived.keepalived_conf_path
+        # names of virtual server conf files included by keepalived main
+        # conf, main conf only needs to be rewritten when this changes
+        self._includes = set()
+        self._main_conf_dirty = True
+        # file name: (mtime, size, md5) for virtual server conf files
+        self._file_meta = {}
+        # (listen_ip, listen_port) of virtual servers whose conf files
+        # changed since last snapshot save
+        self._snapshot_changes = set()
+        # whether conf files changed since last pop_conf_changed, keepalived
+        # has nothing to reload if not. Agent may start with conf files
+        # keepalived hasn't loaded, so it's True at first.
+        self._conf_changed = True
+        self._write_stats = {'vs_conf_writes': 0,
+                             'vs_conf_writes_skipped': 0}
 
     def _replace_file(self, content, file_path):
         dir_path = file_path.rsplit(os.sep, 1)[0]
@@ -44,8 +69,55 @@ class ConfigDriver(template.KeepalivedTemplate):
         os.chmod(tmp_file, 0o644)
         os.rename(tmp_file, file_path)
 
-    def _update_keepalived_main(self):
-        self._replace_file(self.get_main_conf(), self.keepalived_conf_path)
+    def _write_vs_file(self, content, file_path):
+        file_name = os.path.basename(file_path)
+        md5 = hashlib.md5(content).hexdigest()
+        meta = self._file_meta.get(file_name)
+        if meta and meta[2] == md5 and os.path.isfile(file_path):
+            # e.g. a replayed notification, file already has the content
+            self._write_stats['vs_conf_writes_skipped'] += 1
+            return
+        self._replace_file(content, file_path)
+        stat = os.stat(file_path)
+        self._file_meta[file_name] = (stat.st_mtime, stat.st_size, md5)
+        self._write_stats['vs_conf_writes'] += 1
+        self._mark_snapshot_change(file_name)
+        self._conf_changed = True
+
+    def _remove_vs_file(self, file_path):
+        os.remove(file_path)
+        self._file_meta.pop(os.path.basename(file_path), None)
+        self._mark_snapshot_change(os.path.basename(file_path))
+        self._conf_changed = True
+
+    def _mark_snapshot_change(self, file_name):
+        key = kutils.get_vs_key(file_name)
+        if key:
+            self._snapshot_changes.add(key)
+
+    def pop_conf_changed(self):
+        changed, self._conf_changed = self._conf_changed, False
+        return changed
+
+    def _include(self, file_path):
+        file_name = os.path.basename(file_path)
+        if file_name not in self._includes:
+            self._includes.add(file_name)
+            self._main_conf_dirty = True
+
+    def _exclude(self, file_path):
+        file_name = os.path.basename(file_path)
+        if file_name in self._includes:
+            self._includes.remove(file_name)
+            self._main_conf_dirty = True
+
+    def flush_main_conf(self):
+        if not self._main_conf_dirty:
+            return
+        self._replace_file(self.get_main_conf(sorted(self._includes)),
+                           self.keepalived_conf_path)
+        self._main_conf_dirty = False
+        self._conf_changed = True
 
     def _get_file_path(self, vs_info):
         file_path = os.path.join(
@@ -60,20 +132,22 @@ class ConfigDriver(template.KeepalivedTemplate):
         if file_path.endswith(const.DOWN):
             up_file_path = file_path[:-5]
             if os.path.isfile(up_file_path):
-                os.remove(up_file_path)
+                self._remove_vs_file(up_file_path)
+            self._exclude(up_file_path)
         else:
             down_file_path = file_path + const.DOWN
             if os.path.isfile(down_file_path):
-                os.remove(down_file_path)
+                self._remove_vs_file(down_file_path)
         if realservers:
-            self._replace_file(
+            self._write_vs_file(
                 self.get_virtualserver_conf(vs_info, realservers), file_path)
-        self._update_keepalived_main()
+            if not file_path.endswith(const.DOWN):
+                self._include(file_path)
 
     def delete(self, vs_info):
         file_path = self._get_file_path(vs_info)
-        os.remove(file_path)
-        self._update_keepalived_main()
+        self._remove_vs_file(file_path)
+        self._exclude(file_path)
 
 
 class ConfigManager(ConfigDriver):
@@ -81,76 +155,257 @@ class ConfigManager(ConfigDriver):
     def __init__(self, conf):
         super(ConfigManager, self).__init__(conf)
         fileutils.ensure_tree(self.vs_conf_path)
+        self.snapshot_path = self.conf.keepalived.vs_cache_snapshot_path
+        self.journal_path = None
+        if self.snapshot_path:
+            fileutils.ensure_tree(os.path.dirname(self.snapshot_path))
+            self.journal_path = self.snapshot_path + '.journal'
+        # whether whole snapshot should be rewritten by next save
+        self._snapshot_full = True
+        self._journal_entries = 0
         self._init_vs_cache()
         self._new_vips = set()
         self._stale_vips = set()
 
+    def _load_snapshot(self):
+        """Get (files meta, virtual servers) from snapshot and its journal."""
+        if not self.snapshot_path or not os.path.isfile(self.snapshot_path):
+            return {}, {}
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                files, virtualservers = kutils.load_snapshot(f.read())
+            journal = ''
+            if os.path.isfile(self.journal_path):
+                with open(self.journal_path) as f:
+                    journal = f.read()
+            self._journal_entries = kutils.load_journal(
+                journal, files, virtualservers)
+        except (IOError, ValueError) as e:
+            LOG.warning(_LW("Failed to load virtual server cache snapshot "
+                            "%(path)s, all conf files will be parsed, get "
+                            "error %(err)s"),
+                        {'path': self.snapshot_path, 'err': e})
+            self._journal_entries = 0
+            return {}, {}
+        # lines appended after a broken one would never be loaded, rewrite
+        # snapshot to drop it
+        self._snapshot_full = (
+            self._journal_entries != len(journal.splitlines()))
+        return files, virtualservers
+
+    def save_snapshot(self):
+        """Persist changes of vs cache since last save for next agent start.
+
+        Virtual servers whose conf files changed are appended to journal of
+        snapshot. Snapshot is rewritten and journal is emptied when journal
+        grows larger than the cache. Entries are checked against conf files
+        mtime and size when they are loaded, so a journal left by a stop
+        between the two steps is harmless.
+        """
+        if not self.snapshot_path or not (
+                self._snapshot_full or self._snapshot_changes):
+            return
+        try:
+            if self._snapshot_full or (
+                    self._journal_entries + len(self._snapshot_changes) >
+                    max(MIN_JOURNAL_ENTRIES, len(self._vs_up_rs))):
+                self._replace_file(
+                    kutils.dump_snapshot(self._file_meta, [
+                        self.get_vs(*key) for key in self.get_vs_keys()]),
+                    self.snapshot_path)
+                open(self.journal_path, 'w').close()
+                self._journal_entries = 0
+            else:
+                lines = []
+                for key in self._snapshot_changes:
+                    file_name = '%s_%s' % key
+                    lines.append(kutils.dump_journal_entry(key, {
+                        f: self._file_meta.get(f)
+                        for f in (file_name, file_name + const.DOWN)},
+                        self.get_vs(*key)))
+                with open(self.journal_path, 'a') as f:
+                    f.write(''.join(lines))
+                self._journal_entries += len(lines)
+        except (IOError, OSError) as e:
+            LOG.error(_LE("Failed to save virtual server cache snapshot "
+                          "%(path)s, get error %(err)s"),
+                      {'path': self.snapshot_path, 'err': e})
+            return
+        self._snapshot_full = False
+        self._snapshot_changes = set()
+
+    def _add_to_vs_cache(self, vs):
+        listen_ip, listen_port = vs[const.LISTEN_IP], vs[const.LISTEN_PORT]
+        was_vs_live = self._is_vs_live(listen_ip, listen_port)
+        if listen_ip not in self._vs_cache:
+            self._vs_cache[listen_ip] = {}
+        self._vs_cache[listen_ip][listen_port] = vs
+        self._vs_up_rs[(listen_ip, listen_port)] = sum(
+            1 for rs in vs[const.REALSERVERS].values()
+            if rs[const.ADMIN_STATE_UP])
+        self._vs_rs_hashes[(listen_ip, listen_port)] = digest.get_rs_hashes(
+            vs[const.REALSERVERS].values())
+        self._update_vip_live_vs(listen_ip, was_vs_live,
+                                 self._is_vs_live(listen_ip, listen_port))
+
     def _init_vs_cache(self):
+        """Build vs cache from snapshot and conf files.
+
+        Virtual servers in snapshot are reused when their conf files have
+        the same mtime and size as snapshot recorded, other conf files are
+        parsed.
+        """
         self._vs_cache = {}
-        for f in os.listdir(self.vs_conf_path):
-            vs = kutils.parse_virtualserver_conf(
-                os.path.join(self.vs_conf_path, f))
+        # a vs is live when it's admin state up and has admin state up real
+        # servers, a vip is down when it has no live vs. Counters below are
+        # maintained along with vs cache, so checking vip state is O(1).
+        # (listen_ip, listen_port): count of admin state up real servers
+        self._vs_up_rs = {}
+        # listen_ip: count of live virtual servers
+        self._vip_live_vs = {}
+        # (listen_ip, listen_port): real servers part of structural digest
+        self._vs_rs_hashes = {}
+        start = time.time()
+        known_files, known_vs_cache = self._load_snapshot()
+        file_paths, file_stats = [], {}
+        file_names = os.listdir(self.vs_conf_path)
+        for f in file_names:
+            if f[-5:] != const.DOWN:
+                self._includes.add(f)
+            file_path = os.path.join(self.vs_conf_path, f)
+            stat = os.stat(file_path)
+            meta = known_files.get(f)
+            key = kutils.get_vs_key(f)
+            if key and meta and meta[:2] == (stat.st_mtime, stat.st_size):
+                vs = known_vs_cache.get(key)
+                if vs:
+                    self._file_meta[f] = meta
+                    self._add_to_vs_cache(vs)
+                    continue
+            file_paths.append(file_path)
+            file_stats[f] = stat
+            self._mark_snapshot_change(f)
+        # files removed since snapshot
+        for f in set(known_files) - set(file_names):
+            self._mark_snapshot_change(f)
+        for file_path, vs, md5 in kutils.parse_virtualserver_confs(
+                file_paths, self.conf.keepalived.conf_parse_workers):
+            f = os.path.basename(file_path)
+            self._file_meta[f] = (file_stats[f].st_mtime,
+                                  file_stats[f].st_size, md5)
             if not vs:
                 continue
-            vs[const.ADMIN_STATE_UP] = f[-5:] != const.DOWN
-            listen_ip, listen_port = vs[const.LISTEN_IP], vs[const.LISTEN_PORT]
-            if listen_ip not in self._vs_cache:
-                self._vs_cache[listen_ip] = {}
-            self._vs_cache[listen_ip][listen_port] = vs
+            vs[const.ADMIN_STATE_UP] = file_path[-5:] != const.DOWN
+            self._add_to_vs_cache(vs)
+        self._parse_stats = {
+            'vs_conf_parsed': len(file_paths),
+            'vs_conf_reused': len(self._file_meta) - len(file_paths),
+            'vs_conf_parse_seconds': time.time() - start}
+        LOG.info(_LI("Parsed %(vs_conf_parsed)d virtual server conf files "
+                     "and reused %(vs_conf_reused)d from snapshot in "
+                     "%(vs_conf_parse_seconds).3f seconds"),
+                 self._parse_stats)
+
+    def get_stats(self):
+        stats = dict(self._parse_stats)
+        stats.update(self._write_stats)
+        return stats
+
+    def _is_vs_live(self, listen_ip, listen_port):
+        vs = self._vs_cache.get(listen_ip, {}).get(listen_port)
+        return bool(vs and vs[const.ADMIN_STATE_UP] and
+                    self._vs_up_rs.get((listen_ip, listen_port)))
+
+    def _update_vip_live_vs(self, listen_ip, was_vs_live, is_vs_live):
+        if was_vs_live == is_vs_live:
+            return
+        count = self._vip_live_vs.get(listen_ip, 0) + (
+            1 if is_vs_live else -1)
+        if count:
+            self._vip_live_vs[listen_ip] = count
+        else:
+            self._vip_live_vs.pop(listen_ip, None)
 
     def _is_vip_down(self, listen_ip):
-        if listen_ip not in self._vs_cache:
-            return True
-        down = False
-        for vs in self._vs_cache[listen_ip].values():
-            if vs[const.ADMIN_STATE_UP] and any(
-                    rs[const.ADMIN_STATE_UP]
-                    for rs in vs[const.REALSERVERS].values()):
-                break
-        else:
-            down = True
-        return down
+        return not self._vip_live_vs.get(listen_ip)
+
+    def _track_vip_change(self, listen_ip, was_vip_down):
+        # the last change of vip in a batch decides whether it's plugged or
+        # unplugged
+        is_vip_down = self._is_vip_down(listen_ip)
+        if was_vip_down and not is_vip_down:
+            self._stale_vips.discard(listen_ip)
+            self._new_vips.add(listen_ip)
+        elif not was_vip_down and is_vip_down:
+            self._new_vips.discard(listen_ip)
+            self._stale_vips.add(listen_ip)
 
     def _update_vs_cache(self, vs_info, realservers=None):
         lip, lport = vs_info[const.LISTEN_IP], vs_info[const.LISTEN_PORT]
-        was_vip_down = self._is_vip_down(lip)
+        was_vs_live = self._is_vs_live(lip, lport)
         if lip not in self._vs_cache:
             self._vs_cache[lip] = {}
         if lport not in self._vs_cache[lip]:
-            self._vs_cache[lip][lport] = vs_info
-            self._vs_cache[lip][lport][const.REALSERVERS] = {}
-        self._vs_cache[lip][lport].update(vs_info)
+            self._vs_cache[lip][lport] = records.VirtualServer()
+        vs = self._vs_cache[lip][lport]
+        vs.update(vs_info)
+        up_rs = self._vs_up_rs.get((lip, lport), 0)
+        rs_hashes = self._vs_rs_hashes.get((lip, lport), 0)
         if realservers:
             for rs in realservers:
                 rs_key = '%s:%s' % (rs[const.SERVER_IP], rs[const.SERVER_PORT])
-                self._vs_cache[lip][lport][const.REALSERVERS].setdefault(
-                    rs_key, {})
-                self._vs_cache[lip][lport][const.REALSERVERS].get(
-                    rs_key).update(rs)
+                rs_record = vs[const.REALSERVERS].get(rs_key)
+                if rs_record:
+                    rs_hashes ^= digest.get_rs_hash(rs_record)
+                else:
+                    rs_record = vs[const.REALSERVERS][rs_key] = (
+                        records.RealServer())
+                was_rs_up = bool(rs_record[const.ADMIN_STATE_UP])
+                rs_record.update(rs)
+                rs_hashes ^= digest.get_rs_hash(rs_record)
+                up_rs += bool(rs_record[const.ADMIN_STATE_UP]) - was_rs_up
         elif const.ADMIN_STATE_UP in vs_info:
-            for rs in self._vs_cache[lip][lport][const.REALSERVERS].values():
+            for rs in vs[const.REALSERVERS].values():
                 rs[const.ADMIN_STATE_UP] = vs_info[const.ADMIN_STATE_UP]
-        is_vip_down = self._is_vip_down(lip)
-        if was_vip_down and not is_vip_down:
-            self._new_vips.add(lip)
-        elif not was_vip_down and is_vip_down:
-            self._stale_vips.add(lip)
+            up_rs = len(vs[const.REALSERVERS]) if vs_info[
+                const.ADMIN_STATE_UP] else 0
+            rs_hashes = digest.get_rs_hashes(vs[const.REALSERVERS].values())
+        self._vs_up_rs[(lip, lport)] = up_rs
+        self._vs_rs_hashes[(lip, lport)] = rs_hashes
+        self._update_vip_live_vs(lip, was_vs_live,
+                                 self._is_vs_live(lip, lport))
 
     def _delete_rs_from_cache(self, vs_info, realservers):
         listen_ip = vs_info[const.LISTEN_IP]
         listen_port = vs_info[const.LISTEN_PORT]
+        vs = self._vs_cache.get(listen_ip, {}).get(listen_port)
+        if not vs:
+            return
+        was_vs_live = self._is_vs_live(listen_ip, listen_port)
         for rs in realservers:
             rs_key = '%s:%s' % (rs[const.SERVER_IP], rs[const.SERVER_PORT])
-            self._vs_cache.get(listen_ip, {}).get(listen_port, {}).get(
-                const.REALSERVERS, {}).pop(rs_key, None)
+            rs_record = vs[const.REALSERVERS].pop(rs_key, None)
+            if not rs_record:
+                continue
+            self._vs_rs_hashes[(listen_ip, listen_port)] ^= (
+                digest.get_rs_hash(rs_record))
+            if rs_record[const.ADMIN_STATE_UP]:
+                self._vs_up_rs[(listen_ip, listen_port)] -= 1
+        self._update_vip_live_vs(listen_ip, was_vs_live,
+                                 self._is_vs_live(listen_ip, listen_port))
 
     def _delete_vs_from_cache(self, vs_info):
         listen_ip = vs_info[const.LISTEN_IP]
         listen_port = vs_info[const.LISTEN_PORT]
+        was_vs_live = self._is_vs_live(listen_ip, listen_port)
         vs_info = self._vs_cache.get(listen_ip, {}).pop(listen_port, None)
+        self._vs_up_rs.pop((listen_ip, listen_port), None)
+        self._vs_rs_hashes.pop((listen_ip, listen_port), None)
+        self._update_vip_live_vs(listen_ip, was_vs_live, False)
         if not self._vs_cache.get(listen_ip):
             if listen_ip in self._vs_cache:
                 self._vs_cache.pop(listen_ip)
+                self._new_vips.discard(listen_ip)
                 self._stale_vips.add(listen_ip)
         return vs_info
 
@@ -174,6 +429,18 @@ class ConfigManager(ConfigDriver):
     def get_vips(self):
         return self._vs_cache.keys()
 
+    def get_live_vips(self):
+        """Get vips which should be plugged, they have live vs."""
+        return self._vip_live_vs.keys()
+
+    def get_vs(self, listen_ip, listen_port):
+        return self._vs_cache.get(listen_ip, {}).get(listen_port)
+
+    def get_vs_keys(self):
+        return [(listen_ip, listen_port)
+                for listen_ip, vss in self._vs_cache.items()
+                for listen_port in vss]
+
     def get_changed_vips(self):
         new_vips = copy.copy(self._new_vips)
         stale_vips = copy.copy(self._stale_vips)
@@ -181,32 +448,65 @@ class ConfigManager(ConfigDriver):
         self._stale_vips.clear()
         return new_vips, stale_vips
 
-    def update(self, vs_info, realservers=None):
+    def update(self, vs_info, realservers=None, replace=False):
+        """Update vs and its realservers.
+
+        With replace, realservers are all realservers vs should have, cached
+        ones not in them are removed in the same update.
+        """
+        # before removing realservers, which may take vip down for a while
+        was_vip_down = self._is_vip_down(vs_info[const.LISTEN_IP])
+        if replace:
+            rs_keys = set('%s:%s' % (rs[const.SERVER_IP],
+                                     rs[const.SERVER_PORT])
+                          for rs in realservers)
+            self._delete_rs_from_cache(vs_info, [
+                rs for rs in self._get_realservers(vs_info)
+                if '%s:%s' % (rs[const.SERVER_IP],
+                              rs[const.SERVER_PORT]) not in rs_keys])
         self._update_vs_cache(vs_info, realservers)
+        self._track_vip_change(vs_info[const.LISTEN_IP], was_vip_down)
         realservers = self._get_realservers(vs_info)
         vs_info = self._get_vs_info(vs_info)
         super(ConfigManager, self).update(vs_info, realservers)
 
     def delete_rs(self, vs_info, realservers):
+        was_vip_down = self._is_vip_down(vs_info[const.LISTEN_IP])
         self._delete_rs_from_cache(vs_info, realservers)
         realservers = self._get_realservers(vs_info)
         if not realservers:
-            self.delete_vs(vs_info)
+            self._delete_vs(vs_info, was_vip_down)
         else:
+            self._track_vip_change(vs_info[const.LISTEN_IP], was_vip_down)
             vs_info = self._get_vs_info(vs_info)
             super(ConfigManager, self).update(vs_info, realservers)
 
-    def delete_vs(self, vs_info):
+    def _delete_vs(self, vs_info, was_vip_down):
+        listen_ip = vs_info[const.LISTEN_IP]
         vs_info = self._delete_vs_from_cache(vs_info)
+        self._track_vip_change(listen_ip, was_vip_down)
         if vs_info:
             super(ConfigManager, self).delete(vs_info)
 
+    def delete_vs(self, vs_info):
+        self._delete_vs(vs_info, self._is_vip_down(vs_info[const.LISTEN_IP]))
+
     def get_vs_conf_md5(self, vs_info):
-        file_path = self._get_file_path(vs_info)
-        md5 = 0
-        if os.path.isfile(file_path):
-            md5 = hashlib.md5(open(file_path).read()).hexdigest()
-        return md5
+        # md5 is recorded when conf file is written or parsed, no file IO
+        meta = self._file_meta.get(
+            os.path.basename(self._get_file_path(vs_info)))
+        return meta[2] if meta else 0
+
+    def get_vs_digest(self, vs_info):
+        """Get structural digest of cached vs, or None if it's unknown."""
+        listen_ip = vs_info[const.LISTEN_IP]
+        listen_port = vs_info[const.LISTEN_PORT]
+        vs = self._vs_cache.get(listen_ip, {}).get(listen_port)
+        if not vs:
+            return None
+        return digest.format_digest(
+            digest.get_vs_hash(vs),
+            self._vs_rs_hashes.get((listen_ip, listen_port), 0))
 
 
 class IPVSDriver(rpc.PluginNotifyEndpoint):
@@ -216,13 +516,53 @@ class IPVSDriver(rpc.PluginNotifyEndpoint):
         self.conf = conf
         self.rpc_plugin = rpc_plugin
         self._fullnat_check()
-        self._config = ConfigManager(conf)
+        # notifications on different vips share it, those on a vip are
+        # ordered by dispatcher. Catch-ups with upstream and vip reconciles
+        # change all vips, so they own it.
+        self._lock = locks.SharedLock()
+        # end revision of catch-up requested by notifications, None means
+        # the latest
+        self._catch_up_pending = False
+        self._catch_up_end = None
+        self._config = self._get_config_manager()
         self._revision = revision.RevisionHelper(
             conf, rpc_plugin, self._revision_delete_callback,
-            self._revision_update_callback)
+            self._revision_update_callback, self._revision_resync_callback)
         self._nic = nic_driver.NICDriver(conf)
+        self._vip_stats = {'vip_reconciles': 0, 'vips_corrected': 0,
+                           'vips_corrected_last': 0}
+        self._reload_skipped = 0
+        self._reloader = reloader.ReloadScheduler(
+            self._reload_keepalived,
+            self.conf.keepalived.reload_coalesce_window,
+            self.conf.keepalived.reload_max_delay)
         self.start_ipvs_sync_daemon()
 
+    def _get_config_manager(self):
+        return ConfigManager(self.conf)
+
+    def get_stats(self):
+        stats = self._reloader.get_stats()
+        stats.update(self._config.get_stats())
+        stats['reload_skipped'] = self._reload_skipped
+        stats.update(self._vip_stats)
+        return stats
+
+    def get_revision(self):
+        return self._revision.get_local_revision()
+
+    def reconcile_vips(self, budget=None):
+        """Fix vips on nics which differ from vs cache."""
+        # notifications changing vips wait, so they don't see a half fix
+        with self._lock.exclusive():
+            corrected = self._nic.check_nic_vips(
+                self._config.get_live_vips, budget, self._config.get_vips())
+        self._vip_stats['vip_reconciles'] += 1
+        self._vip_stats['vips_corrected'] += corrected
+        self._vip_stats['vips_corrected_last'] = corrected
+        if corrected:
+            LOG.warning(_LW("Corrected %d vips on nics"), corrected)
+
     def start_ipvs_sync_daemon(self):
         ipvs_utils.init_sync_daemon(
             self.conf.ipvs.ipvs_sync_daemon_nic,
@@ -239,9 +579,11 @@ class IPVSDriver(rpc.PluginNotifyEndpoint):
         else:
             self.name = const.IPVS
 
-    def _execute(self, cmd, extra_ok_codes=None, reraise=False):
+    def _execute(self, cmd, extra_ok_codes=None, reraise=False,
+                 process_input=None):
         try:
             return utils.execute(cmd, run_as_root=True,
+                                 process_input=process_input,
                                  extra_ok_codes=extra_ok_codes)
         except RuntimeError as e:
             msg = _LE("Keepalived driver failed to execute %(cmd)s, get "
@@ -250,37 +592,94 @@ class IPVSDriver(rpc.PluginNotifyEndpoint):
             if reraise:
                 raise e
 
+    def _reload_keepalived(self):
+        try:
+            ret = self._execute(['service', 'keepalived', 'reload'],
+                                reraise=True)
+            if 'FAILED' in ret:
+                raise RuntimeError(ret)
+        except RuntimeError:
+            msg = _LE("Failed to reload keepalived, try restart")
+            LOG.error(msg)
+            try:
+                self._execute(['service', 'keepalived', 'restart'],
+                              reraise=True)
+            except RuntimeError as e:
+                msg = _LE("Failed to restart keepalived.")
+                LOG.error(msg)
+                raise e
+
+    def _commit(self):
+        self._config.flush_main_conf()
+        if self._config.pop_conf_changed():
+            self._reloader.schedule()
+        else:
+            self._reload_skipped += 1
+
     def reload_keepalived(func):
         def wrap(self, *args, **kwargs):
             func(self, *args, **kwargs)
-            try:
-                ret = self._execute(['service', 'keepalived', 'reload'],
-                                    reraise=True)
-                if 'FAILED' in ret:
-                    raise RuntimeError(ret)
-            except RuntimeError:
-                msg = _LE("Failed to reload keepalived, try restart")
-                LOG.error(msg)
-                try:
-                    self._execute(['service', 'keepalived', 'restart'],
-                                  reraise=True)
-                except RuntimeError as e:
-                    msg = _LE("Failed to restart keepalived.")
-                    LOG.error(msg)
-                    raise e
+            self._commit()
         return wrap
 
+    def _apply_changed_vips(self):
+        to_add, to_delete = self._config.get_changed_vips()
+        self._nic.plug_vips(to_add)
+        self._nic.unplug_vips(to_delete)
+
     def manage_vip(func):
         def wrap(self, *args, **kwargs):
-            func(self, *args, **kwargs)
-            to_add, to_delete = self._config.get_changed_vips()
-            for vip in to_add:
-                self._nic.try_plug_vip(vip)
-            for vip in to_delete:
-                self._nic.try_unplug_vip(vip)
+            with self._lock.shared():
+                func(self, *args, **kwargs)
+                self._apply_changed_vips()
+            if self._catch_up_pending:
+                # notification is done after the catch-up it requested
+                with self._lock.exclusive():
+                    self._run_requested_catch_up()
+        return wrap
+
+    def _request_catch_up(self, end):
+        """Catch up with upstream up to end, after the running handler."""
+        if self._catch_up_pending and (
+                end is None or self._catch_up_end is None):
+            end = None
+        elif self._catch_up_pending:
+            end = max(end, self._catch_up_end)
+        self._catch_up_pending = True
+        self._catch_up_end = end
+
+    def _run_requested_catch_up(self):
+        # requests of concurrent notifications are done by one catch-up
+        if not self._catch_up_pending:
+            return
+        self._catch_up_pending = False
+        self._revision.update_with_upstream(end=self._catch_up_end)
+        self._apply_changed_vips()
+
+    def _get_notified_vs_keys(self, data):
+        if const.VIRTUALSERVERS in data:
+            return [ipvs_table.get_service_key(vs)
+                    for vs in data[const.VIRTUALSERVERS].values()]
+        return [ipvs_table.get_service_key(data)]
+
+    def track_revision(func):
+        def wrap(self, context, data):
+            revision = data.get(const.REVISION)
+            vs_keys = self._get_notified_vs_keys(data)
+            if self._revision.is_applied(vs_keys, revision):
+                # a catch-up has applied newer revisions on them
+                LOG.info(_LI("Skip notification of revision %s, newer "
+                             "revisions are applied"), revision)
+                return
+            func(self, context, data)
+            self._revision.set_applied(vs_keys, revision)
         return wrap
 
-    def _md5_check_failed(self, vs_info, md5):
+    def _md5_check_failed(self, vs_info, md5, vs_digest=None):
+        # plugin and agent of new versions compare structural digest, MD5
+        # of rendered conf is for those without digest or of other version
+        if digest.is_comparable(vs_digest):
+            return vs_digest != self._config.get_vs_digest(vs_info)
         return md5 != self._config.get_vs_conf_md5(vs_info)
 
     def md5_check(func):
@@ -290,10 +689,10 @@ class IPVSDriver(rpc.PluginNotifyEndpoint):
                 k: data[k] for k in (const.LISTEN_IP, const.LISTEN_PORT)}
             vs_info.update({
                 const.ADMIN_STATE_UP: data.get(const.ADMIN_STATE_UP, True)})
-            md5, timestamp = self._get_revision_keys(data)
+            md5, vs_digest, revision = self._get_revision_keys(data)
             func(self, *args, **kwargs)
-            if self._md5_check_failed(vs_info, md5):
-                self._revision.update_with_upstream(end=timestamp)
+            if self._md5_check_failed(vs_info, md5, vs_digest):
+                self._request_catch_up(revision)
         return wrap
 
     def _revision_delete_callback(self, vs_info, realservers):
@@ -302,43 +701,83 @@ class IPVSDriver(rpc.PluginNotifyEndpoint):
         else:
             self._config.delete_vs(vs_info)
 
-    def _revision_update_callback(self, vs_info, realservers):
-        self._config.update(vs_info, realservers)
+    def _revision_update_callback(self, vs_info, realservers=None,
+                                  replace=False):
+        self._config.update(vs_info, realservers, replace)
+
+    def _revision_resync_callback(self, vs_keys):
+        for listen_ip, listen_port in self._config.get_vs_keys():
+            if (listen_ip, int(listen_port)) not in vs_keys:
+                self._config.delete_vs({const.LISTEN_IP: listen_ip,
+                                        const.LISTEN_PORT: listen_port})
+
+    def _sync_state(self):
+        with self._lock.exclusive():
+            new_revision = self._revision.update_with_upstream()
+            self._apply_changed_vips()
+        return new_revision
 
-    @reload_keepalived
-    @manage_vip
     def sync_state(self):
-        self._revision.update_with_upstream()
+        self._sync_state()
+        self._commit()
+        # keepalived should catch up with resynced state at once
+        self._reloader.flush()
+
+    def catch_up(self):
+        """Apply upstream revisions which local state misses.
+
+        Notifications are casts which may be lost or fail, so revision
+        logs after local revision are tailed. Those already applied by
+        notifications are skipped.
+        """
+        if self._sync_state() is not None:
+            self._commit()
+
+    def save_snapshot(self):
+        self._config.save_snapshot()
+
+    def stop(self):
+        # snapshot doesn't depend on keepalived, save it even if the last
+        # reload fails
+        self._config.save_snapshot()
+        try:
+            self._reloader.flush()
+        except Exception:
+            LOG.exception(_LE("Failed to reload keepalived on stop"))
 
     def _get_revision_keys(self, data):
-        return data.pop(const.MD5), data.pop(const.TIMESTAMP, None)
+        data.pop(const.TIMESTAMP, None)
+        return (data.pop(const.MD5), data.pop(const.DIGEST, None),
+                data.pop(const.REVISION, None))
 
     @reload_keepalived
     @manage_vip
+    @track_revision
     def update_virtualservers(self, context, virtualservers):
         need_sync = False
-        timestamp = virtualservers[const.TIMESTAMP]
+        revision = virtualservers.get(const.REVISION)
         if virtualservers[const.ADMIN_STATE_UP]:
             for vs in virtualservers[const.VIRTUALSERVERS].values():
-                md5, _ = self._get_revision_keys(vs)
+                md5, vs_digest, _ = self._get_revision_keys(vs)
                 realservers = vs.pop(const.REALSERVERS)
                 self._config.update(vs, realservers)
-                if self._md5_check_failed(vs, md5):
+                if self._md5_check_failed(vs, md5, vs_digest):
                     need_sync = True
                     break
         else:
             for vs in virtualservers[const.VIRTUALSERVERS].values():
-                md5, _ = self._get_revision_keys(vs)
+                md5, vs_digest, _ = self._get_revision_keys(vs)
                 vs.update({const.ADMIN_STATE_UP: False})
                 self._config.update(vs)
-                if self._md5_check_failed(vs, md5):
+                if self._md5_check_failed(vs, md5, vs_digest):
                     need_sync = True
                     break
         if need_sync:
-            self._revision.update_with_upstream(end=timestamp)
+            self._request_catch_up(revision)
 
     @reload_keepalived
     @manage_vip
+    @track_revision
     def delete_virtualservers(self, context, virtualservers):
         timestamp = virtualservers[const.TIMESTAMP]
         for vs in virtualservers[const.VIRTUALSERVERS].values():
@@ -346,12 +785,14 @@ class IPVSDriver(rpc.PluginNotifyEndpoint):
 
     @reload_keepalived
     @manage_vip
+    @track_revision
     @md5_check
     def update_virtualserver(self, context, virtualserver):
         self._config.update(virtualserver)
 
     @reload_keepalived
     @manage_vip
+    @track_revision
     def delete_virtualserver(self, context, virtualserver):
         timestamp = virtualserver[const.TIMESTAMP]
         self._config.delete_vs(virtualserver)
@@ -366,6 +807,7 @@ class IPVSDriver(rpc.PluginNotifyEndpoint):
 
     @reload_keepalived
     @manage_vip
+    @track_revision
     @md5_check
     def create_realserver(self, context, realserver):
         vs_info, realserver = self._prepare_rs_data(realserver)
@@ -373,6 +815,7 @@ class IPVSDriver(rpc.PluginNotifyEndpoint):
 
     @reload_keepalived
     @manage_vip
+    @track_revision
     @md5_check
     def update_realserver(self, context, realserver):
         vs_info, realserver = self._prepare_rs_data(realserver)
@@ -380,6 +823,7 @@ class IPVSDriver(rpc.PluginNotifyEndpoint):
 
     @reload_keepalived
     @manage_vip
+    @track_revision
     @md5_check
     def delete_realserver(self, context, realserver):
         vs_info, realserver = self._prepare_rs_data(realserver)
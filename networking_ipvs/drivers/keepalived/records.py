@@ -0,0 +1,128 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compact records for virtual servers and real servers cached by agent.
+
+Records keep fields in __slots__ instead of per object dicts, ports and
+numbers are stored as int and IPs are interned. They still support dict
+style access by field name, so code and templates using vs[const.XXX] or
+vs.get(const.XXX) work with them as with dicts. Keys not being fields are
+ignored by update. to_dict and VirtualServer.from_dict convert them to and
+from plain dicts, e.g. for JSON.
+"""
+
+from six.moves import intern
+
+from networking_ipvs.common import constants as const
+
+
+class _Record(object):
+    __slots__ = ()
+    _INT_FIELDS = frozenset()
+    _INTERN_FIELDS = frozenset()
+
+    def __init__(self, data=None):
+        for field in self.__slots__:
+            setattr(self, field, None)
+        if data:
+            self.update(data)
+
+    def __setitem__(self, key, value):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        if value is not None:
+            if key in self._INT_FIELDS:
+                value = int(value)
+            elif key in self._INTERN_FIELDS:
+                value = intern(str(value))
+        setattr(self, key, value)
+
+    def __getitem__(self, key):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key):
+        return key in self.__slots__
+
+    def get(self, key, default=None):
+        if key not in self.__slots__:
+            return default
+        return getattr(self, key)
+
+    def update(self, data):
+        for key, value in data.items():
+            if key in self.__slots__:
+                self[key] = value
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __getstate__(self):
+        return tuple(getattr(self, field) for field in self.__slots__)
+
+    def __setstate__(self, state):
+        for field, value in zip(self.__slots__, state):
+            setattr(self, field, value)
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, ', '.join(
+            '%s=%r' % (field, getattr(self, field))
+            for field in self.__slots__))
+
+
+class RealServer(_Record):
+    __slots__ = (const.ID, const.SERVER_IP, const.SERVER_PORT, const.WEIGHT,
+                 const.TIMEOUT, const.MAX_RETRIES, const.DELAY,
+                 const.ADMIN_STATE_UP)
+    _INT_FIELDS = frozenset([const.SERVER_PORT, const.WEIGHT, const.TIMEOUT,
+                             const.MAX_RETRIES, const.DELAY])
+    _INTERN_FIELDS = frozenset([const.SERVER_IP])
+
+
+class VirtualServer(_Record):
+    """Virtual server record, real_servers is a dict of RealServer.
+
+    real_servers is keyed by server_ip:server_port, update doesn't touch
+    it, real servers are managed by caller.
+    """
+    __slots__ = (const.LISTEN_IP, const.LISTEN_PORT, const.SCHEDULER,
+                 const.FORWARD_METHOD, const.ADMIN_STATE_UP,
+                 const.REALSERVERS)
+    _INT_FIELDS = frozenset([const.LISTEN_PORT])
+    _INTERN_FIELDS = frozenset([const.LISTEN_IP, const.SCHEDULER,
+                                const.FORWARD_METHOD])
+
+    def __init__(self, data=None):
+        super(VirtualServer, self).__init__(data)
+        self.real_servers = {}
+
+    def update(self, data):
+        for key, value in data.items():
+            if key in self.__slots__ and key != const.REALSERVERS:
+                self[key] = value
+
+    def to_dict(self):
+        vs = super(VirtualServer, self).to_dict()
+        vs[const.REALSERVERS] = {rs_key: rs.to_dict()
+                                 for rs_key, rs in self.real_servers.items()}
+        return vs
+
+    @classmethod
+    def from_dict(cls, vs):
+        """Get record from a dict like parse_virtualserver_conf returns."""
+        record = cls(vs)
+        for rs_key, rs in vs.get(const.REALSERVERS, {}).items():
+            record.real_servers[rs_key] = RealServer(rs)
+        return record
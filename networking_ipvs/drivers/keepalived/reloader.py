@@ -0,0 +1,96 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import time
+
+import eventlet
+from eventlet import semaphore
+from oslo_log import log as logging
+
+from networking_ipvs._i18n import _LE
+
+LOG = logging.getLogger(__name__)
+
+
+class ReloadScheduler(object):
+    """Coalesce keepalived reload requests.
+
+    Each request marks config as dirty and (re)arms a timer of window
+    seconds, so a burst of changes ends up in one reload. A pending reload
+    is never deferred more than max_delay seconds after the first request
+    of the burst. With window set to 0, every request reloads immediately.
+    A scheduled reload which fails is retried after max_delay seconds.
+    """
+
+    def __init__(self, reload_func, window, max_delay):
+        self._reload_func = reload_func
+        self.window = max(window, 0)
+        self.max_delay = max(max_delay, self.window)
+        self._lock = semaphore.Semaphore()
+        self._timer = None
+        self._dirty_since = None
+        self.requested = 0
+        self.issued = 0
+        self.coalesced = 0
+        self.failed = 0
+
+    def schedule(self):
+        self.requested += 1
+        if not self.window:
+            self._reload()
+            return
+        now = time.time()
+        if self._dirty_since is None:
+            self._dirty_since = now
+        else:
+            self.coalesced += 1
+        delay = min(self.window, self._dirty_since + self.max_delay - now)
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = eventlet.spawn_after(max(delay, 0), self._fire)
+
+    def flush(self):
+        """Issue pending reload now, e.g. on resync or shutdown."""
+        if self._dirty_since is None:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._reload()
+
+    def _fire(self):
+        try:
+            self._reload()
+        except Exception:
+            self.failed += 1
+            LOG.exception(_LE("Scheduled keepalived reload failed, retry in "
+                              "%s seconds"), self.max_delay)
+            # a request during the failed reload has armed another one
+            if self._timer is None:
+                self._dirty_since = time.time()
+                self._timer = eventlet.spawn_after(self.max_delay,
+                                                   self._fire)
+
+    def _reload(self):
+        self._timer = None
+        self._dirty_since = None
+        with self._lock:
+            self.issued += 1
+            self._reload_func()
+
+    def get_stats(self):
+        return {'reload_requested': self.requested,
+                'reload_issued': self.issued,
+                'reload_coalesced': self.coalesced,
+                'reload_failed': self.failed,
+                'reload_pending': self._dirty_since is not None}
@@ -12,12 +12,34 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import hashlib
+import multiprocessing
+import select
+import struct
+import zlib
+
 import netaddr
+from oslo_serialization import jsonutils
 
 from networking_ipvs.common import constants as const
+from networking_ipvs.drivers.keepalived import records
+
+# files parsed by a worker are sent back to parent in batches of this size
+PARSE_BATCH_SIZE = 256
+# don't fork a worker for less files than this
+MIN_FILES_PER_WORKER = 64
 
+SNAPSHOT_MAGIC = b'IPVSSNAP'
+SNAPSHOT_VERSION = 3
+# magic, version, md5 digest of payload
+SNAPSHOT_HEADER = struct.Struct('!8sH16s')
 
-def parse_virtualserver_conf(file_path):
+
+def parse_virtualserver_conf(file_path, content=None):
+    """Parse a virtual server conf file, content is read if not given."""
+    if content is None:
+        with open(file_path) as f:
+            content = f.read()
     vs = {}
     state = 'expect_vs'
     vs_attrs = {'lb_algo': const.SCHEDULER,
@@ -28,63 +50,228 @@ def parse_virtualserver_conf(file_path):
                 'retry': const.MAX_RETRIES,
                 'delay_before_retry': const.DELAY}
     rs_key = ''
-    with open(file_path) as f:
-        for line in f:
-            line = line.strip()
-            if not line or line[:2] == '! ':
+    for line in content.splitlines():
+        line = line.strip()
+        if not line or line[:2] == '! ':
+            continue
+        fields = line.split()
+        if state == 'expect_vs':
+            if len(fields) == 4 and fields[0] == 'virtual_server' and (
+                netaddr.valid_ipv4(fields[1])) and (
+                    fields[2].isdigit()) and fields[3] == '{':
+                vs[const.LISTEN_IP] = fields[1]
+                vs[const.LISTEN_PORT] = int(fields[2])
+                state = 'in_vs'
+        elif state == 'in_vs':
+            if fields[0] in vs_attrs:
+                vs[vs_attrs[fields[0]]] = fields[1]
+                if fields[0] == 'lb_kind':
+                    state = 'expect_rs'
+        elif state == 'expect_rs':
+            if len(fields) == 4 and fields[0] == 'real_server' and (
+                netaddr.valid_ipv4(fields[1])) and (
+                    fields[2].isdigit()) and fields[3] == '{':
+                server_ip = fields[1]
+                server_port = fields[2]
+                up = True
+                state = 'in_rs'
+            elif len(fields) == 5 and fields[0] == '#' and (
+                fields[1] == 'real_server') and netaddr.valid_ipv4(
+                    fields[2]) and fields[3].isdigit() and (
+                        fields[4] == '{'):
+                server_ip = fields[2]
+                server_port = fields[3]
+                up = False
+                state = 'in_rs_down'
+            else:
                 continue
-            fields = line.split()
-            if state == 'expect_vs':
-                if len(fields) == 4 and fields[0] == 'virtual_server' and (
-                    netaddr.valid_ipv4(fields[1])) and (
-                        fields[2].isdigit()) and fields[3] == '{':
-                    vs[const.LISTEN_IP] = fields[1]
-                    vs[const.LISTEN_PORT] = int(fields[2])
-                    state = 'in_vs'
-            elif state == 'in_vs':
-                if fields[0] in vs_attrs:
-                    vs[vs_attrs[fields[0]]] = fields[1]
-                    if fields[0] == 'lb_kind':
-                        state = 'expect_rs'
-            elif state == 'expect_rs':
-                if len(fields) == 4 and fields[0] == 'real_server' and (
-                    netaddr.valid_ipv4(fields[1])) and (
-                        fields[2].isdigit()) and fields[3] == '{':
-                    server_ip = fields[1]
-                    server_port = fields[2]
-                    up = True
-                    state = 'in_rs'
-                elif len(fields) == 5 and fields[0] == '#' and (
-                    fields[1] == 'real_server') and netaddr.valid_ipv4(
-                        fields[2]) and fields[3].isdigit() and (
-                            fields[4] == '{'):
-                    server_ip = fields[2]
-                    server_port = fields[3]
-                    up = False
-                    state = 'in_rs_down'
-                else:
-                    continue
-                rs_key = '%s:%s' % (server_ip, server_port)
-                if const.REALSERVERS not in vs:
-                    vs[const.REALSERVERS] = {}
-                vs[const.REALSERVERS][rs_key] = {}
-                vs[const.REALSERVERS][rs_key][const.SERVER_IP] = server_ip
-                vs[const.REALSERVERS][rs_key][const.SERVER_PORT] = server_port
-                vs[const.REALSERVERS][rs_key][const.ADMIN_STATE_UP] = up
-            elif state == 'in_rs':
-                if fields[0] in rs_attrs:
-                    attr = rs_attrs[fields[0]]
-                    vs[const.REALSERVERS][rs_key][attr] = fields[1]
-                    if fields[0] == 'delay_before_retry':
-                        rs_key = ''
-                        state = 'expect_rs'
-            elif state == 'in_rs_down':
-                if fields[0] == '#' and fields[1] in rs_attrs:
-                    attr = rs_attrs[fields[1]]
-                    vs[const.REALSERVERS][rs_key][attr] = fields[2]
-                    if fields[1] == 'delay_before_retry':
-                        rs_key = ''
-                        state = 'expect_rs'
+            rs_key = '%s:%s' % (server_ip, server_port)
+            if const.REALSERVERS not in vs:
+                vs[const.REALSERVERS] = {}
+            vs[const.REALSERVERS][rs_key] = {}
+            vs[const.REALSERVERS][rs_key][const.SERVER_IP] = server_ip
+            vs[const.REALSERVERS][rs_key][const.SERVER_PORT] = server_port
+            vs[const.REALSERVERS][rs_key][const.ADMIN_STATE_UP] = up
+        elif state == 'in_rs':
+            if fields[0] in rs_attrs:
+                attr = rs_attrs[fields[0]]
+                vs[const.REALSERVERS][rs_key][attr] = fields[1]
+                if fields[0] == 'delay_before_retry':
+                    rs_key = ''
+                    state = 'expect_rs'
+        elif state == 'in_rs_down':
+            if fields[0] == '#' and fields[1] in rs_attrs:
+                attr = rs_attrs[fields[1]]
+                vs[const.REALSERVERS][rs_key][attr] = fields[2]
+                if fields[1] == 'delay_before_retry':
+                    rs_key = ''
+                    state = 'expect_rs'
     if vs:
         vs[const.ADMIN_STATE_UP] = file_path.endswith(const.DOWN) ^ True
     return vs
+
+
+def get_vs_key(file_name):
+    """Get (listen_ip, listen_port) from a virtual server conf file name.
+
+    None will be returned for names not like listen_ip_listen_port[.down].
+    """
+    if file_name.endswith(const.DOWN):
+        file_name = file_name[:-len(const.DOWN)]
+    listen_ip, _sep, listen_port = file_name.rpartition('_')
+    if not netaddr.valid_ipv4(listen_ip) or not listen_port.isdigit():
+        return None
+    return listen_ip, int(listen_port)
+
+
+def _parse_file(file_path):
+    with open(file_path) as f:
+        content = f.read()
+    vs = parse_virtualserver_conf(file_path, content)
+    if vs:
+        vs = records.VirtualServer.from_dict(vs)
+    return file_path, vs, hashlib.md5(content).hexdigest()
+
+
+def _parse_worker(conn, file_paths):
+    batch = []
+    for file_path in file_paths:
+        batch.append(_parse_file(file_path))
+        if len(batch) >= PARSE_BATCH_SIZE:
+            conn.send(batch)
+            batch = []
+    if batch:
+        conn.send(batch)
+    # an exception above exits worker without this, parent will know
+    conn.send(None)
+    conn.close()
+
+
+def parse_virtualserver_confs(file_paths, workers=0):
+    """Parse virtual server conf files, yield (file_path, vs, md5) for them.
+
+    vs is a records.VirtualServer, or None if file has no virtual server.
+
+    Files are split between worker processes, each parses its share and
+    streams results back by a pipe, so caller can consume results while
+    parsing is still going on. workers 0 means CPU count, and files are
+    parsed in current process if one worker is enough. Results are not
+    yielded in order of file_paths.
+    """
+    workers = workers or multiprocessing.cpu_count()
+    workers = min(workers, len(file_paths) // MIN_FILES_PER_WORKER)
+    if workers <= 1:
+        for file_path in file_paths:
+            yield _parse_file(file_path)
+        return
+
+    procs, conns = [], []
+    for i in range(workers):
+        reader, writer = multiprocessing.Pipe(duplex=False)
+        proc = multiprocessing.Process(
+            target=_parse_worker, args=(writer, file_paths[i::workers]))
+        proc.daemon = True
+        proc.start()
+        writer.close()
+        procs.append(proc)
+        conns.append(reader)
+    try:
+        while conns:
+            readable = select.select(conns, [], [])[0]
+            for conn in readable:
+                try:
+                    batch = conn.recv()
+                except EOFError:
+                    raise RuntimeError(
+                        'virtual server conf parsing worker exited '
+                        'unexpectedly')
+                if batch is None:
+                    conns.remove(conn)
+                    conn.close()
+                    continue
+                for result in batch:
+                    yield result
+    finally:
+        for conn in conns:
+            conn.close()
+        for proc in procs:
+            if proc.is_alive():
+                proc.terminate()
+            proc.join()
+
+
+def dump_snapshot(files, virtualservers):
+    """Dump conf files meta and VirtualServer records.
+
+    files is {file name: (mtime, size, md5)}.
+    """
+    payload = zlib.compress(jsonutils.dumps({
+        'files': files,
+        'virtualservers': [vs.to_dict() for vs in virtualservers]}))
+    return SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                hashlib.md5(payload).digest()) + payload
+
+
+def load_snapshot(content):
+    """Load (files, {(listen_ip, listen_port): vs}) dumped by dump_snapshot.
+
+    ValueError will be raised for corrupted or unknown version content.
+    """
+    if len(content) < SNAPSHOT_HEADER.size:
+        raise ValueError('snapshot is truncated')
+    magic, version, digest = SNAPSHOT_HEADER.unpack_from(content)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError('snapshot has bad magic')
+    if version != SNAPSHOT_VERSION:
+        raise ValueError('snapshot version %s is unsupported' % version)
+    payload = content[SNAPSHOT_HEADER.size:]
+    if hashlib.md5(payload).digest() != digest:
+        raise ValueError('snapshot checksum mismatch')
+    try:
+        data = jsonutils.loads(zlib.decompress(payload))
+        files = {f: tuple(meta) for f, meta in data['files'].items()}
+        virtualservers = {}
+        for vs in data['virtualservers']:
+            vs = records.VirtualServer.from_dict(vs)
+            virtualservers[(vs[const.LISTEN_IP], vs[const.LISTEN_PORT])] = vs
+    except Exception as e:
+        raise ValueError('snapshot cannot be loaded: %s' % e)
+    return files, virtualservers
+
+
+def dump_journal_entry(key, files, vs):
+    """Dump a line recording changes of a virtual server since snapshot.
+
+    files is {file name: (mtime, size, md5) or None for removed file}, vs
+    is VirtualServer record or None for removed virtual server.
+    """
+    return jsonutils.dumps({'key': key, 'files': files,
+                            'vs': vs.to_dict() if vs else None}) + '\n'
+
+
+def load_journal(content, files, virtualservers):
+    """Apply journal lines onto what load_snapshot returns.
+
+    Return count of lines applied. A line which can't be loaded, e.g. one
+    partially written when agent stopped, ends the journal.
+    """
+    count = 0
+    for line in content.splitlines():
+        try:
+            entry = jsonutils.loads(line)
+            key = tuple(entry['key'])
+            vs = entry['vs'] and records.VirtualServer.from_dict(
+                entry['vs'])
+        except Exception:
+            break
+        for f, meta in entry['files'].items():
+            if meta:
+                files[f] = tuple(meta)
+            else:
+                files.pop(f, None)
+        if vs:
+            virtualservers[key] = vs
+        else:
+            virtualservers.pop(key, None)
+        count += 1
+    return count
@@ -0,0 +1,205 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import errno
+import socket
+import struct
+
+from networking_ipvs.common import constants as const
+from networking_ipvs.drivers.common import ipvs_table
+from networking_ipvs.drivers.common import netlink
+
+GENL_HDR = struct.Struct('=BBH')
+GENL_ID_CTRL = 0x10
+CTRL_CMD_GETFAMILY = 3
+CTRL_ATTR_FAMILY_ID = 1
+CTRL_ATTR_FAMILY_NAME = 2
+
+IPVS_GENL_NAME = 'IPVS'
+IPVS_GENL_VERSION = 1
+
+IPVS_CMD_NEW_SERVICE = 1
+IPVS_CMD_SET_SERVICE = 2
+IPVS_CMD_DEL_SERVICE = 3
+IPVS_CMD_GET_SERVICE = 4
+IPVS_CMD_NEW_DEST = 5
+IPVS_CMD_SET_DEST = 6
+IPVS_CMD_DEL_DEST = 7
+IPVS_CMD_GET_DEST = 8
+
+IPVS_CMD_ATTR_SERVICE = 1
+IPVS_CMD_ATTR_DEST = 2
+
+IPVS_SVC_ATTR_AF = 1
+IPVS_SVC_ATTR_PROTOCOL = 2
+IPVS_SVC_ATTR_ADDR = 3
+IPVS_SVC_ATTR_PORT = 4
+IPVS_SVC_ATTR_FWMARK = 5
+IPVS_SVC_ATTR_SCHED_NAME = 6
+IPVS_SVC_ATTR_FLAGS = 7
+IPVS_SVC_ATTR_TIMEOUT = 8
+IPVS_SVC_ATTR_NETMASK = 9
+
+IPVS_DEST_ATTR_ADDR = 1
+IPVS_DEST_ATTR_PORT = 2
+IPVS_DEST_ATTR_FWD_METHOD = 3
+IPVS_DEST_ATTR_WEIGHT = 4
+IPVS_DEST_ATTR_U_THRESH = 5
+IPVS_DEST_ATTR_L_THRESH = 6
+
+IP_VS_CONN_F_FWD_MASK = 0x0007
+# IP_VS_CONN_F_FULLNAT comes from Alibaba fullnat kernel patch
+FORWARD_METHODS = {const.NAT: 0x0000,
+                   const.TUN: 0x0002,
+                   const.DR: 0x0003,
+                   const.FULLNAT: 0x0005}
+FORWARD_METHOD_NAMES = {v: k for k, v in FORWARD_METHODS.items()}
+
+OP_COMMANDS = {ipvs_table.ADD_SERVICE: IPVS_CMD_NEW_SERVICE,
+               ipvs_table.EDIT_SERVICE: IPVS_CMD_SET_SERVICE,
+               ipvs_table.DEL_SERVICE: IPVS_CMD_DEL_SERVICE,
+               ipvs_table.ADD_DEST: IPVS_CMD_NEW_DEST,
+               ipvs_table.EDIT_DEST: IPVS_CMD_SET_DEST,
+               ipvs_table.DEL_DEST: IPVS_CMD_DEL_DEST}
+# errors mean an operation found kernel already in the state it wants
+HARMLESS_ERRORS = {ipvs_table.ADD_SERVICE: (errno.EEXIST,),
+                   ipvs_table.ADD_DEST: (errno.EEXIST,),
+                   ipvs_table.DEL_SERVICE: (errno.ESRCH, errno.ENOENT),
+                   ipvs_table.DEL_DEST: (errno.ESRCH, errno.ENOENT)}
+
+
+def pack_addr(attr_type, ip):
+    # kernel expects union nf_inet_addr
+    return netlink.pack_attr(attr_type, socket.inet_aton(ip) + b'\0' * 12)
+
+
+def unpack_addr(data):
+    return socket.inet_ntoa(data[:4])
+
+
+def pack_service(key, scheduler=None):
+    ip, port = key
+    attrs = [netlink.pack_u16(IPVS_SVC_ATTR_AF, socket.AF_INET),
+             netlink.pack_u16(IPVS_SVC_ATTR_PROTOCOL, socket.IPPROTO_TCP),
+             pack_addr(IPVS_SVC_ATTR_ADDR, ip),
+             netlink.pack_be16(IPVS_SVC_ATTR_PORT, port)]
+    if scheduler:
+        attrs.extend([
+            netlink.pack_string(IPVS_SVC_ATTR_SCHED_NAME, scheduler),
+            netlink.pack_attr(IPVS_SVC_ATTR_FLAGS,
+                              struct.pack('=II', 0, 0xffffffff)),
+            netlink.pack_u32(IPVS_SVC_ATTR_TIMEOUT, 0),
+            netlink.pack_u32(IPVS_SVC_ATTR_NETMASK, 0xffffffff)])
+    return netlink.pack_nested(IPVS_CMD_ATTR_SERVICE, attrs)
+
+
+def pack_dest(key, forward_method=None, weight=None):
+    ip, port = key
+    attrs = [pack_addr(IPVS_DEST_ATTR_ADDR, ip),
+             netlink.pack_be16(IPVS_DEST_ATTR_PORT, port)]
+    if forward_method:
+        attrs.extend([
+            netlink.pack_u32(IPVS_DEST_ATTR_FWD_METHOD,
+                             FORWARD_METHODS[forward_method]),
+            netlink.pack_u32(IPVS_DEST_ATTR_WEIGHT, weight),
+            netlink.pack_u32(IPVS_DEST_ATTR_U_THRESH, 0),
+            netlink.pack_u32(IPVS_DEST_ATTR_L_THRESH, 0)])
+    return netlink.pack_nested(IPVS_CMD_ATTR_DEST, attrs)
+
+
+def pack_genl(cmd, attrs=b''):
+    return GENL_HDR.pack(cmd, IPVS_GENL_VERSION, 0) + attrs
+
+
+def parse_genl(payload):
+    cmd, _version, _reserved = GENL_HDR.unpack_from(payload)
+    return cmd, netlink.parse_attrs(payload[GENL_HDR.size:])
+
+
+def get_op_request(op):
+    """Get (command, attrs payload) for an ipvs_table operation."""
+    name, key = op[0], op[1]
+    if name in ipvs_table.SERVICE_OPS:
+        attrs = pack_service(key, *op[2:])
+    else:
+        attrs = pack_service(key) + pack_dest(*op[2:])
+    return OP_COMMANDS[name], attrs
+
+
+class IPVSNetlink(object):
+    """IPVS client talking to kernel by generic netlink directly."""
+
+    def __init__(self, sock=None):
+        self._nl = netlink.NetlinkSocket(netlink.NETLINK_GENERIC, sock)
+        self._family = self._get_family_id()
+
+    def _get_family_id(self):
+        replies = self._nl.request(
+            GENL_ID_CTRL,
+            GENL_HDR.pack(CTRL_CMD_GETFAMILY, 1, 0) + netlink.pack_string(
+                CTRL_ATTR_FAMILY_NAME, IPVS_GENL_NAME))
+        _cmd, attrs = parse_genl(replies[0])
+        return netlink.unpack_u16(attrs[CTRL_ATTR_FAMILY_ID])
+
+    def apply(self, ops):
+        """Apply ipvs_table operations in batch.
+
+        Return a list of errno for ops, errors which mean kernel is already
+        in the wanted state are reported as 0.
+        """
+        requests = []
+        for op in ops:
+            cmd, attrs = get_op_request(op)
+            requests.append((self._family, pack_genl(cmd, attrs), 0))
+        errors = self._nl.batch(requests)
+        return [0 if err in HARMLESS_ERRORS.get(op[0], ()) else err
+                for op, err in zip(ops, errors)]
+
+    def _dump(self, cmd, attrs=b''):
+        return [parse_genl(reply)[1] for reply in self._nl.request(
+            self._family, pack_genl(cmd, attrs), netlink.NLM_F_DUMP)]
+
+    def get_services(self):
+        """Dump TCP IPv4 services with their destinations from kernel."""
+        services = {}
+        for attrs in self._dump(IPVS_CMD_GET_SERVICE):
+            svc = netlink.parse_attrs(attrs[IPVS_CMD_ATTR_SERVICE])
+            if IPVS_SVC_ATTR_FWMARK in svc and netlink.unpack_u32(
+                    svc[IPVS_SVC_ATTR_FWMARK]):
+                continue
+            if netlink.unpack_u16(svc[IPVS_SVC_ATTR_AF]) != socket.AF_INET:
+                continue
+            if netlink.unpack_u16(
+                    svc[IPVS_SVC_ATTR_PROTOCOL]) != socket.IPPROTO_TCP:
+                continue
+            key = (unpack_addr(svc[IPVS_SVC_ATTR_ADDR]),
+                   netlink.unpack_be16(svc[IPVS_SVC_ATTR_PORT]))
+            services[key] = {
+                const.SCHEDULER: netlink.unpack_string(
+                    svc[IPVS_SVC_ATTR_SCHED_NAME]),
+                ipvs_table.DESTS: self._get_dests(key)}
+        return services
+
+    def _get_dests(self, service_key):
+        dests = {}
+        for attrs in self._dump(IPVS_CMD_GET_DEST,
+                                pack_service(service_key)):
+            dest = netlink.parse_attrs(attrs[IPVS_CMD_ATTR_DEST])
+            fwd = netlink.unpack_u32(
+                dest[IPVS_DEST_ATTR_FWD_METHOD]) & IP_VS_CONN_F_FWD_MASK
+            dests[(unpack_addr(dest[IPVS_DEST_ATTR_ADDR]),
+                   netlink.unpack_be16(dest[IPVS_DEST_ATTR_PORT]))] = (
+                FORWARD_METHOD_NAMES.get(fwd, fwd),
+                netlink.unpack_u32(dest[IPVS_DEST_ATTR_WEIGHT]))
+        return dests
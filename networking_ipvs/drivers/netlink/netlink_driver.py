@@ -0,0 +1,139 @@
+# Copyright 2018
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""IPVS driver programming kernel IPVS table directly.
+
+Virtual server conf files are still maintained by ConfigManager, they work
+as local persistent state and MD5 source for revision checking, but
+keepalived main conf is never written and keepalived is never reloaded.
+Each RPC is turned into per service/destination add, edit and delete
+operations on the virtual servers it changed. Kernel services whose
+addresses aren't vips of cached virtual servers are never touched, they
+are not managed by agent. No health checking is done by this driver, and
+agent needs CAP_NET_ADMIN to talk to IPVS.
+"""
+
+import os
+
+from eventlet import semaphore
+from oslo_log import log as logging
+
+from networking_ipvs._i18n import _LE
+from networking_ipvs.drivers.common import ipvs_table
+from networking_ipvs.drivers.keepalived import keepalived_driver
+from networking_ipvs.drivers.netlink import ipvs_netlink
+
+LOG = logging.getLogger(__name__)
+
+
+class ConfigManager(keepalived_driver.ConfigManager):
+    """ConfigManager remembers virtual servers changed since last pop."""
+
+    def __init__(self, conf):
+        self._changed_vs = set()
+        super(ConfigManager, self).__init__(conf)
+
+    def _mark_changed(self, vs_info):
+        self._changed_vs.add(ipvs_table.get_service_key(vs_info))
+
+    def pop_changed_vs(self):
+        changed, self._changed_vs = self._changed_vs, set()
+        return changed
+
+    def update(self, vs_info, realservers=None, replace=False):
+        self._mark_changed(vs_info)
+        super(ConfigManager, self).update(vs_info, realservers, replace)
+
+    def delete_rs(self, vs_info, realservers):
+        self._mark_changed(vs_info)
+        super(ConfigManager, self).delete_rs(vs_info, realservers)
+
+    def delete_vs(self, vs_info):
+        self._mark_changed(vs_info)
+        super(ConfigManager, self).delete_vs(vs_info)
+
+
+class IPVSDriver(keepalived_driver.IPVSDriver):
+
+    def __init__(self, conf, rpc_plugin):
+        self._ipvs = self._get_ipvs_client()
+        self._services = self._ipvs.get_services()
+        # the first commit should converge whatever in kernel to cached
+        # virtual servers, not only the changed ones
+        self._full_sync = True
+        # keys of a failed commit, retried by next commit
+        self._retry_keys = set()
+        self._stats = {'ipvs_ops_applied': 0, 'ipvs_ops_failed': 0,
+                       'ipvs_batches': 0}
+        self._commit_lock = semaphore.Semaphore()
+        super(IPVSDriver, self).__init__(conf, rpc_plugin)
+
+    def _get_ipvs_client(self):
+        return ipvs_netlink.IPVSNetlink()
+
+    def _get_config_manager(self):
+        return ConfigManager(self.conf)
+
+    def get_stats(self):
+        stats = super(IPVSDriver, self).get_stats()
+        stats.update(self._stats)
+        return stats
+
+    def _commit(self):
+        # notifications may be handled concurrently, but IPVS client and
+        # the known kernel table can only be used by one at a time
+        with self._commit_lock:
+            keys = self._config.pop_changed_vs() | self._retry_keys
+            self._retry_keys = set()
+            if self._full_sync:
+                # services on addresses which aren't vips of cached virtual
+                # servers belong to others, they are left as they are
+                vips = set(self._config.get_vips())
+                keys |= set(key for key in self._services if key[0] in vips)
+                keys |= set((ip, int(port))
+                            for ip, port in self._config.get_vs_keys())
+                self._full_sync = False
+            self._apply(keys)
+
+    def _apply(self, keys):
+        current, desired = {}, {}
+        for key in keys:
+            if key in self._services:
+                current[key] = self._services[key]
+            service = ipvs_table.get_service(self._config.get_vs(*key))
+            if service:
+                desired[key] = service
+        ops = ipvs_table.diff_services(current, desired)
+        if not ops:
+            return
+        errors = self._ipvs.apply(ops)
+        self._stats['ipvs_batches'] += 1
+        failed = [(op, err) for op, err in zip(ops, errors) if err]
+        self._stats['ipvs_ops_applied'] += len(ops) - len(failed)
+        self._stats['ipvs_ops_failed'] += len(failed)
+        for op, err in failed:
+            LOG.error(_LE("Failed to apply IPVS operation %(op)s, get error "
+                          "%(err)s"), {'op': op, 'err': os.strerror(err)})
+        if failed:
+            # kernel table is not what we think it is, reload it and let
+            # next commit converge everything
+            self._services = self._ipvs.get_services()
+            self._full_sync = True
+            self._retry_keys = keys
+            return
+        for key in keys:
+            if key in desired:
+                self._services[key] = desired[key]
+            else:
+                self._services.pop(key, None)
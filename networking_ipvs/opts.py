@@ -23,11 +23,13 @@ def list_agent_opts():
         ('DEFAULT', ipvs_conf.AGENT_OPTS),
         ('ipvs', ipvs_conf.DRIVER_OPTS),
         ('revision', ipvs_conf.REVISION_OPTS),
+        ('keepalived', ipvs_conf.KEEPALIVED_DRIVER_OPTS),
     ]
 
 
 def list_opts():
     return [
+        ('networking_ipvs', ipvs_conf.PLUGIN_OPTS),
         ('service_auth',
          networking_ipvs.common.keystone.OPTS),
         ('service_providers',
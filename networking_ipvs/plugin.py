@@ -12,13 +12,19 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+
 import six
 
+from neutron import context as ncontext
 from neutron.db import agents_db
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_service import loopingcall
+from oslo_utils import timeutils
 
 from networking_ipvs._i18n import _LI, _LE
+from networking_ipvs.common import config as ipvs_conf
 from networking_ipvs.common import constants as const
 from networking_ipvs.common import exceptions as ipvs_exc
 from networking_ipvs.common import rpc
@@ -28,6 +34,8 @@ from networking_ipvs.extensions import networkingipvs as ipvs_ext
 
 LOG = logging.getLogger(__name__)
 
+cfg.CONF.register_opts(ipvs_conf.PLUGIN_OPTS, 'networking_ipvs')
+
 
 class NetworkingIPVSPlugin(ipvs_db.NetworkingIPVSPluginDb,
                            agents_db.AgentDbMixin,
@@ -45,6 +53,77 @@ class NetworkingIPVSPlugin(ipvs_db.NetworkingIPVSPluginDb,
         self.conn = rpc.start_rpc_listener(const.NETWORKING_IPVS_PLUGIN,
                                            self._rpc_extensions)
         self._notifier = rpc.PluginNotifier()
+        self._start_revision_compaction()
+        self._start_revision_snapshot()
+
+    def _start_revision_compaction(self):
+        interval = cfg.CONF.networking_ipvs.revision_compact_interval
+        if interval:
+            self._compaction = loopingcall.FixedIntervalLoopingCall(
+                self._compact_revisions)
+            self._compaction.start(interval=interval, initial_delay=interval)
+
+    def _start_revision_snapshot(self):
+        interval = cfg.CONF.networking_ipvs.revision_snapshot_interval
+        if interval:
+            self._snapshot = loopingcall.FixedIntervalLoopingCall(
+                self._build_revision_snapshot)
+            self._snapshot.start(interval=interval, initial_delay=interval)
+
+    def _build_revision_snapshot(self):
+        context = ncontext.get_admin_context()
+        try:
+            seq = self.build_revision_snapshot(context)
+            if seq is not None:
+                LOG.info(_LI("Built revision snapshot at revision %s"), seq)
+        except Exception:
+            LOG.exception(_LE("Failed to build revision snapshot"))
+
+    def _get_revision_watermark(self, context):
+        """Get watermark of deleted revisions and logs which can be removed.
+
+        It's (time, seq), deleted revisions changed before time and not
+        after seq can be removed. time is revision_tombstone_retention
+        ago, and seq is the oldest revision live agents and the latest
+        revision snapshot hold, None for neither holds revision. None means
+        no revision can be removed now.
+        """
+        retention = cfg.CONF.networking_ipvs.revision_tombstone_retention
+        watermark = timeutils.utcnow() - datetime.timedelta(seconds=retention)
+        # agents loading snapshot need revision logs after it
+        seq = self._get_snapshot_seq(context)
+        for agent in self.get_agents(context, filters={
+                'agent_type': [const.NETWORKING_IPVS_AGENT_TYPE]}):
+            if not agent['alive']:
+                continue
+            configurations = agent['configurations']
+            if 'revision' not in configurations:
+                # agent doesn't report its revision, it may need any
+                # deleted revision
+                return None
+            revision = configurations['revision']
+            if revision is not None:
+                seq = revision if seq is None else min(seq, revision)
+        return watermark, seq
+
+    def _compact_revisions(self):
+        context = ncontext.get_admin_context()
+        try:
+            watermark = self._get_revision_watermark(context)
+            if not watermark:
+                return
+            removed = self.compact_revisions(context, *watermark)
+            if removed:
+                LOG.info(_LI("Removed %(removed)s deleted revisions older "
+                             "than %(watermark)s"),
+                         {'removed': removed, 'watermark': watermark})
+            removed = self.compact_revision_logs(context, *watermark)
+            if removed:
+                LOG.info(_LI("Removed %(removed)s revision logs older "
+                             "than %(watermark)s"),
+                         {'removed': removed, 'watermark': watermark})
+        except Exception:
+            LOG.exception(_LE("Failed to compact revisions"))
 
     def _admin_state_check(self, update_req):
         req_type, body = update_req.items()[0]
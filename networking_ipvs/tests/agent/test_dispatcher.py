@@ -0,0 +1,138 @@
+#!/usr/bin/python2.7
+
+import os
+
+import eventlet
+
+from networking_ipvs.agent import dispatcher
+
+STEP = 0.01
+
+
+class FakeJobs(object):
+    def __init__(self):
+        self.events = []
+        self.running = set()
+        self.max_running = 0
+
+    def __call__(self, name, seconds=0, fail=False):
+        self.events.append(('start', name))
+        self.running.add(name)
+        self.max_running = max(self.max_running, len(self.running))
+        try:
+            eventlet.sleep(seconds)
+            if fail:
+                raise RuntimeError('job failed')
+        finally:
+            self.running.discard(name)
+            self.events.append(('end', name))
+
+    def index(self, event, name):
+        return self.events.index((event, name))
+
+
+def check(task_msg, expected, observed):
+    if expected != observed:
+        print(task_msg + "....failed")
+        print('observed: %s\nexpected: %s' % (observed, expected))
+        os.sys.exit(1)
+    print(task_msg + "....passed")
+
+
+def wait_done(vip_dispatcher):
+    while vip_dispatcher.get_stats()['jobs_queued']:
+        eventlet.sleep(STEP)
+
+
+def test_order_on_vip():
+    jobs = FakeJobs()
+    vip_dispatcher = dispatcher.VIPDispatcher(4)
+    # the first job runs the longest, later ones still wait for it
+    for i, seconds in enumerate((STEP * 3, STEP * 2, STEP)):
+        vip_dispatcher.dispatch(['10.0.0.1'], jobs, 'job%d' % i, seconds)
+    wait_done(vip_dispatcher)
+    check("test dispatcher order on vip(order)",
+          [('start', 'job0'), ('end', 'job0'), ('start', 'job1'),
+           ('end', 'job1'), ('start', 'job2'), ('end', 'job2')],
+          jobs.events)
+    stats = vip_dispatcher.get_stats()
+    check("test dispatcher order on vip(stats)", (3, 0, 0, 0),
+          (stats['jobs_dispatched'], stats['jobs_queued'],
+           stats['vip_queues'], stats['workers_running']))
+
+
+def test_concurrent_vips():
+    jobs = FakeJobs()
+    vip_dispatcher = dispatcher.VIPDispatcher(2)
+    for i in range(4):
+        vip_dispatcher.dispatch(['10.0.0.%d' % i], jobs, 'job%d' % i,
+                                STEP * 2)
+    check("test dispatcher concurrent vips(queued)", (4, 4),
+          (vip_dispatcher.get_stats()['jobs_queued'],
+           vip_dispatcher.get_stats()['vip_queues']))
+    wait_done(vip_dispatcher)
+    check("test dispatcher concurrent vips(bounded by workers)", 2,
+          jobs.max_running)
+    check("test dispatcher concurrent vips(all run)", 8, len(jobs.events))
+
+
+def test_multi_vip_job():
+    jobs = FakeJobs()
+    vip_dispatcher = dispatcher.VIPDispatcher(4)
+    vip_dispatcher.dispatch(['10.0.0.1'], jobs, 'a', STEP)
+    vip_dispatcher.dispatch(['10.0.0.2'], jobs, 'b', STEP * 3)
+    # runs when it's at head of queues of both vips
+    vip_dispatcher.dispatch(['10.0.0.1', '10.0.0.2'], jobs, 'ab', STEP)
+    # queued behind ab on its vip, though a is done early
+    vip_dispatcher.dispatch(['10.0.0.1'], jobs, 'a2')
+    vip_dispatcher.dispatch(['10.0.0.3'], jobs, 'c', STEP)
+    check("test dispatcher multi vip job(queue depth)", 3,
+          vip_dispatcher.get_stats()['vip_queue_depth_max'])
+    wait_done(vip_dispatcher)
+    check("test dispatcher multi vip job(after a)", True,
+          jobs.index('end', 'a') < jobs.index('start', 'ab'))
+    check("test dispatcher multi vip job(after b)", True,
+          jobs.index('end', 'b') < jobs.index('start', 'ab'))
+    check("test dispatcher multi vip job(before a2)", True,
+          jobs.index('end', 'ab') < jobs.index('start', 'a2'))
+    check("test dispatcher multi vip job(other vip)", True,
+          jobs.index('start', 'c') < jobs.index('end', 'a'))
+
+
+def test_failed_job():
+    jobs = FakeJobs()
+    vip_dispatcher = dispatcher.VIPDispatcher(4)
+    vip_dispatcher.dispatch(['10.0.0.1'], jobs, 'job0', fail=True)
+    vip_dispatcher.dispatch(['10.0.0.1'], jobs, 'job1')
+    wait_done(vip_dispatcher)
+    check("test dispatcher failed job(next runs)", True,
+          ('end', 'job1') in jobs.events)
+    check("test dispatcher failed job(stats)", 1,
+          vip_dispatcher.get_stats()['jobs_failed'])
+
+
+def test_no_workers():
+    jobs = FakeJobs()
+    vip_dispatcher = dispatcher.VIPDispatcher(0)
+    vip_dispatcher.dispatch(['10.0.0.1'], jobs, 'job0', STEP)
+    # run in caller, done when dispatch returns
+    check("test dispatcher no workers(run in caller)",
+          [('start', 'job0'), ('end', 'job0')], jobs.events)
+    try:
+        vip_dispatcher.dispatch(['10.0.0.1'], jobs, 'job1', fail=True)
+    except RuntimeError:
+        raised = True
+    else:
+        raised = False
+    check("test dispatcher no workers(error raised to caller)", True,
+          raised)
+    stats = vip_dispatcher.get_stats()
+    check("test dispatcher no workers(stats)", (0, 0, 0),
+          (stats['jobs_dispatched'], stats['jobs_queued'],
+           stats['workers_running']))
+
+
+if __name__ == '__main__':
+    for func in sorted(dir()):
+        if func.startswith('test_'):
+            globals()[func]()
@@ -0,0 +1,55 @@
+#!/usr/bin/python2.7
+
+import time
+
+import netaddr
+
+from networking_ipvs.drivers.common import nic_driver
+
+VIP_COUNT = 10000
+
+
+def get_mapping():
+    # 64 /24 cidrs on 4 nics, plus their /16 and a default nic
+    mapping = {'*': 'eth0', '10.0.0.0/16': 'eth1'}
+    for i in range(64):
+        mapping['10.0.%d.0/24' % i] = 'eth%d' % (2 + i % 4)
+    return mapping
+
+
+def lookup_by_loop(mapping, vip_address):
+    # what NICDriver did before the prefix trie
+    for cidr in mapping:
+        if cidr in ('*', 'default'):
+            continue
+        if netaddr.IPAddress(vip_address) in netaddr.IPNetwork(cidr):
+            return mapping[cidr]
+    return mapping['*']
+
+
+def main():
+    mapping = get_mapping()
+    trie = nic_driver.PrefixTrie(mapping['*'])
+    for cidr, nic in mapping.items():
+        if cidr != '*':
+            trie.insert(cidr, nic)
+    vips = ['10.0.%d.%d' % (i // 128, i % 128 + 1) for i in range(VIP_COUNT)]
+
+    start = time.time()
+    looped = [lookup_by_loop(mapping, vip) for vip in vips]
+    loop_time = time.time() - start
+    start = time.time()
+    matched = [trie.lookup(vip) for vip in vips]
+    trie_time = time.time() - start
+
+    # loop picks whichever matching cidr comes first, trie picks the most
+    # specific one
+    mismatched = sum(1 for a, b in zip(looped, matched) if a != b)
+    print 'looking up nics for %d vips in %d cidrs' % (VIP_COUNT, len(mapping))
+    print 'loop: %8.3f seconds' % loop_time
+    print 'trie: %8.3f seconds' % trie_time
+    print '%d vips got a more specific nic by trie' % mismatched
+
+
+if __name__ == '__main__':
+    main()
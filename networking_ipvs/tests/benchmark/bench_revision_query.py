@@ -0,0 +1,117 @@
+#!/usr/bin/python2.7
+
+import datetime
+import random
+import time
+
+import sqlalchemy as sa
+from sqlalchemy.sql import expression as expr
+
+from networking_ipvs.common import constants as const
+
+ROW_COUNT = 1000000
+BATCH_SIZE = 10000
+DAYS = 30
+
+metadata = sa.MetaData()
+revisions = sa.Table(
+    'ipvs_revisions', metadata,
+    sa.Column('id', sa.String(36), primary_key=True),
+    sa.Column('resource_type', sa.String(36), nullable=False),
+    sa.Column('parent_id', sa.String(36)),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('deleted_at', sa.DateTime(), nullable=True),
+    sa.Column('last_changed_at', sa.DateTime(), nullable=True),
+    sa.Column('seq', sa.BigInteger(), nullable=True),
+    sa.Column('extra', sa.String(128)),
+    sa.Column('digest', sa.String(64)),
+    sa.Index('ix_ipvs_revisions_last_changed_at_id',
+             'last_changed_at', 'id'),
+    sa.Index('ix_ipvs_revisions_seq_id', 'seq', 'id'),
+    sa.Index('ix_ipvs_revisions_parent_id', 'parent_id'))
+TYPES = [const.IPVS_VIRTUALSERVER, const.IPVS_REALSERVER]
+
+
+def old_filters(start):
+    # what get_revisions did before last_changed_at
+    return sa.and_(
+        revisions.c.resource_type.in_(TYPES),
+        sa.or_(sa.and_(revisions.c.created_at >= start,
+                       revisions.c.deleted_at == expr.null()),
+               sa.and_(revisions.c.created_at <= start,
+                       sa.or_(revisions.c.updated_at >= start,
+                              revisions.c.deleted_at >= start))))
+
+
+def new_filters(start):
+    # what RevisionDbMixin._get_revisions_filters does with start
+    return sa.and_(
+        revisions.c.resource_type.in_(TYPES),
+        revisions.c.last_changed_at >= start,
+        sa.or_(revisions.c.deleted_at == expr.null(),
+               revisions.c.created_at <= start))
+
+
+def random_between(start, end):
+    return start + datetime.timedelta(
+        seconds=random.randint(0, int((end - start).total_seconds())))
+
+
+def get_rows(now):
+    # 30 days of changes, 30% updated, 20% deleted afterwards
+    types = [const.IPVS_VIRTUALSERVER] + [const.IPVS_REALSERVER] * 4
+    for i in xrange(ROW_COUNT):
+        created = random_between(now - datetime.timedelta(days=DAYS), now)
+        updated = deleted = None
+        last = created
+        if random.random() < 0.3:
+            updated = last = random_between(created, now)
+        if random.random() < 0.2:
+            deleted = last = random_between(last, now)
+        yield {'id': '%036d' % i, 'resource_type': random.choice(types),
+               'parent_id': '%036d' % (i // 5), 'created_at': created,
+               'updated_at': updated, 'deleted_at': deleted,
+               'last_changed_at': last, 'seq': i + 1, 'extra': ''}
+
+
+def init_db(engine, now):
+    metadata.create_all(engine)
+    rows = []
+    for row in get_rows(now):
+        rows.append(row)
+        if len(rows) == BATCH_SIZE:
+            engine.execute(revisions.insert(), rows)
+            rows = []
+    if rows:
+        engine.execute(revisions.insert(), rows)
+    engine.execute('ANALYZE')
+
+
+def run(engine, filters):
+    query = sa.select([revisions]).where(filters)
+    start = time.time()
+    count = len(engine.execute(query).fetchall())
+    elapsed = time.time() - start
+    plan = engine.execute('EXPLAIN QUERY PLAN ' + str(query.compile(
+        engine, compile_kwargs={'literal_binds': True}))).fetchall()
+    return count, elapsed, ' | '.join(row['detail'] for row in plan)
+
+
+def main():
+    engine = sa.create_engine('sqlite://')
+    now = datetime.datetime.utcnow().replace(microsecond=0)
+    print 'inserting %d revisions...' % ROW_COUNT
+    init_db(engine, now)
+    for hours in (1, 24, 24 * 7):
+        start = now - datetime.timedelta(hours=hours)
+        old = run(engine, old_filters(start))
+        new = run(engine, new_filters(start))
+        assert old[0] == new[0]
+        print 'revisions changed in last %d hours: %d' % (hours, old[0])
+        print '  or filter:   %8.3f seconds, %s' % old[1:]
+        print '  range scan:  %8.3f seconds, %s' % new[1:]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/python2.7
+
+import timeit
+
+import jinja2
+
+from networking_ipvs.common import template
+from networking_ipvs.drivers.keepalived import templates
+
+
+vs_info = {'listen_ip': '10.0.0.10', 'listen_port': 80,
+           'admin_state_up': True, 'scheduler': 'wrr',
+           'forward_method': 'DR'}
+
+
+def get_realservers(count):
+    return [{'id': 'rs-%06d' % i,
+             'server_ip': '192.168.%d.%d' % (i // 250, i % 250 + 1),
+             'server_port': 8080, 'weight': 1, 'admin_state_up': i % 10 != 0,
+             'timeout': 3, 'max_retries': 3, 'delay': 3}
+            for i in range(count)]
+
+
+# what VirtualServerTemplate did before templates were shared, its env
+# was created once with default auto_reload
+reloading_env = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(searchpath=templates.templates_path),
+    trim_blocks=True, lstrip_blocks=True, auto_reload=True)
+
+
+def render_reloading(realservers):
+    # template is got on every render, and auto_reload checks its file
+    return reloading_env.get_template(
+        templates.virtualserver_template_name).render({
+            "vs_info": vs_info, "realservers": realservers})
+
+
+def main():
+    vs_template = template.VirtualServerTemplate()
+    print '%-8s %-16s %-16s' % ('servers', 'reloading(ms)', 'shared(ms)')
+    for count in (1, 100, 1000):
+        realservers = get_realservers(count)
+        assert render_reloading(realservers) == (
+            vs_template.get_virtualserver_conf(vs_info, realservers))
+        number = max(10, 10000 // count)
+        reloading = timeit.timeit(lambda: render_reloading(realservers),
+                                  number=number)
+        shared = timeit.timeit(
+            lambda: vs_template.get_virtualserver_conf(vs_info, realservers),
+            number=number)
+        print '%-8d %-16.3f %-16.3f' % (count, reloading * 1000 / number,
+                                        shared * 1000 / number)
+
+
+if __name__ == '__main__':
+    main()
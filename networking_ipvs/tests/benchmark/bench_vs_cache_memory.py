@@ -0,0 +1,58 @@
+#!/usr/bin/python2.7
+
+import sys
+
+from networking_ipvs.common import constants as const
+from networking_ipvs.drivers.keepalived import records
+
+VS_COUNT = 1000
+RS_PER_VS = 100
+
+
+def sizeof(obj, seen=None):
+    seen = seen if seen is not None else set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(sizeof(k, seen) + sizeof(v, seen)
+                    for k, v in obj.items())
+    elif isinstance(obj, (list, tuple)):
+        size += sum(sizeof(i, seen) for i in obj)
+    elif hasattr(obj, '__slots__'):
+        size += sum(sizeof(getattr(obj, f), seen) for f in obj.__slots__)
+    return size
+
+
+def get_vs_dict(vs_idx):
+    # what parse_virtualserver_conf returns, ports and numbers are str
+    realservers = {}
+    for i in range(RS_PER_VS):
+        server_ip = '192.168.%d.%d' % (i // 250, i % 250 + 1)
+        realservers['%s:8080' % server_ip] = {
+            const.ID: 'rs-%06d-%03d' % (vs_idx, i),
+            const.SERVER_IP: server_ip, const.SERVER_PORT: '8080',
+            const.WEIGHT: '1', const.TIMEOUT: '3', const.MAX_RETRIES: '3',
+            const.DELAY: '3', const.ADMIN_STATE_UP: True}
+    return {const.LISTEN_IP: '10.0.%d.%d' % (vs_idx // 250, vs_idx % 250),
+            const.LISTEN_PORT: 80, const.SCHEDULER: 'wrr',
+            const.FORWARD_METHOD: 'DR', const.ADMIN_STATE_UP: True,
+            const.REALSERVERS: realservers}
+
+
+def main():
+    dicts = [get_vs_dict(i) for i in range(VS_COUNT)]
+    dict_size = sizeof(dicts)
+    vs_records = [records.VirtualServer.from_dict(vs) for vs in dicts]
+    record_size = sizeof(vs_records)
+    count = VS_COUNT * RS_PER_VS
+    print '%d real servers' % count
+    print 'dicts:   %8.1f MB, %5d bytes per real server' % (
+        dict_size / 1048576.0, dict_size // count)
+    print 'records: %8.1f MB, %5d bytes per real server' % (
+        record_size / 1048576.0, record_size // count)
+
+
+if __name__ == '__main__':
+    main()
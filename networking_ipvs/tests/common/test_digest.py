@@ -0,0 +1,97 @@
+#!/usr/bin/python2.7
+
+import os
+
+from networking_ipvs.common import constants as const
+from networking_ipvs.common import digest
+
+VS = {const.LISTEN_IP: '192.168.10.10', const.LISTEN_PORT: 8080,
+      const.SCHEDULER: const.IPVS_SOURCE_HASHING,
+      const.FORWARD_METHOD: const.DR, const.ADMIN_STATE_UP: True}
+
+
+def get_rs(ip, weight=1, up=True):
+    return {const.SERVER_IP: ip, const.SERVER_PORT: 80, const.WEIGHT: weight,
+            const.DELAY: 3, const.TIMEOUT: 3, const.MAX_RETRIES: 3,
+            const.ADMIN_STATE_UP: up}
+
+
+def check(task_msg, expected, observed):
+    if expected != observed:
+        print(task_msg + "....failed")
+        print('observed: %s\nexpected: %s' % (observed, expected))
+        os.sys.exit(1)
+    print(task_msg + "....passed")
+
+
+def test_order_independent():
+    realservers = [get_rs('192.168.100.%d' % i) for i in range(10)]
+    check("test digest order independent",
+          digest.get_digest(VS, realservers),
+          digest.get_digest(VS, list(reversed(realservers))))
+    check("test digest order independent(rs hashes)",
+          digest.get_rs_hashes(realservers),
+          digest.get_rs_hashes(realservers[5:] + realservers[:5]))
+
+
+def test_changes():
+    realservers = [get_rs('192.168.100.10'), get_rs('192.168.100.11')]
+    vs_digest = digest.get_digest(VS, realservers)
+    check("test digest changes(rs weight)", True,
+          vs_digest != digest.get_digest(
+              VS, [get_rs('192.168.100.10', weight=2), realservers[1]]))
+    check("test digest changes(rs deleted)", True,
+          vs_digest != digest.get_digest(VS, realservers[:1]))
+    vs_info = dict(VS, **{const.ADMIN_STATE_UP: False})
+    check("test digest changes(vs down)", True,
+          vs_digest != digest.get_digest(vs_info, realservers))
+    # agents may cache admin state as int
+    rs = dict(realservers[0], **{const.ADMIN_STATE_UP: 1})
+    check("test digest changes(canonical bool)",
+          digest.get_rs_hash(realservers[0]), digest.get_rs_hash(rs))
+
+
+def test_incremental():
+    rs1, rs2 = get_rs('192.168.100.10'), get_rs('192.168.100.11')
+    vs_digest = digest.get_digest(VS, [rs1, rs2])
+    new_rs2 = get_rs('192.168.100.11', weight=5, up=False)
+    vs_digest = digest.update_digest(
+        vs_digest, digest.get_rs_hash(rs2), digest.get_rs_hash(new_rs2))
+    check("test digest incremental(rs updated)",
+          digest.get_digest(VS, [rs1, new_rs2]), vs_digest)
+    rs3 = get_rs('192.168.100.12')
+    vs_digest = digest.update_digest(vs_digest, 0, digest.get_rs_hash(rs3))
+    check("test digest incremental(rs created)",
+          digest.get_digest(VS, [rs1, new_rs2, rs3]), vs_digest)
+    vs_digest = digest.update_digest(vs_digest, digest.get_rs_hash(rs1), 0)
+    check("test digest incremental(rs deleted)",
+          digest.get_digest(VS, [new_rs2, rs3]), vs_digest)
+    vs_info = dict(VS, **{const.SCHEDULER: const.IPVS_WEIGHTED_ROUND_ROBIN})
+    vs_digest = digest.update_digest(
+        vs_digest, digest.get_vs_hash(VS), digest.get_vs_hash(vs_info))
+    check("test digest incremental(vs updated)",
+          digest.get_digest(vs_info, [new_rs2, rs3]), vs_digest)
+    check("test digest incremental(format)",
+          digest.format_digest(digest.get_vs_hash(vs_info),
+                               digest.get_rs_hashes([new_rs2, rs3])),
+          vs_digest)
+
+
+def test_is_comparable():
+    vs_digest = digest.get_digest(VS, [get_rs('192.168.100.10')])
+    check("test digest is comparable(this version)", True,
+          digest.is_comparable(vs_digest))
+    other = '%d:%s' % (digest.DIGEST_VERSION + 1, vs_digest.split(':')[1])
+    check("test digest is comparable(other version)", False,
+          digest.is_comparable(other))
+    check("test digest is comparable(none)", (False, False),
+          (digest.is_comparable(None), digest.is_comparable('')))
+    # conf MD5 sent by old plugins has no version
+    check("test digest is comparable(md5)", False,
+          digest.is_comparable('d41d8cd98f00b204e9800998ecf8427e'))
+
+
+if __name__ == '__main__':
+    for func in sorted(dir()):
+        if func.startswith('test_'):
+            globals()[func]()
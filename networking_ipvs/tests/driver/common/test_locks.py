@@ -0,0 +1,98 @@
+#!/usr/bin/python2.7
+
+import os
+
+import eventlet
+
+from networking_ipvs.drivers.common import locks
+
+STEP = 0.01
+
+
+class Holders(object):
+    def __init__(self, lock):
+        self.lock = lock
+        self.events = []
+
+    def share(self, name, seconds):
+        with self.lock.shared():
+            self.events.append(('start', name))
+            eventlet.sleep(seconds)
+            self.events.append(('end', name))
+
+    def own(self, name, seconds):
+        with self.lock.exclusive():
+            self.events.append(('start', name))
+            eventlet.sleep(seconds)
+            self.events.append(('end', name))
+
+    def index(self, event, name):
+        return self.events.index((event, name))
+
+
+def check(task_msg, expected, observed):
+    if expected != observed:
+        print(task_msg + "....failed")
+        print('observed: %s\nexpected: %s' % (observed, expected))
+        os.sys.exit(1)
+    print(task_msg + "....passed")
+
+
+def test_sharers():
+    holders = Holders(locks.SharedLock())
+    pool = eventlet.GreenPool()
+    pool.spawn(holders.share, 's1', STEP * 2)
+    pool.spawn(holders.share, 's2', STEP)
+    pool.waitall()
+    check("test shared lock sharers(concurrent)",
+          [('start', 's1'), ('start', 's2'), ('end', 's2'), ('end', 's1')],
+          holders.events)
+
+
+def test_owner():
+    holders = Holders(locks.SharedLock())
+    pool = eventlet.GreenPool()
+    pool.spawn(holders.share, 's1', STEP * 2)
+    eventlet.sleep(0)
+    pool.spawn(holders.own, 'o1', STEP)
+    eventlet.sleep(0)
+    # sharer coming after a waiting owner goes after it
+    pool.spawn(holders.share, 's2', STEP)
+    pool.spawn(holders.own, 'o2', STEP)
+    pool.waitall()
+    check("test shared lock owner(waits for sharers)", True,
+          holders.index('end', 's1') < holders.index('start', 'o1'))
+    check("test shared lock owner(before new sharers)", True,
+          holders.index('end', 'o1') < holders.index('start', 's2'))
+    check("test shared lock owner(alone)", True,
+          holders.index('end', 'o1') < holders.index('start', 'o2') or
+          holders.index('end', 'o2') < holders.index('start', 'o1'))
+    check("test shared lock owner(sharers after owners)", True,
+          holders.index('end', 'o2') < holders.index('start', 's2'))
+
+
+def test_owner_killed_waiting():
+    lock = locks.SharedLock()
+    holders = Holders(lock)
+    pool = eventlet.GreenPool()
+    pool.spawn(holders.share, 's1', STEP * 2)
+    eventlet.sleep(0)
+    owner = pool.spawn(holders.own, 'o1', STEP)
+    eventlet.sleep(0)
+    pool.spawn(holders.share, 's2', STEP)
+    eventlet.sleep(0)
+    owner.kill()
+    pool.waitall()
+    # sharer waiting behind the owner shares the lock with s1 at once
+    check("test shared lock owner killed waiting(sharers go on)",
+          [('start', 's1'), ('start', 's2'), ('end', 's2'), ('end', 's1')],
+          holders.events)
+    with lock.exclusive():
+        check("test shared lock owner killed waiting(released)", True,
+              True)
+
+
+if __name__ == '__main__':
+    for func in sorted(dir()):
+        if func.startswith('test_'):
+            globals()[func]()
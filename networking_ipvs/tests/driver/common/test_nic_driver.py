@@ -0,0 +1,167 @@
+#!/usr/bin/python2.7
+
+import os
+
+from networking_ipvs.drivers.common import nic_driver
+
+
+class FakeClock(object):
+    """time module of nic_driver, each vip plugged or unplugged takes 1s."""
+
+    def __init__(self):
+        self.now = 0
+
+    def time(self):
+        return self.now
+
+
+class FakeAddr(object):
+    def __init__(self, clock):
+        self.clock = clock
+        self.cidrs = []
+
+    def list(self):
+        return [{'cidr': cidr} for cidr in self.cidrs]
+
+    def add(self, cidr):
+        self.clock.now += 1
+        if cidr in self.cidrs:
+            raise RuntimeError('RTNETLINK answers: File exists')
+        self.cidrs.append(cidr)
+
+    def delete(self, cidr):
+        self.clock.now += 1
+        if cidr not in self.cidrs:
+            raise RuntimeError('RTNETLINK answers: Cannot assign requested '
+                               'address')
+        self.cidrs.remove(cidr)
+
+
+class FakeDevice(object):
+    clock = None
+
+    def __init__(self, name):
+        self.name = name
+        self.addr = FakeAddr(self.clock)
+
+
+class IPVSConf(object):
+    ipvs_vip_nic_backend = nic_driver.IP_LIB_BACKEND
+
+    def __init__(self, mapping):
+        self.ipvs_vip_nic_mapping = mapping
+
+
+class Conf(object):
+    def __init__(self, mapping):
+        self.ipvs = IPVSConf(mapping)
+
+
+def check(task_msg, expected, observed):
+    if expected != observed:
+        print(task_msg + "....failed")
+        print('observed: %s\nexpected: %s' % (observed, expected))
+        os.sys.exit(1)
+    print(task_msg + "....passed")
+
+
+def get_driver(mapping):
+    clock = FakeClock()
+    nic_driver.time = clock
+    FakeDevice.clock = clock
+    nic_driver.ip_lib.IPDevice = FakeDevice
+    return nic_driver.NICDriver(Conf(mapping))
+
+
+def get_cidrs(driver, nic):
+    return sorted(driver._nics[nic].addr.cidrs)
+
+
+def test_check_nic_vips():
+    driver = get_driver('10.0.0.0/24:eth0,*:eth1')
+    driver._nics['eth0'].addr.cidrs = ['10.0.0.2/32', '10.0.0.9/32']
+    # host address, address of another service and a vip of this agent
+    driver._nics['eth1'].addr.cidrs = [
+        '172.16.0.1/24', '172.16.0.5/32', '172.16.0.7/32']
+    fixed = driver.check_nic_vips(
+        ['10.0.0.1', '10.0.0.2', '172.16.0.8'],
+        managed_vips=['172.16.0.7'])
+    check("test check nic vips(fixed)", 4, fixed)
+    check("test check nic vips(eth0)", ['10.0.0.1/32', '10.0.0.2/32'],
+          get_cidrs(driver, 'eth0'))
+    check("test check nic vips(eth1)",
+          ['172.16.0.1/24', '172.16.0.5/32', '172.16.0.8/32'],
+          get_cidrs(driver, 'eth1'))
+    # plugged by this agent, though it's out of cidrs and managed vips
+    fixed = driver.check_nic_vips(['10.0.0.1', '10.0.0.2'])
+    check("test check nic vips(plugged by agent)", (1, ['172.16.0.1/24',
+                                                        '172.16.0.5/32']),
+          (fixed, get_cidrs(driver, 'eth1')))
+    check("test check nic vips(nothing to fix)", 0,
+          driver.check_nic_vips(lambda: ['10.0.0.1', '10.0.0.2']))
+
+
+def test_check_nic_vips_budget():
+    driver = get_driver('*:eth0')
+    nic_driver.CHECK_BATCH_SIZE = 1
+    try:
+        vips = ['10.0.0.%d' % i for i in range(1, 6)]
+        # batches starting at 0s, 1s and 2s are in budget
+        check("test check nic vips budget(cut short)", 3,
+              driver.check_nic_vips(vips, budget=2.5))
+        check("test check nic vips budget(plugged)", 3,
+              len(get_cidrs(driver, 'eth0')))
+        check("test check nic vips budget(next check)", 2,
+              driver.check_nic_vips(vips, budget=2.5))
+        check("test check nic vips budget(all plugged)",
+              sorted(vip + '/32' for vip in vips), get_cidrs(driver, 'eth0'))
+    finally:
+        nic_driver.CHECK_BATCH_SIZE = 256
+
+
+def test_prefix_trie():
+    trie = nic_driver.PrefixTrie('default')
+    trie.insert('10.0.0.0/8', '/8')
+    trie.insert('10.1.0.0/16', '/16')
+    trie.insert('10.1.2.0/24', '/24')
+    trie.insert('10.1.2.3/32', '/32')
+    # not on a network boundary, it's still 10.2.0.0/16
+    trie.insert('10.2.3.4/16', '10.2/16')
+    for ip_address, expected in [
+            ('10.9.9.9', '/8'), ('10.1.9.9', '/16'), ('10.1.2.9', '/24'),
+            ('10.1.2.3', '/32'), ('10.2.9.9', '10.2/16'),
+            ('11.0.0.1', 'default'), ('9.255.255.255', 'default')]:
+        check("test prefix trie(%s)" % ip_address, expected,
+              trie.lookup(ip_address))
+    check("test prefix trie(no default)", None,
+          nic_driver.PrefixTrie().lookup('10.0.0.1'))
+
+
+def get_nic_names(driver, vips):
+    return [driver._get_nic_for_vip(vip).name for vip in vips]
+
+
+def test_nic_selection():
+    vips = ['10.0.0.1', '10.0.1.1', '10.1.0.1', '172.16.0.1']
+    driver = get_driver('10.0.0.0/16:eth0,*:eth2,10.0.1.0/24:eth1')
+    check("test nic selection(overlapping cidrs)",
+          ['eth0', 'eth1', 'eth2', 'eth2'], get_nic_names(driver, vips))
+    driver = get_driver('10.0.1.0/24:eth1,10.0.0.0/16:eth0')
+    check("test nic selection(first nic for others)",
+          ['eth0', 'eth1', 'eth1', 'eth1'], get_nic_names(driver, vips))
+    driver = get_driver('*:eth0')
+    check("test nic selection(only *)", ['eth0'] * 4,
+          get_nic_names(driver, vips))
+    driver = get_driver('10.0.0.0/16:eth0,10.1.0.0/16:eth0,*:eth1')
+    check("test nic selection(one device for a nic)", 2, len(driver._nics))
+    driver.plug_vips(vips)
+    check("test nic selection(plugged)",
+          (['10.0.0.1/32', '10.0.1.1/32', '10.1.0.1/32'],
+           ['172.16.0.1/32']),
+          (get_cidrs(driver, 'eth0'), get_cidrs(driver, 'eth1')))
+
+
+if __name__ == '__main__':
+    for func in sorted(dir()):
+        if func.startswith('test_'):
+            globals()[func]()
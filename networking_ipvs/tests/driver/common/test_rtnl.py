@@ -0,0 +1,145 @@
+#!/usr/bin/python2.7
+
+import errno
+import os
+import socket
+import struct
+
+from networking_ipvs.drivers.common import netlink
+from networking_ipvs.drivers.common import rtnl
+
+
+class FakeRtnlSocket(object):
+    """rtnetlink socket with addresses of fake nics behind it"""
+
+    def __init__(self, addrs):
+        # ifindex: {ip_address: prefixlen}
+        self.addrs = addrs
+        # (msg_type, flags, ifindex, ip_address) of requests in each send
+        self.sent = []
+        self._replies = []
+
+    def close(self):
+        pass
+
+    def recv(self, bufsize):
+        replies, self._replies = b''.join(self._replies), []
+        return replies
+
+    def send(self, data):
+        requests = []
+        for msg_type, flags, seq, payload in netlink.parse_messages(data):
+            family, prefixlen, _flags, scope, index = (
+                rtnl.IFADDRMSG.unpack_from(payload))
+            attrs = netlink.parse_attrs(payload[rtnl.IFADDRMSG.size:])
+            if msg_type == rtnl.RTM_GETADDR:
+                requests.append((msg_type, flags, None, None))
+                self._dump(seq)
+                continue
+            ip_address = socket.inet_ntoa(attrs[rtnl.IFA_LOCAL])
+            requests.append((msg_type, flags, index, ip_address))
+            assert (family, prefixlen, scope) == (
+                socket.AF_INET, rtnl.HOST_PREFIXLEN, rtnl.RT_SCOPE_UNIVERSE)
+            assert attrs[rtnl.IFA_ADDRESS] == attrs[rtnl.IFA_LOCAL]
+            error = self._handle(msg_type, index, ip_address)
+            self._replies.append(netlink.pack_message(
+                netlink.NLMSG_ERROR, 0, seq,
+                struct.pack('=i', -error) + data[:netlink.NLMSG_HDR.size]))
+        self.sent.append(requests)
+        return len(data)
+
+    def _handle(self, msg_type, index, ip_address):
+        if index not in self.addrs:
+            return errno.ENODEV
+        addrs = self.addrs[index]
+        if msg_type == rtnl.RTM_NEWADDR:
+            if ip_address in addrs:
+                return errno.EEXIST
+            addrs[ip_address] = rtnl.HOST_PREFIXLEN
+        else:
+            if ip_address not in addrs:
+                return errno.EADDRNOTAVAIL
+            del addrs[ip_address]
+        return 0
+
+    def _dump(self, seq):
+        for index, addrs in sorted(self.addrs.items()):
+            for ip_address, prefixlen in sorted(addrs.items()):
+                addr = socket.inet_aton(ip_address)
+                self._replies.append(netlink.pack_message(
+                    rtnl.RTM_NEWADDR, netlink.NLM_F_MULTI, seq,
+                    rtnl.IFADDRMSG.pack(socket.AF_INET, prefixlen, 0,
+                                        rtnl.RT_SCOPE_UNIVERSE, index) +
+                    netlink.pack_attr(rtnl.IFA_LOCAL, addr)))
+        self._replies.append(netlink.pack_message(
+            netlink.NLMSG_DONE, netlink.NLM_F_MULTI, seq,
+            struct.pack('=i', 0)))
+
+
+def check(task_msg, expected, observed):
+    if expected != observed:
+        print(task_msg + "....failed")
+        print('observed: %s\nexpected: %s' % (observed, expected))
+        os.sys.exit(1)
+    print(task_msg + "....passed")
+
+
+def get_rtnl():
+    sock = FakeRtnlSocket({2: {'10.0.0.2': 32}, 3: {}})
+    return sock, rtnl.RtnlAddr(sock)
+
+
+def test_add_addrs():
+    sock, rtnl_addr = get_rtnl()
+    addrs = [(2, '10.0.0.1'), (2, '10.0.0.2'), (3, '10.0.0.1'),
+             (4, '10.0.0.1')]
+    check("test add addrs(errors)", [0, 0, 0, errno.ENODEV],
+          rtnl_addr.add_addrs(addrs))
+    flags = (netlink.NLM_F_REQUEST | netlink.NLM_F_ACK |
+             netlink.NLM_F_CREATE | netlink.NLM_F_EXCL)
+    check("test add addrs(one batch)",
+          [[(rtnl.RTM_NEWADDR, flags, index, ip_address)
+            for index, ip_address in addrs]], sock.sent)
+    check("test add addrs(added)",
+          {2: {'10.0.0.1': 32, '10.0.0.2': 32}, 3: {'10.0.0.1': 32}},
+          sock.addrs)
+
+
+def test_del_addrs():
+    sock, rtnl_addr = get_rtnl()
+    addrs = [(2, '10.0.0.2'), (3, '10.0.0.2'), (4, '10.0.0.2')]
+    check("test del addrs(errors)", [0, 0, errno.ENODEV],
+          rtnl_addr.del_addrs(addrs))
+    flags = netlink.NLM_F_REQUEST | netlink.NLM_F_ACK
+    check("test del addrs(one batch)",
+          [[(rtnl.RTM_DELADDR, flags, index, ip_address)
+            for index, ip_address in addrs]], sock.sent)
+    check("test del addrs(deleted)", {2: {}, 3: {}}, sock.addrs)
+
+
+def test_add_addrs_split():
+    sock, rtnl_addr = get_rtnl()
+    addrs = [(3, '10.0.%d.%d' % (i // 256, i % 256)) for i in range(1000)]
+    check("test add addrs split(errors)", [0] * 1000,
+          rtnl_addr.add_addrs(addrs))
+    size = netlink.NLMSG_HDR.size + len(rtnl.pack_host_addr(3, '10.0.0.1'))
+    check("test add addrs split(batches)",
+          [netlink.MAX_BATCH_SIZE // size] * (len(sock.sent) - 1),
+          [len(requests) for requests in sock.sent[:-1]])
+    check("test add addrs split(all sent)", addrs,
+          [(index, ip_address) for requests in sock.sent
+           for _type, _flags, index, ip_address in requests])
+
+
+def test_get_host_addrs():
+    sock, rtnl_addr = get_rtnl()
+    sock.addrs[3] = {'10.0.0.3': 32, '172.16.0.1': 24}
+    check("test get host addrs", {2: set(['10.0.0.2']),
+                                  3: set(['10.0.0.3'])},
+          rtnl_addr.get_host_addrs())
+
+
+if __name__ == '__main__':
+    for func in sorted(dir()):
+        if func.startswith('test_'):
+            globals()[func]()
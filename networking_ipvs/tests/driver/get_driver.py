@@ -1,4 +1,6 @@
+from networking_ipvs.tests.driver.ipvsadm import test_ipvsadm_driver
 from networking_ipvs.tests.driver.keepalived import test_keepalived_driver
+from networking_ipvs.tests.driver.netlink import test_netlink_driver
 
 
 def driver(driver_name):
@@ -8,6 +10,14 @@ def driver(driver_name):
     def keepalived():
         return test_keepalived_driver.IPVSDriver
 
+    def netlink():
+        return test_netlink_driver.IPVSDriver
+
+    def ipvsadm():
+        return test_ipvsadm_driver.IPVSDriver
+
     return {
         'keepalived': keepalived,
+        'netlink': netlink,
+        'ipvsadm': ipvsadm,
         }.get(driver_name, not_found)()
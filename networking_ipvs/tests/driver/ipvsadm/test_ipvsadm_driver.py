@@ -0,0 +1,69 @@
+import os
+
+from networking_ipvs.drivers.ipvsadm import ipvsadm_driver
+from networking_ipvs.drivers.keepalived import utils as kutils
+from networking_ipvs.tests.driver.keepalived import base as kbase
+from networking_ipvs.tests.driver.netlink import base as nbase
+
+
+def cleanup_services():
+    # services left by earlier runs still have their conf files, other
+    # services in kernel are not created by tests
+    conf_path = kbase.conf.keepalived.virtualserver_conf_path
+    for f in os.listdir(conf_path):
+        key = kutils.get_vs_key(f)
+        if key:
+            os.system('ipvsadm -D -t %s:%s 2>/dev/null' % key)
+
+
+class IPVSDriver(ipvsadm_driver.IPVSDriver):
+
+    def __init__(self, context, plugin):
+        conf = kbase.conf
+        plugin_rpc = kbase.FakeRPC(context, plugin)
+        cleanup_services()
+        kbase.cleanup()
+        super(IPVSDriver, self).__init__(conf, plugin_rpc)
+
+    @property
+    def services(self):
+        return self._ipvs.get_services()
+
+    def assert_init(self, vs_info, all_rs, task_msg):
+        nbase.common_assert(self, vs_info, all_rs, task_msg)
+
+    def assert_create_rs(self, vs_info, all_rs, task_msg):
+        nbase.common_assert(self, vs_info, all_rs, task_msg)
+
+    def assert_update_rs(self, vs_info, all_rs, task_msg):
+        nbase.common_assert(self, vs_info, all_rs, task_msg)
+
+    def assert_update_rs_down(self, vs_info, all_rs, task_msg):
+        nbase.common_assert(self, vs_info, all_rs, task_msg)
+
+    def assert_update_rs_up(self, vs_info, all_rs, task_msg):
+        nbase.common_assert(self, vs_info, all_rs, task_msg)
+
+    def assert_delete_rs(self, vs_info, all_rs, task_msg):
+        nbase.common_assert(self, vs_info, all_rs, task_msg)
+
+    def assert_update_vs(self, vs_info, all_rs, task_msg):
+        nbase.common_assert(self, vs_info, all_rs, task_msg)
+
+    def assert_update_vs_down(self, vs_info, all_rs, task_msg):
+        nbase.common_assert(self, vs_info, all_rs, task_msg,
+                            vip_exists=False)
+
+    def assert_update_vs_up(self, vs_info, all_rs, task_msg):
+        nbase.common_assert(self, vs_info, all_rs, task_msg)
+
+    def assert_delete_vs(self, vs_info, task_msg):
+        nbase.common_assert(self, vs_info, [], task_msg,
+                            vip_exists=False)
+
+    def assert_duplicate_notification(self, vs_info, all_rs, stats,
+                                      file_stat, task_msg):
+        nbase.common_assert(self, vs_info, all_rs, task_msg)
+        kbase.assert_replayed(self, vs_info, stats, file_stat, task_msg,
+                              vs_conf_writes=0, vs_conf_writes_skipped=1,
+                              ipvs_batches=0)
@@ -35,6 +35,26 @@ class FakeConf(object):
             @property
             def smtp_timeout(self):
                 return 30
+
+            @property
+            def reload_coalesce_window(self):
+                return 0
+
+            @property
+            def reload_max_delay(self):
+                return 0
+
+            @property
+            def conf_parse_workers(self):
+                return 0
+
+            @property
+            def vs_cache_snapshot_path(self):
+                return '/var/lib/neutron/networking_ipvs_vs_cache'
+
+            @property
+            def template_cache_path(self):
+                return '/var/lib/neutron/networking_ipvs_templates'
         return TemplateConf()
 
     @property
@@ -48,6 +68,10 @@ class FakeConf(object):
             def ipvs_vip_nic_mapping(self):
                 return '*:eth0'
 
+            @property
+            def ipvs_vip_nic_backend(self):
+                return 'ip_lib'
+
             @property
             def ipvs_sync_daemon_nic(self):
                 return ''
@@ -74,12 +98,27 @@ class FakeRPC(object):
     def get_revisions(self, start=None, end=None):
         return self.plugin.get_revisions(self.context, start, end)
 
+    def get_revisions_page(self, start=None, end=None, limit=None,
+                           marker=None, details=False):
+        return self.plugin.get_revisions_page(
+            self.context, start, end, limit, marker, details)
+
+    def get_revision_logs(self, start, end=None, limit=None):
+        return self.plugin.get_revision_logs(self.context, start, end, limit)
+
+    def get_revision_snapshot(self, seq=None, chunk=0):
+        return self.plugin.get_revision_snapshot(self.context, seq, chunk)
+
     def get_ipvs_realservers(self, filters=None):
         return self.plugin.get_ipvs_realservers(self.context, filters)
 
     def get_ipvs_virtualservers(self, filters=None):
         return self.plugin.get_ipvs_virtualservers(self.context, filters)
 
+    def get_virtualserver_details(self, vs_ids, limit=None, marker=None):
+        return self.plugin.get_virtualserver_details(
+            self.context, vs_ids, limit, marker)
+
 
 conf = FakeConf()
 template_driver = template.KeepalivedTemplate(conf)
@@ -88,6 +127,10 @@ template_driver = template.KeepalivedTemplate(conf)
 def cleanup():
     for f in os.listdir(conf.keepalived.virtualserver_conf_path):
         os.remove(os.path.join(conf.keepalived.virtualserver_conf_path, f))
+    for path in (conf.keepalived.vs_cache_snapshot_path,
+                 conf.keepalived.vs_cache_snapshot_path + '.journal'):
+        if os.path.isfile(path):
+            os.remove(path)
     eth0 = ip_lib.IPDevice('eth0')
     for addr in eth0.addr.list():
         if addr['cidr'].endswith('/32'):
@@ -113,7 +156,7 @@ def assert_vip(ip, exists=True):
         assert _ip not in ip_list
 
 
-def assert_vs_file(vs_info, all_rs):
+def get_vs_file_path(vs_info):
     listen_ip = vs_info[const.LISTEN_IP]
     listen_port = vs_info[const.LISTEN_PORT]
     file_path = os.path.join(conf.keepalived.virtualserver_conf_path,
@@ -121,6 +164,17 @@ def assert_vs_file(vs_info, all_rs):
     up = vs_info.get(const.ADMIN_STATE_UP, True)
     if not up:
         file_path += const.DOWN
+    return file_path
+
+
+def get_vs_file_stat(vs_info):
+    # a rewritten file is a new inode, as files are replaced by rename
+    stat = os.stat(get_vs_file_path(vs_info))
+    return stat.st_ino, stat.st_mtime
+
+
+def assert_vs_file(vs_info, all_rs):
+    file_path = get_vs_file_path(vs_info)
     if len(all_rs):
         file_content = None
         temp_content = None
@@ -154,3 +208,18 @@ def common_assert(vs_info, all_rs, task_msg, vip_exists=True):
             os.sys.exit(1)
         else:
             print task_msg + ".assert_vs_file....passed"
+
+
+def assert_replayed(driver, vs_info, stats, file_stat, task_msg, **deltas):
+    """Assert replayed notifications changed stats by deltas only."""
+    new_stats = driver.get_stats()
+    observed = {k: new_stats[k] - stats[k] for k in deltas}
+    if observed != deltas:
+        print task_msg + ".assert_stats....failed"
+        print 'observed: %s\nexpected: %s' % (observed, deltas)
+        os.sys.exit(1)
+    print task_msg + ".assert_stats....passed"
+    if get_vs_file_stat(vs_info) != file_stat:
+        print task_msg + ".assert_vs_file_not_rewritten....failed"
+        os.sys.exit(1)
+    print task_msg + ".assert_vs_file_not_rewritten....passed"
@@ -0,0 +1,294 @@
+#!/usr/bin/python2.7
+
+import os
+import shutil
+import tempfile
+
+from networking_ipvs.common import constants as const
+from networking_ipvs.common import digest
+from networking_ipvs.drivers.keepalived import keepalived_driver
+from networking_ipvs.drivers.keepalived import utils as kutils
+from networking_ipvs.tests.driver.keepalived import base
+
+LISTEN_IP = '192.168.10.10'
+
+
+class Opts(object):
+    """Options of a group, some of them overridden."""
+
+    def __init__(self, opts, **overrides):
+        self._opts = opts
+        self.__dict__.update(overrides)
+
+    def __getattr__(self, name):
+        return getattr(self._opts, name)
+
+
+class Conf(object):
+    """Conf of base, with keepalived files under root."""
+
+    def __init__(self, root):
+        self.keepalived = Opts(
+            base.conf.keepalived,
+            keepalived_conf_path=os.path.join(root, 'keepalived.conf'),
+            virtualserver_conf_path=os.path.join(root, 'networking_ipvs'),
+            vs_cache_snapshot_path=os.path.join(root, 'vs_cache'),
+            template_cache_path='')
+        self.ipvs = base.conf.ipvs
+        self.revision = base.conf.revision
+
+
+def get_vs(port=8080, up=True):
+    return {const.LISTEN_IP: LISTEN_IP, const.LISTEN_PORT: port,
+            const.SCHEDULER: const.IPVS_SOURCE_HASHING,
+            const.FORWARD_METHOD: const.DR, const.ADMIN_STATE_UP: up}
+
+
+def get_rs(ip, weight=1, up=True):
+    return {const.SERVER_IP: ip, const.SERVER_PORT: 80, const.WEIGHT: weight,
+            const.DELAY: 3, const.TIMEOUT: 3, const.MAX_RETRIES: 3,
+            const.ADMIN_STATE_UP: up}
+
+
+def check(task_msg, expected, observed):
+    if expected != observed:
+        print(task_msg + "....failed")
+        print('observed: %s\nexpected: %s' % (observed, expected))
+        os.sys.exit(1)
+    print(task_msg + "....passed")
+
+
+def with_config(func):
+    def wrap():
+        root = tempfile.mkdtemp()
+        try:
+            func(root, keepalived_driver.ConfigManager(Conf(root)))
+        finally:
+            shutil.rmtree(root)
+    wrap.__name__ = func.__name__
+    return wrap
+
+
+def check_digest(task_msg, config, vs_info, realservers):
+    check(task_msg, digest.get_digest(vs_info, realservers),
+          config.get_vs_digest(vs_info))
+
+
+@with_config
+def test_vs_rs_hashes(root, config):
+    vs_info = get_vs()
+    rs1, rs2 = get_rs('192.168.100.10'), get_rs('192.168.100.11')
+    config.update(vs_info, [rs1, rs2])
+    check_digest("test vs rs hashes(created)", config, vs_info, [rs1, rs2])
+    rs2 = get_rs('192.168.100.11', weight=5)
+    config.update(vs_info, [rs2])
+    check_digest("test vs rs hashes(rs updated)", config, vs_info,
+                 [rs1, rs2])
+    rs3 = get_rs('192.168.100.12', up=False)
+    config.update(vs_info, [rs3])
+    check_digest("test vs rs hashes(rs created)", config, vs_info,
+                 [rs1, rs2, rs3])
+    config.delete_rs(vs_info, [rs1])
+    check_digest("test vs rs hashes(rs deleted)", config, vs_info,
+                 [rs2, rs3])
+    config.update(vs_info, [rs1, rs3], replace=True)
+    check_digest("test vs rs hashes(rs replaced)", config, vs_info,
+                 [rs1, rs3])
+    vs_info = get_vs(up=False)
+    config.update(vs_info)
+    rs1, rs3 = (dict(rs, **{const.ADMIN_STATE_UP: False})
+                for rs in (rs1, rs3))
+    check_digest("test vs rs hashes(vs down)", config, vs_info, [rs1, rs3])
+    config.delete_vs(vs_info)
+    check("test vs rs hashes(vs deleted)", None,
+          config.get_vs_digest(vs_info))
+
+
+@with_config
+def test_vs_rs_hashes_restart(root, config):
+    vs_info = get_vs()
+    realservers = [get_rs('192.168.100.10'), get_rs('192.168.100.11', 5)]
+    config.update(vs_info, realservers)
+    config.save_snapshot()
+    restarted = keepalived_driver.ConfigManager(Conf(root))
+    check_digest("test vs rs hashes restart(snapshot)", restarted, vs_info,
+                 realservers)
+    os.remove(restarted.snapshot_path)
+    restarted = keepalived_driver.ConfigManager(Conf(root))
+    check_digest("test vs rs hashes restart(parsed)", restarted, vs_info,
+                 realservers)
+
+
+@with_config
+def test_replace_rs_all_down(root, config):
+    vs_info = get_vs()
+    config.update(vs_info, [get_rs('192.168.100.10'),
+                            get_rs('192.168.100.11')])
+    check("test replace rs all down(plugged)", (set([LISTEN_IP]), set()),
+          config.get_changed_vips())
+    config.update(vs_info, [get_rs('192.168.100.10', up=False),
+                            get_rs('192.168.100.12', up=False)],
+                  replace=True)
+    check("test replace rs all down(unplugged)", (set(), set([LISTEN_IP])),
+          config.get_changed_vips())
+
+
+@with_config
+def test_replace_rs_up(root, config):
+    vs_info = get_vs()
+    config.update(vs_info, [get_rs('192.168.100.10')])
+    config.get_changed_vips()
+    # old real servers are removed before new ones are added, vip is not
+    # unplugged and plugged again for that
+    config.update(vs_info, [get_rs('192.168.100.11')], replace=True)
+    check("test replace rs up(unchanged)", (set(), set()),
+          config.get_changed_vips())
+
+
+def get_rs_weights(config, vs_info):
+    vs = config.get_vs(vs_info[const.LISTEN_IP], vs_info[const.LISTEN_PORT])
+    return {rs_key: rs[const.WEIGHT]
+            for rs_key, rs in vs[const.REALSERVERS].items()}
+
+
+@with_config
+def test_update_replace(root, config):
+    vs_info = get_vs()
+    config.update(vs_info, [get_rs('192.168.100.10'),
+                            get_rs('192.168.100.11'),
+                            get_rs('192.168.100.12')])
+    config.update(vs_info, [get_rs('192.168.100.11', weight=5),
+                            get_rs('192.168.100.13')], replace=True)
+    expected = {'192.168.100.11:80': 5, '192.168.100.13:80': 1}
+    check("test update replace(cached)", expected,
+          get_rs_weights(config, vs_info))
+    with open(os.path.join(root, 'networking_ipvs',
+                           '%s_%s' % (LISTEN_IP, 8080))) as f:
+        content = f.read()
+    check("test update replace(conf file)", [False, True, False, True],
+          ['real_server 192.168.100.1%d 80' % i in content
+           for i in range(4)])
+    restarted = keepalived_driver.ConfigManager(Conf(root))
+    check("test update replace(parsed)", expected,
+          get_rs_weights(restarted, vs_info))
+    # without replace, cached real servers are kept
+    config.update(vs_info, [get_rs('192.168.100.10')])
+    expected['192.168.100.10:80'] = 1
+    check("test update replace(not replaced)", expected,
+          get_rs_weights(config, vs_info))
+
+
+@with_config
+def test_delete_rs_vip_down(root, config):
+    vs_info = get_vs()
+    config.update(vs_info, [get_rs('192.168.100.10'),
+                            get_rs('192.168.100.11', up=False)])
+    config.get_changed_vips()
+    config.delete_rs(vs_info, [get_rs('192.168.100.10')])
+    check("test delete rs vip down(unplugged)", (set(), set([LISTEN_IP])),
+          config.get_changed_vips())
+    config.update(vs_info, [get_rs('192.168.100.10')])
+    config.get_changed_vips()
+    # vip is kept for another live vs on it
+    other_vs = get_vs(port=8081)
+    config.update(other_vs, [get_rs('192.168.100.10')])
+    config.delete_rs(vs_info, [get_rs('192.168.100.10')])
+    check("test delete rs vip down(other vs live)", (set(), set()),
+          config.get_changed_vips())
+    config.delete_rs(other_vs, [get_rs('192.168.100.10')])
+    check("test delete rs vip down(last rs)", (set(), set([LISTEN_IP])),
+          config.get_changed_vips())
+
+
+def create_vs(config, port):
+    vs_info = get_vs(port)
+    realservers = [get_rs('192.168.100.10'), get_rs('192.168.100.11', 5)]
+    config.update(vs_info, realservers)
+    return vs_info, realservers
+
+
+def check_parse_stats(task_msg, root, parsed, reused, vs_list):
+    restarted = keepalived_driver.ConfigManager(Conf(root))
+    stats = restarted.get_stats()
+    check(task_msg, (parsed, reused),
+          (stats['vs_conf_parsed'], stats['vs_conf_reused']))
+    for vs_info, realservers in vs_list:
+        check_digest(task_msg + '(digest)', restarted, vs_info, realservers)
+    return restarted
+
+
+@with_config
+def test_snapshot_reused(root, config):
+    vs_list = [create_vs(config, 8080), create_vs(config, 8081)]
+    config.save_snapshot()
+    parse = kutils.parse_virtualserver_confs
+    parsed = []
+
+    def record_parse(file_paths, workers=0):
+        parsed.extend(file_paths)
+        return parse(file_paths, workers)
+
+    kutils.parse_virtualserver_confs = record_parse
+    try:
+        check_parse_stats("test snapshot reused", root, 0, 2, vs_list)
+        check("test snapshot reused(nothing parsed)", [], parsed)
+        # touched file is parsed, others are still reused
+        file_path = os.path.join(root, 'networking_ipvs',
+                                 '%s_%s' % (LISTEN_IP, 8081))
+        stat = os.stat(file_path)
+        os.utime(file_path, (stat.st_atime, stat.st_mtime + 10))
+        check_parse_stats("test snapshot reused(touched)", root, 1, 1,
+                          vs_list)
+        check("test snapshot reused(touched parsed)", [file_path], parsed)
+    finally:
+        kutils.parse_virtualserver_confs = parse
+
+
+@with_config
+def test_snapshot_corrupted(root, config):
+    vs_list = [create_vs(config, 8080), create_vs(config, 8081)]
+    config.save_snapshot()
+    with open(config.snapshot_path, 'rb') as f:
+        content = f.read()
+    header_size = kutils.SNAPSHOT_HEADER.size
+    magic, version, md5 = kutils.SNAPSHOT_HEADER.unpack_from(content)
+    corrupted = {
+        'truncated': content[:header_size - 1],
+        'bad md5': content[:-1] + chr(ord(content[-1]) ^ 0xff),
+        'unknown version': kutils.SNAPSHOT_HEADER.pack(
+            magic, version + 1, md5) + content[header_size:]}
+    for name, content in sorted(corrupted.items()):
+        with open(config.snapshot_path, 'wb') as f:
+            f.write(content)
+        check_parse_stats("test snapshot corrupted(%s)" % name, root, 2, 0,
+                          vs_list)
+
+
+@with_config
+def test_snapshot_journal_broken(root, config):
+    vs_list = [create_vs(config, 8080)]
+    config.save_snapshot()
+    vs_list.append(create_vs(config, 8081))
+    config.save_snapshot()
+    vs_list.append(create_vs(config, 8082))
+    config.save_snapshot()
+    with open(config.journal_path) as f:
+        journal = f.read()
+    check("test snapshot journal broken(journal entries)", 2,
+          len(journal.splitlines()))
+    # agent stopped while appending the last line
+    with open(config.journal_path, 'w') as f:
+        f.write(journal[:-10])
+    restarted = check_parse_stats("test snapshot journal broken", root, 1, 2,
+                                  vs_list)
+    restarted.save_snapshot()
+    check("test snapshot journal broken(journal emptied)", 0,
+          os.path.getsize(restarted.journal_path))
+    check_parse_stats("test snapshot journal broken(rewritten)", root, 0, 3,
+                      vs_list)
+
+
+if __name__ == '__main__':
+    for func in sorted(dir()):
+        if func.startswith('test_'):
+            globals()[func]()
@@ -39,3 +39,12 @@ class IPVSDriver(keepalived_driver.IPVSDriver):
 
     def assert_delete_vs(self, vs_info, task_msg):
         base.common_assert(vs_info, [], task_msg, vip_exists=False)
+
+    def assert_duplicate_notification(self, vs_info, all_rs, stats,
+                                      file_stat, task_msg):
+        base.common_assert(vs_info, all_rs, task_msg)
+        # both replays commit nothing, only the one without revision
+        # reaches conf files
+        base.assert_replayed(self, vs_info, stats, file_stat, task_msg,
+                             vs_conf_writes=0, vs_conf_writes_skipped=1,
+                             reload_skipped=2)
@@ -0,0 +1,109 @@
+#!/usr/bin/python2.7
+
+import os
+import pickle
+
+from oslo_serialization import jsonutils
+
+from networking_ipvs.common import constants as const
+from networking_ipvs.drivers.keepalived import records
+
+
+def check(task_msg, expected, observed):
+    if expected != observed:
+        print(task_msg + "....failed")
+        print('observed: %s\nexpected: %s' % (observed, expected))
+        os.sys.exit(1)
+    print(task_msg + "....passed")
+
+
+def check_raises(task_msg, exc, func, *args):
+    try:
+        func(*args)
+    except exc:
+        print(task_msg + "....passed")
+        return
+    print(task_msg + "....failed")
+    os.sys.exit(1)
+
+
+def get_rs_dict(ip='192.168.100.10'):
+    return {const.ID: 'rs-1', const.SERVER_IP: ip, const.SERVER_PORT: '80',
+            const.WEIGHT: '5', const.TIMEOUT: 3, const.MAX_RETRIES: 3,
+            const.DELAY: 3, const.ADMIN_STATE_UP: True}
+
+
+def test_dict_access():
+    rs = records.RealServer(get_rs_dict())
+    check("test dict access([])", '192.168.100.10', rs[const.SERVER_IP])
+    check("test dict access(get)", 5, rs.get(const.WEIGHT))
+    check("test dict access(get not field)", 'x', rs.get('foo', 'x'))
+    check("test dict access(in)", (True, False),
+          (const.WEIGHT in rs, 'foo' in rs))
+    check_raises("test dict access([] not field)", KeyError,
+                 lambda: rs['foo'])
+    check_raises("test dict access(set not field)", KeyError,
+                 rs.__setitem__, 'foo', 1)
+    rs[const.WEIGHT] = None
+    check("test dict access(set None)", None, rs[const.WEIGHT])
+    check("test dict access(unset field)", None,
+          records.RealServer()[const.SERVER_IP])
+
+
+def test_update():
+    rs = records.RealServer(get_rs_dict())
+    rs.update({const.WEIGHT: '10', const.ADMIN_STATE_UP: False,
+               'foo': 'bar', const.VIRTUALSERVER: {}})
+    check("test update(fields)", (10, False),
+          (rs[const.WEIGHT], rs[const.ADMIN_STATE_UP]))
+    check("test update(non-field keys ignored)",
+          set(records.RealServer.__slots__), set(rs.to_dict()))
+    vs = records.VirtualServer({const.LISTEN_IP: '192.168.10.10',
+                                const.LISTEN_PORT: '8080'})
+    vs[const.REALSERVERS]['192.168.100.10:80'] = rs
+    vs.update({const.LISTEN_PORT: 8081, const.REALSERVERS: {}})
+    check("test update(vs real servers kept)", ['192.168.100.10:80'],
+          list(vs[const.REALSERVERS]))
+
+
+def test_coercion():
+    rs = records.RealServer(get_rs_dict())
+    check("test coercion(int)", [80, 5, 3, 3, 3],
+          [rs[k] for k in (const.SERVER_PORT, const.WEIGHT, const.TIMEOUT,
+                           const.MAX_RETRIES, const.DELAY)])
+    ip = ''.join(['192.168.', '100.10'])
+    other = records.RealServer(get_rs_dict(ip))
+    check("test coercion(intern)", True,
+          rs[const.SERVER_IP] is other[const.SERVER_IP])
+    vs = records.VirtualServer({
+        const.LISTEN_IP: u'192.168.10.10', const.LISTEN_PORT: u'8080',
+        const.SCHEDULER: u'sh', const.FORWARD_METHOD: u'DR'})
+    check("test coercion(vs)", (8080, str, str),
+          (vs[const.LISTEN_PORT], type(vs[const.LISTEN_IP]),
+           type(vs[const.SCHEDULER])))
+
+
+def test_round_trip():
+    vs = records.VirtualServer({
+        const.LISTEN_IP: '192.168.10.10', const.LISTEN_PORT: 8080,
+        const.SCHEDULER: const.IPVS_SOURCE_HASHING,
+        const.FORWARD_METHOD: const.DR, const.ADMIN_STATE_UP: True})
+    for ip in ('192.168.100.10', '192.168.100.11'):
+        vs[const.REALSERVERS]['%s:80' % ip] = records.RealServer(
+            get_rs_dict(ip))
+    vs_dict = vs.to_dict()
+    check("test round trip(to_dict)", dict,
+          type(vs_dict[const.REALSERVERS]['192.168.100.10:80']))
+    loaded = records.VirtualServer.from_dict(
+        jsonutils.loads(jsonutils.dumps(vs_dict)))
+    check("test round trip(from_dict)", vs_dict, loaded.to_dict())
+    check("test round trip(rs records)", records.RealServer,
+          type(loaded[const.REALSERVERS]['192.168.100.11:80']))
+    check("test round trip(pickle)", vs_dict,
+          pickle.loads(pickle.dumps(vs, 2)).to_dict())
+
+
+if __name__ == '__main__':
+    for func in sorted(dir()):
+        if func.startswith('test_'):
+            globals()[func]()
@@ -0,0 +1,94 @@
+#!/usr/bin/python2.7
+
+import os
+import time
+
+import eventlet
+
+from networking_ipvs.drivers.keepalived import reloader
+
+WINDOW = 0.05
+MAX_DELAY = 0.2
+
+
+class FakeReload(object):
+    def __init__(self, failures=0):
+        self.calls = []
+        self.failures = failures
+
+    def __call__(self):
+        self.calls.append(time.time())
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('reload failed')
+
+
+def check(task_msg, expected, observed):
+    if expected != observed:
+        print(task_msg + "....failed")
+        print('observed: %s\nexpected: %s' % (observed, expected))
+        os.sys.exit(1)
+    print(task_msg + "....passed")
+
+
+def test_coalesce_burst():
+    reload_func = FakeReload()
+    scheduler = reloader.ReloadScheduler(reload_func, WINDOW, MAX_DELAY)
+    for i in range(10):
+        scheduler.schedule()
+    check("test reloader coalesce burst(pending)", 0, len(reload_func.calls))
+    eventlet.sleep(WINDOW * 3)
+    check("test reloader coalesce burst(reloaded)", 1,
+          len(reload_func.calls))
+    stats = scheduler.get_stats()
+    check("test reloader coalesce burst(stats)",
+          (10, 1, 9, False),
+          (stats['reload_requested'], stats['reload_issued'],
+           stats['reload_coalesced'], stats['reload_pending']))
+
+
+def test_max_delay():
+    reload_func = FakeReload()
+    scheduler = reloader.ReloadScheduler(reload_func, WINDOW, MAX_DELAY)
+    start = time.time()
+    # requests keep arriving within window, reload is not deferred forever
+    while time.time() - start < MAX_DELAY * 2:
+        scheduler.schedule()
+        eventlet.sleep(WINDOW / 5)
+    check("test reloader max delay(reloaded)", True,
+          len(reload_func.calls) >= 1)
+    check("test reloader max delay(deferred)", True,
+          reload_func.calls[0] - start < MAX_DELAY + WINDOW)
+
+
+def test_retry_failed():
+    reload_func = FakeReload(failures=1)
+    scheduler = reloader.ReloadScheduler(reload_func, WINDOW, MAX_DELAY)
+    scheduler.schedule()
+    eventlet.sleep(WINDOW * 3)
+    check("test reloader retry failed(failed)", True,
+          scheduler.get_stats()['reload_pending'])
+    eventlet.sleep(MAX_DELAY * 2)
+    stats = scheduler.get_stats()
+    check("test reloader retry failed(retried)",
+          (2, 1, False),
+          (len(reload_func.calls), stats['reload_failed'],
+           stats['reload_pending']))
+
+
+def test_flush():
+    reload_func = FakeReload()
+    scheduler = reloader.ReloadScheduler(reload_func, WINDOW, MAX_DELAY)
+    scheduler.flush()
+    check("test reloader flush(nothing pending)", 0, len(reload_func.calls))
+    scheduler.schedule()
+    scheduler.flush()
+    check("test reloader flush(pending)", 1, len(reload_func.calls))
+    eventlet.sleep(WINDOW * 3)
+    check("test reloader flush(timer canceled)", 1, len(reload_func.calls))
+
+
+if __name__ == '__main__':
+    for func in sorted(dir()):
+        if func.startswith('test_'):
+            globals()[func]()
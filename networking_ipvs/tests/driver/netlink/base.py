@@ -0,0 +1,141 @@
+#!/usr/bin/python2.7
+
+import errno
+import os
+import struct
+
+from networking_ipvs.common import constants as const
+from networking_ipvs.drivers.common import ipvs_table
+from networking_ipvs.drivers.common import netlink
+from networking_ipvs.drivers.netlink import ipvs_netlink as ipvs_nl
+from networking_ipvs.tests.driver.keepalived import base as kbase
+
+
+class FakeIPVSError(Exception):
+    def __init__(self, error):
+        self.errno = error
+
+
+class FakeIPVSSocket(object):
+    """Generic netlink socket with a fake IPVS in kernel behind it"""
+
+    FAMILY_ID = 0x20
+
+    def __init__(self):
+        self.services = {}
+        self._replies = []
+
+    def close(self):
+        pass
+
+    def recv(self, bufsize):
+        if not self._replies:
+            return b''
+        return self._replies.pop(0)
+
+    def send(self, data):
+        for msg_type, flags, seq, payload in netlink.parse_messages(data):
+            dump = flags & netlink.NLM_F_DUMP == netlink.NLM_F_DUMP
+            try:
+                replies = self._handle(msg_type, payload, dump)
+                error = 0
+            except FakeIPVSError as e:
+                replies, error = [], e.errno
+            if dump and not error:
+                for reply in replies:
+                    self._replies.append(netlink.pack_message(
+                        msg_type, netlink.NLM_F_MULTI, seq, reply))
+                self._replies.append(netlink.pack_message(
+                    netlink.NLMSG_DONE, netlink.NLM_F_MULTI, seq,
+                    struct.pack('=i', 0)))
+                continue
+            for reply in replies:
+                self._replies.append(
+                    netlink.pack_message(msg_type, 0, seq, reply))
+            self._replies.append(netlink.pack_message(
+                netlink.NLMSG_ERROR, 0, seq,
+                struct.pack('=i', -error) + data[:netlink.NLMSG_HDR.size]))
+        return len(data)
+
+    def _handle(self, msg_type, payload, dump):
+        cmd, attrs = ipvs_nl.parse_genl(payload)
+        if msg_type == ipvs_nl.GENL_ID_CTRL:
+            return [ipvs_nl.GENL_HDR.pack(1, 1, 0) + netlink.pack_u16(
+                ipvs_nl.CTRL_ATTR_FAMILY_ID, self.FAMILY_ID)]
+        if msg_type != self.FAMILY_ID:
+            raise FakeIPVSError(errno.ENOENT)
+        if cmd == ipvs_nl.IPVS_CMD_GET_SERVICE and dump:
+            return [ipvs_nl.pack_genl(
+                ipvs_nl.IPVS_CMD_NEW_SERVICE,
+                ipvs_nl.pack_service(key, svc[const.SCHEDULER]))
+                for key, svc in self.services.items()]
+        svc_attrs = netlink.parse_attrs(attrs[ipvs_nl.IPVS_CMD_ATTR_SERVICE])
+        key = (ipvs_nl.unpack_addr(svc_attrs[ipvs_nl.IPVS_SVC_ATTR_ADDR]),
+               netlink.unpack_be16(svc_attrs[ipvs_nl.IPVS_SVC_ATTR_PORT]))
+        svc = self.services.get(key)
+        if cmd == ipvs_nl.IPVS_CMD_NEW_SERVICE:
+            if svc:
+                raise FakeIPVSError(errno.EEXIST)
+            self.services[key] = {
+                const.SCHEDULER: netlink.unpack_string(
+                    svc_attrs[ipvs_nl.IPVS_SVC_ATTR_SCHED_NAME]),
+                ipvs_table.DESTS: {}}
+            return []
+        if not svc:
+            raise FakeIPVSError(errno.ESRCH)
+        if cmd == ipvs_nl.IPVS_CMD_SET_SERVICE:
+            svc[const.SCHEDULER] = netlink.unpack_string(
+                svc_attrs[ipvs_nl.IPVS_SVC_ATTR_SCHED_NAME])
+            return []
+        if cmd == ipvs_nl.IPVS_CMD_DEL_SERVICE:
+            self.services.pop(key)
+            return []
+        dests = svc[ipvs_table.DESTS]
+        if cmd == ipvs_nl.IPVS_CMD_GET_DEST and dump:
+            return [ipvs_nl.pack_genl(
+                ipvs_nl.IPVS_CMD_NEW_DEST,
+                ipvs_nl.pack_dest(dest, *dests[dest])) for dest in dests]
+        dest_attrs = netlink.parse_attrs(attrs[ipvs_nl.IPVS_CMD_ATTR_DEST])
+        dest = (ipvs_nl.unpack_addr(dest_attrs[ipvs_nl.IPVS_DEST_ATTR_ADDR]),
+                netlink.unpack_be16(dest_attrs[ipvs_nl.IPVS_DEST_ATTR_PORT]))
+        if cmd == ipvs_nl.IPVS_CMD_NEW_DEST and dest in dests:
+            raise FakeIPVSError(errno.EEXIST)
+        if cmd != ipvs_nl.IPVS_CMD_NEW_DEST and dest not in dests:
+            raise FakeIPVSError(errno.ENOENT)
+        if cmd == ipvs_nl.IPVS_CMD_DEL_DEST:
+            dests.pop(dest)
+        else:
+            dests[dest] = (
+                ipvs_nl.FORWARD_METHOD_NAMES[netlink.unpack_u32(
+                    dest_attrs[ipvs_nl.IPVS_DEST_ATTR_FWD_METHOD])],
+                netlink.unpack_u32(
+                    dest_attrs[ipvs_nl.IPVS_DEST_ATTR_WEIGHT]))
+        return []
+
+
+def assert_service(ipvs, vs_info, all_rs):
+    key = (vs_info[const.LISTEN_IP], int(vs_info[const.LISTEN_PORT]))
+    expected = None
+    if vs_info.get(const.ADMIN_STATE_UP, True) and all_rs:
+        expected = {
+            const.SCHEDULER: vs_info[const.SCHEDULER],
+            ipvs_table.DESTS: {
+                (rs[const.SERVER_IP], int(rs[const.SERVER_PORT])): (
+                    vs_info[const.FORWARD_METHOD], int(rs[const.WEIGHT]))
+                for rs in all_rs if rs.get(const.ADMIN_STATE_UP, True)}}
+    observed = ipvs.services.get(key)
+    if observed != expected:
+        raise AssertionError('observed: %s\nexpected: %s' % (
+            observed, expected))
+
+
+def common_assert(ipvs, vs_info, all_rs, task_msg, vip_exists=True):
+    kbase.common_assert(vs_info, all_rs, task_msg, vip_exists)
+    try:
+        assert_service(ipvs, vs_info, all_rs)
+    except AssertionError as e:
+        print task_msg + ".assert_service....failed"
+        print e.message
+        os.sys.exit(1)
+    else:
+        print task_msg + ".assert_service....passed"
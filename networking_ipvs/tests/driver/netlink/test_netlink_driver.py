@@ -0,0 +1,69 @@
+import os
+
+from networking_ipvs.common import constants as const
+from networking_ipvs.drivers.common import ipvs_table
+from networking_ipvs.drivers.netlink import ipvs_netlink
+from networking_ipvs.drivers.netlink import netlink_driver
+from networking_ipvs.tests.driver.keepalived import base as kbase
+from networking_ipvs.tests.driver.netlink import base
+
+# a service not managed by agent, it should be left in kernel
+FOREIGN_SERVICE = ('10.255.255.1', 80)
+
+
+class IPVSDriver(netlink_driver.IPVSDriver):
+
+    def __init__(self, context, plugin):
+        conf = kbase.conf
+        plugin_rpc = kbase.FakeRPC(context, plugin)
+        kbase.cleanup()
+        self.fake_socket = base.FakeIPVSSocket()
+        self.fake_socket.services[FOREIGN_SERVICE] = {
+            const.SCHEDULER: 'rr', ipvs_table.DESTS: {}}
+        super(IPVSDriver, self).__init__(conf, plugin_rpc)
+
+    def _get_ipvs_client(self):
+        return ipvs_netlink.IPVSNetlink(self.fake_socket)
+
+    def assert_init(self, vs_info, all_rs, task_msg):
+        base.common_assert(self.fake_socket, vs_info, all_rs, task_msg)
+        if FOREIGN_SERVICE not in self.fake_socket.services:
+            print task_msg + ".assert_foreign_service....failed"
+            os.sys.exit(1)
+        print task_msg + ".assert_foreign_service....passed"
+
+    def assert_create_rs(self, vs_info, all_rs, task_msg):
+        base.common_assert(self.fake_socket, vs_info, all_rs, task_msg)
+
+    def assert_update_rs(self, vs_info, all_rs, task_msg):
+        base.common_assert(self.fake_socket, vs_info, all_rs, task_msg)
+
+    def assert_update_rs_down(self, vs_info, all_rs, task_msg):
+        base.common_assert(self.fake_socket, vs_info, all_rs, task_msg)
+
+    def assert_update_rs_up(self, vs_info, all_rs, task_msg):
+        base.common_assert(self.fake_socket, vs_info, all_rs, task_msg)
+
+    def assert_delete_rs(self, vs_info, all_rs, task_msg):
+        base.common_assert(self.fake_socket, vs_info, all_rs, task_msg)
+
+    def assert_update_vs(self, vs_info, all_rs, task_msg):
+        base.common_assert(self.fake_socket, vs_info, all_rs, task_msg)
+
+    def assert_update_vs_down(self, vs_info, all_rs, task_msg):
+        base.common_assert(self.fake_socket, vs_info, all_rs, task_msg,
+                           vip_exists=False)
+
+    def assert_update_vs_up(self, vs_info, all_rs, task_msg):
+        base.common_assert(self.fake_socket, vs_info, all_rs, task_msg)
+
+    def assert_delete_vs(self, vs_info, task_msg):
+        base.common_assert(self.fake_socket, vs_info, [], task_msg,
+                           vip_exists=False)
+
+    def assert_duplicate_notification(self, vs_info, all_rs, stats,
+                                      file_stat, task_msg):
+        base.common_assert(self.fake_socket, vs_info, all_rs, task_msg)
+        kbase.assert_replayed(self, vs_info, stats, file_stat, task_msg,
+                              vs_conf_writes=0, vs_conf_writes_skipped=1,
+                              ipvs_batches=0)
@@ -10,6 +10,7 @@ from networking_ipvs.common import template
 from networking_ipvs.drivers.keepalived import keepalived_driver
 from networking_ipvs.drivers.keepalived import utils
 import networking_ipvs.plugin
+from networking_ipvs.tests.driver.keepalived import base as kbase
 from networking_ipvs.tests.plugin import base
 from networking_ipvs.tests.plugin import test_plugin as ptest
 
@@ -43,8 +44,6 @@ class TestDriver(object):
         self.plugin._db_create = wrapped_db_ops(self.plugin._db_create)
         self.plugin._db_update = wrapped_db_ops(self.plugin._db_update)
         self.plugin._db_delete = wrapped_db_ops(self.plugin._db_delete)
-        self.plugin._update_revisions = wrapped_db_ops(
-            self.plugin._update_revisions)
         self.driver = driver_cls(self.context, self.plugin)
 
     def run(self, single_test=None):
@@ -421,3 +420,49 @@ class TestDriver(object):
         self.driver.assert_update_vs_up(
             vs, all_rs, ptest.task_msg(
                 "test update subresource changed during vs down(up)"))
+
+    @dispatch
+    @cleanup
+    def test_duplicate_notification(self):
+        lb = self.init_lb()
+        vs_info = lb[1]
+        all_rs = vs_info.get(const.REALSERVERS)
+        self.plugin.update_ipvs_realserver(
+            self.context, all_rs[0]['id'], {const.IPVS_REALSERVER: {
+                const.WEIGHT: 123}})
+        all_rs[0][const.WEIGHT] = 123
+        method, data = _NOTIFICATIONS.pop()
+        del _NOTIFICATIONS[:]
+        replayed = copy.deepcopy(data)
+        getattr(self.driver, method)(None, data)
+        stats = self.driver.get_stats()
+        file_stat = kbase.get_vs_file_stat(vs_info)
+        # redelivered as it is, then as from a plugin without revisions
+        getattr(self.driver, method)(None, copy.deepcopy(replayed))
+        replayed.pop(const.REVISION, None)
+        getattr(self.driver, method)(None, replayed)
+        self.driver.assert_duplicate_notification(
+            vs_info, all_rs, stats, file_stat,
+            ptest.task_msg("test duplicate notification"))
+
+    @dispatch
+    @cleanup
+    def test_catch_up_lost_notification(self):
+        lb = self.init_lb()
+        self.driver.catch_up()
+        rs = lb[0][const.REALSERVERS][0]
+        # notification of this update is lost
+        self.plugin.update_ipvs_realserver(
+            self.context, rs['id'], {const.IPVS_REALSERVER: {
+                const.WEIGHT: 123}})
+        del _NOTIFICATIONS[:]
+        rs[const.WEIGHT] = 123
+        # a later notification on another vip doesn't skip the lost one
+        self.update_rs(lb[1][const.REALSERVERS][0]['id'], w=124)
+        lb[1][const.REALSERVERS][0][const.WEIGHT] = 124
+        self.driver.catch_up()
+        for i in range(len(lb)):
+            self.driver.assert_update_rs(
+                lb[i], lb[i][const.REALSERVERS],
+                ptest.task_msg("test catch up lost notification"
+                               "(vs %s)" % i))
@@ -85,6 +85,7 @@ def db_init():
     resource_types = sa.Enum(*const.SUPPORTED_RESOURCE_TYPES)
     schedulers = sa.Enum(*const.DB_SUPPORTED_SCHEDULERS)
     forward_methods = sa.Enum(*const.SUPPORTED_FORWARD_METHODS)
+    operations = sa.Enum(*const.SUPPORTED_ACTIONS)
 
     # create table ipvs_revisions in context engine sqlite://
     metadata = sa.MetaData()
@@ -138,7 +139,31 @@ def db_init():
              sa.Column('created_at', sa.DateTime(), nullable=True),
              sa.Column('updated_at', sa.DateTime(), nullable=True),
              sa.Column('deleted_at', sa.DateTime(), nullable=True),
-             sa.Column('extra', sa.String(128)))
+             sa.Column('last_changed_at', sa.DateTime(), nullable=True),
+             sa.Column('seq', sa.BigInteger(), nullable=True),
+             sa.Column('extra', sa.String(128)),
+             sa.Column('digest', sa.String(64)))
+    sa.Table('ipvs_revision_watermarks', metadata,
+             sa.Column('name', sa.String(36), primary_key=True),
+             sa.Column('watermark', sa.DateTime(), nullable=False),
+             sa.Column('seq', sa.BigInteger(), nullable=False,
+                       server_default='0'))
+    sa.Table('ipvs_revision_logs', metadata,
+             sa.Column('seq', sa.BigInteger(), primary_key=True,
+                       autoincrement=False),
+             sa.Column('resource_type', resource_types, nullable=False),
+             sa.Column('resource_id', sa.String(36), nullable=False),
+             sa.Column('operation', operations, nullable=False),
+             sa.Column('payload', sa.Text()),
+             sa.Column('created_at', sa.DateTime(), nullable=False))
+    sa.Table('ipvs_revision_snapshots', metadata,
+             sa.Column('seq', sa.BigInteger(), primary_key=True,
+                       autoincrement=False),
+             sa.Column('chunk', sa.Integer(), primary_key=True,
+                       autoincrement=False),
+             sa.Column('chunks', sa.Integer(), nullable=False),
+             sa.Column('data', sa.LargeBinary(), nullable=False),
+             sa.Column('created_at', sa.DateTime(), nullable=False))
     sa.Table('ipvs_quotas', metadata,
              sa.Column('tenant_id', sa.String(36), primary_key=True),
              sa.Column('quota_type', resource_types, primary_key=True),
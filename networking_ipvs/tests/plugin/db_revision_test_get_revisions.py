@@ -15,7 +15,8 @@ from networking_ipvs.db import revisions
 context = ncontext.get_admin_context()
 resource_types = sa.Enum(*const.SUPPORTED_RESOURCE_TYPES)
 
-# create table ipvs_revisions in context engine sqlite://
+# create table ipvs_revisions and ipvs_revision_watermarks in context engine
+# sqlite://
 metadata = sa.MetaData()
 sa.Table('ipvs_revisions', metadata,
          sa.Column('id', sa.String(36), primary_key=True),
@@ -24,7 +25,14 @@ sa.Table('ipvs_revisions', metadata,
          sa.Column('created_at', sa.DateTime(), nullable=True),
          sa.Column('updated_at', sa.DateTime(), nullable=True),
          sa.Column('deleted_at', sa.DateTime(), nullable=True),
+         sa.Column('last_changed_at', sa.DateTime(), nullable=True),
+         sa.Column('seq', sa.BigInteger(), nullable=True),
          sa.Column('extra', sa.String(128)))
+sa.Table('ipvs_revision_watermarks', metadata,
+         sa.Column('name', sa.String(36), primary_key=True),
+         sa.Column('watermark', sa.DateTime(), nullable=False),
+         sa.Column('seq', sa.BigInteger(), nullable=False,
+                   server_default='0'))
 metadata.create_all(context.session.get_bind())
 
 # c: created_at, u: updated_at, d: deleted_at, s:start, \:no
@@ -84,6 +92,11 @@ cases_ts = [
 
 res_ids = [uuidutils.generate_uuid() for i in range(16)]
 parent_ids = [uuidutils.generate_uuid() for i in range(16)]
+last_changed = [max(ts for ts in cases_ts[i] if ts) for i in range(16)]
+# seq is given in order of last change
+seqs = [0] * 16
+for seq, i in enumerate(sorted(range(16), key=lambda i: last_changed[i])):
+    seqs[i] = seq + 1
 
 db_data_list = [
     {
@@ -93,6 +106,8 @@ db_data_list = [
          'created_at': cases_ts[i][0],
          'updated_at': cases_ts[i][1],
          'deleted_at': cases_ts[i][2],
+         'last_changed_at': last_changed[i],
+         'seq': seqs[i],
          'extra': '',
     }
     for i in range(16)
@@ -105,3 +120,29 @@ revs = rev_db.get_revisions(context, str(t0), None)
 rev_cases = [res_ids.index(rev[3]) for rev in revs]
 rev_cases.sort()
 assert rev_cases == valid_cases
+
+# paging should return revisions changed after start seq in seq order, each
+# one only once
+start_seq = len([ts for ts in last_changed if ts < t0])
+paged_revs = []
+marker = None
+while True:
+    page = rev_db.get_revisions_page(context, start_seq, None, 2, marker)
+    assert len(page['revisions']) <= 2
+    paged_revs.extend(page['revisions'])
+    marker = page['next_marker']
+    if not marker:
+        break
+assert [rev[-1] for rev in paged_revs] == range(start_seq + 1, 17)
+paged_cases = [res_ids.index(rev[3]) for rev in paged_revs]
+assert sorted(paged_cases) == [i for i in range(16) if last_changed[i] > t0]
+
+# compaction removes revisions deleted before watermark, and starts older
+# than removed revisions should get a resync
+removed_seq = max(seqs[i] for i in range(16)
+                  if cases_ts[i][2] and cases_ts[i][2] < t2)
+assert rev_db.compact_revisions(context, t2) == 4
+page = rev_db.get_revisions_page(context, removed_seq - 1, None, 100)
+assert page['resync'] and page['watermark'] == removed_seq
+page = rev_db.get_revisions_page(context, removed_seq, None, 100)
+assert not page.get('resync')
@@ -1,15 +1,20 @@
 #!/usr/bin/python2.7
 
+import base64
 import datetime
 import hashlib
+import zlib
 
+from oslo_serialization import jsonutils
 from oslo_utils import uuidutils
 
 from networking_ipvs.common import constants as const
+from networking_ipvs.common import digest
 from networking_ipvs.common import exceptions as ipvs_exc
 from networking_ipvs.common import rpc
 from networking_ipvs.common import template
 from networking_ipvs.common import utils as ipvs_utils
+from networking_ipvs.db import revisions
 from networking_ipvs import plugin
 from networking_ipvs.tests.plugin import base
 from networking_ipvs.tests.plugin import assert_helper as helper
@@ -51,7 +56,6 @@ ipvs_plugin = plugin.NetworkingIPVSPlugin()
 ipvs_plugin._db_create = wrapped_db_ops(ipvs_plugin._db_create)
 ipvs_plugin._db_update = wrapped_db_ops(ipvs_plugin._db_update)
 ipvs_plugin._db_delete = wrapped_db_ops(ipvs_plugin._db_delete)
-ipvs_plugin._update_revisions = wrapped_db_ops(ipvs_plugin._update_revisions)
 
 
 def get_vs_info(vs_id):
@@ -240,6 +244,10 @@ def get_deleted_at(_id):
     return ipvs_plugin._get_revision(context, _id).deleted_at
 
 
+def get_seq(_id):
+    return ipvs_plugin._get_revision(context, _id).seq
+
+
 def get_vs_extra(vs):
     return '%s:%s-:' % (vs[const.LISTEN_IP], vs[const.LISTEN_PORT])
 
@@ -254,6 +262,10 @@ def get_vs_md5(vs_info, all_rs):
         vs_template.get_virtualserver_conf(vs_info, all_rs)).hexdigest()
 
 
+def get_vs_digest(vs_info, all_rs):
+    return digest.get_digest(vs_info, all_rs)
+
+
 def now():
     return datetime.datetime.utcnow()
 
@@ -326,12 +338,15 @@ def test_rs_creation(gb):
 
     gb.crt_rs = init_rs(vs['id'])
     md5 = get_vs_md5(vs_info, [gb.crt_rs])
+    vs_digest = get_vs_digest(vs_info, [gb.crt_rs])
     gb.rev_1 = (vs['id'], vs_created_at, None, None, md5)
     expected_meth = 'create_realserver'
     expected_data = get_rs_notify_body(vs_info, gb.crt_rs)
     update_rs_create_notify(expected_data, vs_info, gb.crt_rs)
     ts = get_created_at(gb.crt_rs['id'])
-    expected_data.update({const.TIMESTAMP: ts, const.MD5: md5})
+    expected_data.update({const.TIMESTAMP: ts, const.MD5: md5,
+                          const.DIGEST: vs_digest,
+                          const.REVISION: get_seq(gb.crt_rs['id'])})
     gb.ntf_1 = (0, expected_meth, expected_data)
     gb.rev_2 = (gb.crt_rs['id'], ts, None, None, None)
 
@@ -354,12 +369,15 @@ def test_rs_creation_exception(gb):
     except Exception as e:
         gb.expt_1 = (e, ipvs_exc.RealServerEntityExists)
     md5 = get_vs_md5(vs_info, [gb.crt_rs])
+    vs_digest = get_vs_digest(vs_info, [gb.crt_rs])
     gb.rev_1 = (vs['id'], vs_created_at, None, None, md5)
     expected_meth = 'create_realserver'
     expected_data = get_rs_notify_body(vs_info, gb.crt_rs)
     update_rs_create_notify(expected_data, vs_info, gb.crt_rs)
     ts = get_created_at(gb.crt_rs['id'])
-    expected_data.update({const.TIMESTAMP: ts, const.MD5: md5})
+    expected_data.update({const.TIMESTAMP: ts, const.MD5: md5,
+                          const.DIGEST: vs_digest,
+                          const.REVISION: get_seq(gb.crt_rs['id'])})
     gb.ntf_1 = (0, expected_meth, expected_data)
     gb.rev_2 = (gb.crt_rs['id'], ts, None, None, None)
 
@@ -381,7 +399,9 @@ def test_rs_creation_same_rs_on_two_vs(gb):
     gb.crt_rs1 = init_rs(vs1['id'])
     gb.crt_rs2 = init_rs(vs2['id'])
     md51 = get_vs_md5(vs1_info, [gb.crt_rs1])
+    digest1 = get_vs_digest(vs1_info, [gb.crt_rs1])
     md52 = get_vs_md5(vs2_info, [gb.crt_rs2])
+    digest2 = get_vs_digest(vs2_info, [gb.crt_rs2])
     gb.rev_1 = (vs1['id'], vs_created_at, None, None, md51)
     gb.rev_2 = (vs2['id'], vs_created_at, None, None, md52)
     expected_meth = 'create_realserver'
@@ -391,8 +411,12 @@ def test_rs_creation_same_rs_on_two_vs(gb):
     update_rs_create_notify(expected_data2, vs2_info, gb.crt_rs2)
     ts1 = get_created_at(gb.crt_rs1['id'])
     ts2 = get_created_at(gb.crt_rs2['id'])
-    expected_data1.update({const.TIMESTAMP: ts1, const.MD5: md51})
-    expected_data2.update({const.TIMESTAMP: ts2, const.MD5: md52})
+    expected_data1.update({const.TIMESTAMP: ts1, const.MD5: md51,
+                           const.DIGEST: digest1,
+                           const.REVISION: get_seq(gb.crt_rs1['id'])})
+    expected_data2.update({const.TIMESTAMP: ts2, const.MD5: md52,
+                           const.DIGEST: digest2,
+                           const.REVISION: get_seq(gb.crt_rs2['id'])})
     gb.ntf_1 = (0, expected_meth, expected_data1)
     gb.ntf_2 = (1, expected_meth, expected_data2)
     gb.rev_3 = (gb.crt_rs1['id'], ts1, None, None, None)
@@ -555,17 +579,20 @@ def test_update_lb_down_with_vs_with_rs(gb):
     vs_info = get_vs_info(vs['id'])
     rs = ipvs_plugin.get_ipvs_realserver(context, rs['id'])
     md5 = get_vs_md5(vs_info, [rs])
+    vs_digest = get_vs_digest(vs_info, [rs])
     gb.rev_1 = (lb['id'], created_at, updated_at, None, None)
     gb.rev_2 = (vs_info['id'], created_at, updated_at, None, md5)
     gb.rev_3 = (rs['id'], created_at, updated_at, None, None)
     expected_meth = 'update_virtualservers'
     expected_data = {
         const.TIMESTAMP: get_updated_at(lb['id']),
+        const.REVISION: get_seq(lb['id']),
         const.ADMIN_STATE_UP: False,
         const.VIRTUALSERVERS: {
             vs_info['id']: {k: vs_info[k] for k in (
                 const.ID, const.LISTEN_IP, const.LISTEN_PORT)}}}
-    expected_data[const.VIRTUALSERVERS][vs_info['id']][const.MD5] = md5
+    expected_data[const.VIRTUALSERVERS][vs_info['id']].update({
+        const.MD5: md5, const.DIGEST: vs_digest})
     gb.ntf_1 = (1, expected_meth, expected_data)
 
 
@@ -632,11 +659,17 @@ def test_update_lb_down_with_6_vs_with_6_rs(gb):
     rs5 = ipvs_plugin.get_ipvs_realserver(context, rs5['id'])
     rs6 = ipvs_plugin.get_ipvs_realserver(context, rs6['id'])
     md51 = get_vs_md5(vs1_info, [rs1, rs2])
+    digest1 = get_vs_digest(vs1_info, [rs1, rs2])
     md52 = get_vs_md5(vs2_info, [rs3])
+    digest2 = get_vs_digest(vs2_info, [rs3])
     md53 = get_vs_md5(vs3_info, [])
+    digest3 = get_vs_digest(vs3_info, [])
     md54 = get_vs_md5(vs4_info, [rs4, rs5])
+    digest4 = get_vs_digest(vs4_info, [rs4, rs5])
     md55 = get_vs_md5(vs5_info, [rs6])
+    digest5 = get_vs_digest(vs5_info, [rs6])
     md56 = get_vs_md5(vs6_info, [])
+    digest6 = get_vs_digest(vs6_info, [])
     gb.rev_1 = (lb['id'], created_at, updated_at, None, None)
     gb.rev_2 = (vs1_info['id'], created_at, updated_at, None, md51)
     gb.rev_3 = (vs2_info['id'], created_at, updated_at, None, md52)
@@ -653,6 +686,7 @@ def test_update_lb_down_with_6_vs_with_6_rs(gb):
     expected_meth = 'update_virtualservers'
     expected_data = {
         const.TIMESTAMP: get_updated_at(lb['id']),
+        const.REVISION: get_seq(lb['id']),
         const.ADMIN_STATE_UP: False,
         const.VIRTUALSERVERS: {
             vs['id']: {k: vs[k] for k in (const.ID, const.LISTEN_IP,
@@ -660,11 +694,17 @@ def test_update_lb_down_with_6_vs_with_6_rs(gb):
             for vs in (vs1_info, vs2_info, vs3_info, vs4_info, vs5_info,
                        vs6_info)}}
     expected_data[const.VIRTUALSERVERS][vs1_info['id']][const.MD5] = md51
+    expected_data[const.VIRTUALSERVERS][vs1_info['id']][const.DIGEST] = digest1
     expected_data[const.VIRTUALSERVERS][vs2_info['id']][const.MD5] = md52
+    expected_data[const.VIRTUALSERVERS][vs2_info['id']][const.DIGEST] = digest2
     expected_data[const.VIRTUALSERVERS][vs3_info['id']][const.MD5] = md53
+    expected_data[const.VIRTUALSERVERS][vs3_info['id']][const.DIGEST] = digest3
     expected_data[const.VIRTUALSERVERS][vs4_info['id']][const.MD5] = md54
+    expected_data[const.VIRTUALSERVERS][vs4_info['id']][const.DIGEST] = digest4
     expected_data[const.VIRTUALSERVERS][vs5_info['id']][const.MD5] = md55
+    expected_data[const.VIRTUALSERVERS][vs5_info['id']][const.DIGEST] = digest5
     expected_data[const.VIRTUALSERVERS][vs6_info['id']][const.MD5] = md56
+    expected_data[const.VIRTUALSERVERS][vs6_info['id']][const.DIGEST] = digest6
     gb.ntf_1 = (3, expected_meth, expected_data)
 
 
@@ -710,18 +750,21 @@ def test_update_lb_up_with_vs_with_rs(gb):
     vs_info = get_vs_info(vs['id'])
     rs = ipvs_plugin.get_ipvs_realserver(context, rs['id'])
     md5 = get_vs_md5(vs_info, [rs])
+    vs_digest = get_vs_digest(vs_info, [rs])
     gb.rev_1 = (lb['id'], created_at, updated_at, None, None)
     gb.rev_2 = (vs['id'], created_at, updated_at, None, md5)
     gb.rev_3 = (rs['id'], created_at, updated_at, None, None)
     expected_meth = 'update_virtualservers'
     expected_data = {
         const.TIMESTAMP: get_updated_at(lb['id']),
+        const.REVISION: get_seq(lb['id']),
         const.ADMIN_STATE_UP: True,
         const.VIRTUALSERVERS: {
             vs_info['id']: {k: vs_info[k] for k in [
                 const.ID, const.LISTEN_IP,
                 const.LISTEN_PORT] + const.VIRTUALSERVER_NOTIFY_KEYS}}}
-    expected_data[const.VIRTUALSERVERS][vs_info['id']][const.MD5] = md5
+    expected_data[const.VIRTUALSERVERS][vs_info['id']].update({
+        const.MD5: md5, const.DIGEST: vs_digest})
     expected_data[const.VIRTUALSERVERS][vs_info['id']][const.REALSERVERS] = [
         get_rs_update_notify(rs)]
     gb.ntf_1 = (0, expected_meth, expected_data)
@@ -811,6 +854,7 @@ def test_update_lb_up_with_6_vs_with_6_rs(gb):
     expected_meth = 'update_virtualservers'
     expected_data = {
         const.TIMESTAMP: get_updated_at(lb['id']),
+        const.REVISION: get_seq(lb['id']),
         const.ADMIN_STATE_UP: True,
         const.VIRTUALSERVERS: {
             vs['id']: {k: vs[k] for k in [
@@ -825,6 +869,8 @@ def test_update_lb_up_with_6_vs_with_6_rs(gb):
                             (vs5_info, md55, []),
                             (vs6_info, md56, [])):
         expected_data[const.VIRTUALSERVERS][vs['id']][const.MD5] = md5
+        expected_data[const.VIRTUALSERVERS][vs['id']][const.DIGEST] = (
+            get_vs_digest(vs, all_rs))
         expected_data[const.VIRTUALSERVERS][vs['id']][const.REALSERVERS] = [
             get_rs_update_notify(rs) for rs in all_rs]
     gb.ntf_1 = (0, expected_meth, expected_data)
@@ -963,6 +1009,7 @@ def test_update_vs_down_with_rs(gb):
     rs1 = ipvs_plugin.get_ipvs_realserver(context, rs1['id'])
     rs2 = ipvs_plugin.get_ipvs_realserver(context, rs2['id'])
     md5 = get_vs_md5(vs_info, [rs1, rs2])
+    vs_digest = get_vs_digest(vs_info, [rs1, rs2])
     gb.rev_1 = (vs['id'], created_at, updated_at, None, md5)
     gb.rev_2 = (rs1['id'], created_at, updated_at, None, None)
     gb.rev_3 = (rs2['id'], created_at, updated_at, None, None)
@@ -970,7 +1017,9 @@ def test_update_vs_down_with_rs(gb):
     expected_data = {k: vs_info[k] for k in [
         const.LISTEN_IP, const.LISTEN_PORT, const.ADMIN_STATE_UP]}
     expected_data.update({
-        const.MD5: md5, const.TIMESTAMP: get_updated_at(vs['id'])})
+        const.MD5: md5, const.TIMESTAMP: get_updated_at(vs['id']),
+        const.DIGEST: vs_digest,
+        const.REVISION: get_seq(vs['id'])})
     gb.ntf_1 = (1, expected_meth, expected_data)
 
 
@@ -1004,6 +1053,7 @@ def test_update_vs_up_with_rs(gb):
     rs1 = ipvs_plugin.get_ipvs_realserver(context, rs1['id'])
     rs2 = ipvs_plugin.get_ipvs_realserver(context, rs2['id'])
     md5 = get_vs_md5(vs_info, [rs1, rs2])
+    vs_digest = get_vs_digest(vs_info, [rs1, rs2])
     gb.rev_1 = (vs['id'], created_at, updated_at, None, md5)
     gb.rev_2 = (rs1['id'], created_at, updated_at, None, None)
     gb.rev_3 = (rs2['id'], created_at, updated_at, None, None)
@@ -1011,7 +1061,9 @@ def test_update_vs_up_with_rs(gb):
     expected_data = {k: vs_info[k] for k in [
         const.LISTEN_IP, const.LISTEN_PORT] + const.VIRTUALSERVER_NOTIFY_KEYS}
     expected_data.update({
-        const.MD5: md5, const.TIMESTAMP: get_updated_at(vs['id'])})
+        const.MD5: md5, const.TIMESTAMP: get_updated_at(vs['id']),
+        const.DIGEST: vs_digest,
+        const.REVISION: get_seq(vs['id'])})
     gb.ntf_1 = (0, expected_meth, expected_data)
 
 
@@ -1091,9 +1143,12 @@ def test_update_rs_notify_attr(gb):
     expected_meth = 'update_realserver'
     expected_data = get_rs_notify_body(vs_info, rs)
     md5 = get_vs_md5(vs_info, [rs])
+    vs_digest = get_vs_digest(vs_info, [rs])
     gb.rev_2 = (vs['id'], vs_created_at, None, None, md5)
     rs_updated_at = get_updated_at(rs['id'])
     expected_data.update({const.TIMESTAMP: rs_updated_at, const.MD5: md5,
+                          const.DIGEST: vs_digest,
+                          const.REVISION: get_seq(rs['id']),
                           const.WEIGHT: 2})
     gb.ntf_1 = (1, expected_meth, expected_data)
 
@@ -1168,10 +1223,13 @@ def test_update_rs_down(gb):
     expected_meth = 'update_realserver'
     expected_data = get_rs_notify_body(vs_info, rs)
     md5 = get_vs_md5(vs_info, [rs])
+    vs_digest = get_vs_digest(vs_info, [rs])
     gb.rev_2 = (vs['id'], vs_created_at, None, None, md5)
     rs_updated_at = get_updated_at(rs['id'])
     expected_data.update({const.ADMIN_STATE_UP: False, const.MD5: md5,
-                          const.TIMESTAMP: rs_updated_at})
+                          const.DIGEST: vs_digest,
+                          const.TIMESTAMP: rs_updated_at,
+                          const.REVISION: get_seq(rs['id'])})
     gb.ntf_1 = (1, expected_meth, expected_data)
 
 
@@ -1205,10 +1263,13 @@ def test_update_rs_down_with_exception(gb):
     expected_meth = 'update_realserver'
     expected_data = get_rs_notify_body(vs_info, rs)
     md5 = get_vs_md5(vs_info, [rs])
+    vs_digest = get_vs_digest(vs_info, [rs])
     gb.rev_2 = (vs['id'], vs_created_at, None, None, md5)
     rs_updated_at = get_updated_at(rs['id'])
     expected_data.update({const.ADMIN_STATE_UP: False, const.MD5: md5,
-                          const.TIMESTAMP: rs_updated_at})
+                          const.DIGEST: vs_digest,
+                          const.TIMESTAMP: rs_updated_at,
+                          const.REVISION: get_seq(rs['id'])})
     gb.ntf_1 = (1, expected_meth, expected_data)
 
 
@@ -1280,10 +1341,13 @@ def test_update_rs_up(gb):
     expected_meth = 'update_realserver'
     expected_data = get_rs_notify_body(vs_info, rs)
     md5 = get_vs_md5(vs_info, [rs])
+    vs_digest = get_vs_digest(vs_info, [rs])
     gb.rev_2 = (vs['id'], vs_created_at, None, None, md5)
     rs_updated_at = get_updated_at(rs['id'])
     update_rs_update_notify(expected_data, rs)
-    expected_data.update({const.MD5: md5, const.TIMESTAMP: rs_updated_at})
+    expected_data.update({const.MD5: md5, const.TIMESTAMP: rs_updated_at,
+                          const.DIGEST: vs_digest,
+                          const.REVISION: get_seq(rs['id'])})
     gb.ntf_1 = (0, expected_meth, expected_data)
 
 
@@ -1316,10 +1380,13 @@ def test_update_rs_up_with_exception(gb):
     expected_meth = 'update_realserver'
     expected_data = get_rs_notify_body(vs_info, rs)
     md5 = get_vs_md5(vs_info, [rs])
+    vs_digest = get_vs_digest(vs_info, [rs])
     gb.rev_2 = (vs['id'], vs_created_at, None, None, md5)
     rs_updated_at = get_updated_at(rs['id'])
     update_rs_update_notify(expected_data, rs)
-    expected_data.update({const.MD5: md5, const.TIMESTAMP: rs_updated_at})
+    expected_data.update({const.MD5: md5, const.TIMESTAMP: rs_updated_at,
+                          const.DIGEST: vs_digest,
+                          const.REVISION: get_seq(rs['id'])})
     gb.ntf_1 = (0, expected_meth, expected_data)
 
 
@@ -1455,6 +1522,7 @@ def test_force_delete_lb_with_vs_with_rs(gb):
                                    const.LISTEN_PORT]}
             for vs in (vs1, vs2)},
         const.TIMESTAMP: deleted_at,
+        const.REVISION: get_seq(lb['id']),
         const.ADMIN_STATE_UP: True}
     gb.ntf_1 = (1, expected_meth, expected_data)
 
@@ -1528,6 +1596,7 @@ def test_force_delete_vs_with_rs(gb):
     expected_meth = 'delete_virtualserver'
     expected_data = {k: vs[k] for k in [const.LISTEN_IP, const.LISTEN_PORT]}
     expected_data[const.TIMESTAMP] = deleted_at
+    expected_data[const.REVISION] = get_seq(vs['id'])
     gb.ntf_1 = (1, expected_meth, expected_data)
 
 
@@ -1631,3 +1700,140 @@ def test_quota_setting(gb):
     ipvs_plugin.create_ipvs_quota(
         context, base.quota_create_body(
             tenant_id, const.IPVS_VIRTUALSERVER, -2))
+
+
+@collect
+def test_get_virtualserver_details(gb):
+    lb = init_lb()
+    vs1 = init_vs(lb['id'], listen_port=8081)
+    vs2 = init_vs(lb['id'], listen_port=8082)
+    rs1 = init_rs(vs1['id'], '10.0.0.100')
+    rs2 = init_rs(vs1['id'], '10.0.0.200')
+    vs_ids = sorted([vs1['id'], vs2['id']])
+    ob = ipvs_plugin.get_virtualserver_details(context, vs_ids)
+    helper.assert_equals(ob['next_marker'], None,
+                         task_msg('get vs details in one page'))
+    obs = {vs[const.ID]: vs for vs in ob[const.VIRTUALSERVERS]}
+    helper.assert_equals(sorted(obs), vs_ids,
+                         task_msg('get vs details for all vs'))
+    helper.assert_equals(
+        sorted(rs[const.ID] for rs in obs[vs1['id']][const.REALSERVERS]),
+        sorted([rs1['id'], rs2['id']]),
+        task_msg('get vs details with realservers'))
+    helper.assert_equals(obs[vs2['id']][const.REALSERVERS], [],
+                         task_msg('get vs details without realservers'))
+    helper.assert_equals(
+        obs[vs1['id']][const.MD5],
+        ipvs_plugin._get_revision(context, vs1['id']).extra,
+        task_msg('get vs details with md5'))
+    helper.assert_equals(
+        obs[vs1['id']][const.DIGEST],
+        ipvs_plugin._get_revision(context, vs1['id']).digest,
+        task_msg('get vs details with digest'))
+    ob = ipvs_plugin.get_virtualserver_details(context, vs_ids, limit=1)
+    helper.assert_equals(
+        ([vs[const.ID] for vs in ob[const.VIRTUALSERVERS]],
+         ob['next_marker']), (vs_ids[:1], vs_ids[0]),
+        task_msg('get vs details first page'))
+    ob = ipvs_plugin.get_virtualserver_details(
+        context, vs_ids, limit=1, marker=ob['next_marker'])
+    helper.assert_equals(
+        ([vs[const.ID] for vs in ob[const.VIRTUALSERVERS]],
+         ob['next_marker']), (vs_ids[1:], None),
+        task_msg('get vs details last page'))
+
+
+@collect
+def test_get_revision_logs(gb):
+    lb = init_lb()
+    start = get_seq(lb['id'])
+    vs = init_vs(lb['id'])
+    rs = init_rs(vs['id'])
+    ipvs_plugin.delete_ipvs_realserver(context, rs['id'])
+    ob = ipvs_plugin.get_revision_logs(context, start, None, 100)
+    helper.assert_equals(
+        [log[:3] for log in ob['logs']],
+        [(start + 1, const.IPVS_VIRTUALSERVER, const.CREATE),
+         (start + 2, const.IPVS_REALSERVER, const.CREATE),
+         (start + 3, const.IPVS_REALSERVER, const.DELETE)],
+        task_msg('get revision logs in seq order'))
+    payload = jsonutils.loads(ob['logs'][1][3])
+    helper.assert_equals(
+        (payload[const.LISTEN_PORT],
+         payload[const.REALSERVERS][0][const.SERVER_IP]),
+        (vs[const.LISTEN_PORT], rs[const.SERVER_IP]),
+        task_msg('get revision log payload'))
+    ob = ipvs_plugin.get_revision_logs(context, start, None, 2)
+    helper.assert_equals(
+        ([log[0] for log in ob['logs']], ob['next_marker']),
+        ([start + 1, start + 2], start + 2),
+        task_msg('get revision logs first page'))
+
+
+@collect
+def test_get_lb_update_revision_log(gb):
+    lb = init_lb()
+    vs = init_vs(lb['id'])
+    rs = init_rs(vs['id'])
+    start = get_seq(rs['id'])
+    lb_update = base.lb_update_body()
+    base.update_down(lb_update)
+    ipvs_plugin.update_ipvs_loadbalancer(context, lb['id'], lb_update)
+    ob = ipvs_plugin.get_revision_logs(context, start, None, 100)
+    payload = jsonutils.loads(ob['logs'][-1][3])
+    vs_payload = payload[const.VIRTUALSERVERS][0]
+    helper.assert_equals(
+        (vs_payload[const.ADMIN_STATE_UP],
+         [(r[const.SERVER_IP], r[const.WEIGHT], r[const.ADMIN_STATE_UP])
+          for r in vs_payload[const.REALSERVERS]]),
+        (False, [(rs[const.SERVER_IP], rs[const.WEIGHT], False)]),
+        task_msg('get lb update revision log with real server states'))
+
+
+@collect
+def test_get_revisions_page_with_details(gb):
+    lb = init_lb()
+    start = get_seq(lb['id'])
+    vs = init_vs(lb['id'])
+    rs = init_rs(vs['id'])
+    ob = ipvs_plugin.get_revisions_page(context, start, None, 100,
+                                        details=True)
+    helper.assert_equals(
+        [rev[3] for rev in ob['revisions']], [vs['id'], rs['id']],
+        task_msg('get revisions page with details'))
+    helper.assert_equals(
+        [(v[const.ID], [r[const.ID] for r in v[const.REALSERVERS]])
+         for v in ob[const.VIRTUALSERVERS]],
+        [(vs['id'], [rs['id']])],
+        task_msg('get revisions page with vs details inline'))
+
+
+@collect
+def test_revision_snapshot(gb):
+    lb = init_lb()
+    vs = init_vs(lb['id'])
+    rs = init_rs(vs['id'])
+    chunk_size = revisions.SNAPSHOT_CHUNK_SIZE
+    revisions.SNAPSHOT_CHUNK_SIZE = 64
+    try:
+        seq = ipvs_plugin.build_revision_snapshot(context)
+    finally:
+        revisions.SNAPSHOT_CHUNK_SIZE = chunk_size
+    helper.assert_equals(seq, get_seq(rs['id']),
+                         task_msg('build revision snapshot at latest seq'))
+    helper.assert_equals(ipvs_plugin.build_revision_snapshot(context), None,
+                         task_msg('skip revision snapshot without changes'))
+    ob = ipvs_plugin.get_revision_snapshot(context)
+    chunks = [ob['data']]
+    for chunk in range(1, ob['chunks']):
+        chunks.append(ipvs_plugin.get_revision_snapshot(
+            context, seq, chunk)['data'])
+    assert len(chunks) > 1
+    obs = {v[const.ID]: v for v in jsonutils.loads(zlib.decompress(
+        ''.join(base64.b64decode(c) for c in chunks)))}
+    helper.assert_equals(
+        [r[const.ID] for r in obs[vs['id']][const.REALSERVERS]], [rs['id']],
+        task_msg('get revision snapshot in chunks'))
+    helper.assert_equals(
+        ipvs_plugin.get_revision_snapshot(context, seq, ob['chunks']), None,
+        task_msg('get revision snapshot chunk out of range'))